@@ -1,63 +1,107 @@
 import random
 
+from board import make_board
+from dice import DiceStream
+
+
 class RealEstateGame:
     """A class that creates a RealEstateGame object. The game mimics Monopoly. It is for 2 or more players. The game has
-    a 'board' that consists of 25 game spaces in a loop. The first space is the GO space. The players move around
-    the board by rolling one six-sided die. All of the spaces can be purchased. Purchased spaces will charge rent to
-    the player that lands on them (unless that player owns the space). Players lose when they run out of money. The last
-    player with money wins."""
-
-    def __init__(self):
-        """Constructs a game. Takes in no parameters. Initializes an empty gameboard (a list of spaces) and an empty
-        roster of players (a dictionary of players)"""
+    a 'board' that consists of game spaces in a loop (25 by default, any number with set_board()). The first space
+    is the GO space. The players move around the board by rolling one six-sided die. All of the spaces can be
+    purchased. Purchased spaces will charge rent to the player that lands on them (unless that player owns the
+    space). Players lose when they run out of money. The last player with money wins."""
+
+    def __init__(self, seed=None):
+        """Constructs a game. Takes in seed: an optional seed for the game's dice. Every game owns its own DiceStream
+        and random generator, so games can be replayed exactly and can run side by side without sharing the global
+        one. Initializes an empty gameboard (a list of spaces) and an empty roster of players (a dictionary of
+        players)"""
+        self._random = random.Random(seed)
+        self._dice = DiceStream(seed)
         self._go_bonus = 0
         self._active_players = {}
+        # the indices of the spaces each player owns, and the players that still have money, so that bankruptcies
+        # and check_game_over() never have to scan the whole board or roster
+        self._holdings = {}
+        self._solvent_players = set()
+        # every player's career counters for this game: spaces bought, rent paid, rent received and bankruptcies
+        self._tallies = {}
         self._turn_list = []
+        self._board = None
         self._gameboard = []
         self._turns = 0
         self._interaction_phase = "setup"
+        # what the active player may do in their turn: "roll" until they move, "again" after a pair and "pass" once
+        # they must end it
+        self._turn_state = "roll"
         self._started = False
+        self._bots = {}
+        self._recorder = None
 
     def get_turns(self):
         """Returns how many turns have been played"""
         return self._turns
 
-    def create_spaces(self, go_bonus, rents):
-        """Takes in go_bonus: the amount of money players receive when landing on or passing go. Takes in rents: a
-        list of the rents for 24 game spaces. The function then creates a GO space, and 24 Spaces with the given
-        rents. It adds these spaces to the gameboard."""
-        # set the GO bonus
-        self._go_bonus = go_bonus
+    def get_random(self):
+        """Returns the game's random generator (a random.Random)"""
+        return self._random
 
-        # create the GO space
-        go_space = Space("GO")
+    def get_dice(self):
+        """Returns the game's source of dice rolls (a DiceStream, unless set_dice() replaced it)"""
+        return self._dice
 
-        # add it to the list of spaces on the board, gameboard
-        self._gameboard.append(go_space)
+    def set_dice(self, dice):
+        """Takes in dice: a DiceStream, a DiceTape or anything with the same roll(), get_state() and set_state()
+        methods. Every player rolls with it from now on."""
+        self._dice = dice
+        for player in self._active_players.values():
+            player.set_dice(dice)
 
-        # create a list of names to give the incoming 24 spaces
-        name_list = ["United States", "Canada", "Mexico", "Panama", "Haiti", "Jamaica", "Peru", "Republic Dominican",
-                     "Cuba", "Caribbean", "Greenland", "El Salvador", "Puerto Rico", "Colombia", "Venezuela",
-                     "Honduras", "Guyana", "Guatemala", "Bolivia", "Argentina", "Ecuador", "Chile", "Brazil",
-                     "Costa Rica"]
+    def set_recorder(self, recorder, game_id=0):
+        """Takes in recorder: a trajectory.TrajectoryRecorder, or None to stop recording, and game_id: the number the
+        game's rows are recorded under. Every move and purchase from now on is recorded."""
+        self._recorder = None if recorder is None else recorder.for_game(game_id)
 
-        # create 24 spaces with the list of names and the given rents, adding each to gameboard
-        for index in range(24):
-            space = Space(name_list[index], rents[index])
-            self._gameboard.append(space)
+    def create_spaces(self, go_bonus, rents):
+        """Takes in go_bonus: the amount of money players receive when landing on or passing go. Takes in rents: a
+        list of the rents for the game spaces after GO (24 for the usual board). The function then creates a GO
+        space, and a Space for each of the given rents, replacing any gameboard set up before."""
+        self.set_board(make_board(go_bonus, rents))
+
+    def set_board(self, board):
+        """Takes in board: a Board, from make_board() or board.load_board(). Creates a Space for every space on it,
+        GO included, replacing any gameboard set up before. Moves and purchases read the board's tables directly."""
+        self._board = board
+        self._go_bonus = board.go_bonus
+        self._gameboard = [Space(name, rent, price) for name, rent, price in zip(board.names, board.rents,
+                                                                                  board.prices)]
+        for holdings in self._holdings.values():
+            holdings.clear()
+
+    def get_board(self):
+        """Returns the game's Board, or None before the spaces are created"""
+        return self._board
 
     def get_player(self, name):
         if name in self._active_players:
             return self._active_players[name]
 
+    def get_space(self, index):
+        """Returns the Space at the given index of the gameboard"""
+        return self._gameboard[index]
+
     def create_player(self, name, initial_balance):
         """Takes in name: a unique name to give the new Player. If the name is not unique, the player will not be
         created, and an error will be raised. Takes in initial_balance: a number representing the amount that the
         Player starts with. Players are added to the go space, so can only be used after create_spaces(). """
         # create the player, passing the name and initial balance
-        player = Player(name, initial_balance)
+        player = Player(name, initial_balance, self._dice)
         # add the player to the dictionary of active players
         self._active_players[player.get_name()] = player
+        self._holdings[player.get_name()] = set()
+        self._tallies[player.get_name()] = [0, 0, 0, 0]
+        if initial_balance > 0:
+            self._solvent_players.add(player.get_name())
         self._turn_list.append(player.get_name())
 
     def get_player_account_balance(self, player_name):
@@ -84,27 +128,30 @@ class RealEstateGame:
         # look up the player's location
         location = self._gameboard[player.get_location()]
         # whether player can afford space's purchase_price
-        can_afford = player.get_balance() > location.get_purchase_price()
-        # whether they're on the go space
-        is_go_space = location == self._gameboard[0]
-        # check if that location has an owner and can afford the purchase (and that it's not the GO space)
-        if location.get_owner() is None and can_afford and not is_go_space:
+        can_afford = player.get_balance() > self._board.prices[player.get_location()]
+        # check if that location has an owner and can afford the purchase (and that it can be bought, unlike GO)
+        if location.get_owner() is None and can_afford and self._board.buyable[player.get_location()]:
             self._gameboard[player.get_location()].change_owner(player.get_name())
+            self._holdings[player.get_name()].add(player.get_location())
+            self._tallies[player.get_name()][0] += 1
             balance = player.get_balance()
             new_balance = balance - location.get_purchase_price()
             self._active_players[player.get_name()].set_balance(new_balance)
+            if self._recorder is not None:
+                self._recorder.buy(self, player_name, player.get_location(), location.get_purchase_price())
             return True
         return False
 
-    def move_player(self, player_name, distance):
-        """Takes in player_name. Also takes in distance: an integer between 1 and 6. If the player's balance is 0, the
-        function will return without doing anything. Advances the player the given number of Spaces across the board.
-        If the player lands on or passes go, they will receive the go_bonus. After moving to the new location, the
-        player may need to pay rent. This will occur only if there is an owner of the new location that is not the
-        player themselves. If the player does pay rent the following occurs: the rent amount is deducted from the
-        player's account balance, and moved to the owner's balance. If the rent payer's balance reaches 0, that player
-        is removed from the active_players dictionary, and only their remaining balance will be transferred to the
-        owner."""
+    def move_player(self, player_name, distance, dice=None):
+        """Takes in player_name. Also takes in distance: an integer between 1 and 6, and dice: the two dice it was
+        rolled with, if known (a player who did not roll a pair must end their turn after moving). If the player's
+        balance is 0, the function will return without doing anything. Advances the player the given number of Spaces
+        across the board. If the player lands on or passes go, they will receive the go_bonus. After moving to the new
+        location, the player may need to pay rent. This will occur only if there is an owner of the new location that is
+        not the player themselves. If the player does pay rent the following occurs: the rent amount is deducted from
+        the player's account balance, and moved to the owner's balance. If the rent payer's balance reaches 0, that
+        player is removed from the active_players dictionary, and only their remaining balance will be transferred to
+        the owner. Returns the Space the player landed on, or None if the player had no money and did not move."""
 
         player = self._active_players[player_name]
 
@@ -112,14 +159,16 @@ class RealEstateGame:
         balance = player.get_balance()
         if balance <= 0:
             return
-
-        # add the distance to be moved to the player's location, looping  around to 0 at 24
-        # if looping around (passing/landing on GO) occurs, reward go_bonus
-        new_location = player.get_location() + distance
-        if new_location > 24:
-            # reward go_bonus
-            player.set_balance(balance + self._go_bonus)
-            new_location -= 25
+        start_balance = balance
+        paid = 0
+        self._turn_state = "again" if dice is not None and dice[0] == dice[1] else "pass"
+
+        # add the distance to be moved to the player's location, looping around to 0 at the end of the board
+        # reward go_bonus for every time looping around (passing/landing on GO) occurs
+        laps, new_location = divmod(player.get_location() + distance, len(self._gameboard))
+        if laps:
+            balance += self._go_bonus * laps
+            player.set_balance(balance)
         player.set_location(new_location)
 
         # check the Space at that location, check if rent needs to be paid
@@ -133,49 +182,122 @@ class RealEstateGame:
                 self._active_players[owner].set_balance(new_owner_balance)
 
                 # deduct the rent from the moving player's balance
-                balance -= location.get_rent()
+                paid = location.get_rent()
+                balance -= paid
                 self._active_players[player_name].set_balance(balance)
             else:
                 # put what remains in the moving player's account into the location owner's account
                 owner_balance = self._active_players[owner].get_balance()
+                paid = balance
                 owner_balance += balance
                 self._active_players[owner].set_balance(owner_balance)
 
                 # set moving player's balance to 0
                 self._active_players[player_name].set_balance(0)
+                self._tallies[player_name][3] += 1
+                self._turn_state = "pass"
 
                 # any properties that this player owned, set their owner value to None
-                for space in self._gameboard:
-                    if space.get_owner() == player.get_name():
-                        space.change_owner(None)
+                for index in self._holdings[player_name]:
+                    self._gameboard[index].change_owner(None)
+                self._holdings[player_name].clear()
+                self._solvent_players.discard(player_name)
 
                 # the only case where the game can end is when someone has to pay rent but can't cover it
                 # so we check here
                 self.check_game_over()
         # if no one owns it, set interaction_phase
         elif owner is None:
-            self._interaction_phase = player, 'buy'
-            return location
+            self._interaction_phase = player_name, 'buy'
+        if paid:
+            self._tallies[player_name][1] += paid
+            self._tallies[owner][2] += paid
+        if self._recorder is not None:
+            self._recorder.move(self, player_name, dice, new_location, player.get_balance() - start_balance, paid,
+                                owner if paid else None)
+        return location
+
+    def concede(self, player_name):
+        """Takes in player_name. The player leaves the game: their money is forfeited and their spaces lose their
+        owner, so from then on they are skipped like a player who went bankrupt (without counting as a bankruptcy).
+        Used to end a game that has gone on too long."""
+        self._active_players[player_name].set_balance(0)
+        for index in self._holdings[player_name]:
+            self._gameboard[index].change_owner(None)
+        self._holdings[player_name].clear()
+        self._solvent_players.discard(player_name)
 
     def check_game_over(self):
         """Checks if the game is over. The game is over if all of the players but one have an account balance of 0.
         If the game is over, the winning player's name is returned. If the game is not over, an empty string is
         returned."""
-        # loop through active_players dictionary, and see if there is only 1 player with a positive account balance
-        positive_balance_count = 0
-        winner = ""
-        for player in self._active_players.values():
-            if player.get_balance() > 0:
-                positive_balance_count += 1
-                winner = player.get_name()
-
-        if positive_balance_count < 2:
-            return winner
+        # players only run out of money when they can't pay rent, and move_player() removes them from
+        # solvent_players when that happens
+        if len(self._solvent_players) < 2:
+            return next(iter(self._solvent_players), "")
         return ""
 
+    def get_holdings(self, player_name=None):
+        """Takes in player_name (optional). Returns a sorted list of the indices of the spaces that player owns. If no
+        player_name is given, returns a dictionary of every player's holdings instead."""
+        if player_name is not None:
+            return sorted(self._holdings[player_name])
+        return {name: sorted(spaces) for name, spaces in self._holdings.items()}
+
+    def get_net_worth(self, player_name=None):
+        """Takes in player_name (optional). Returns that player's balance plus the purchase price of every space they
+        own. If no player_name is given, returns a dictionary of every player's net worth instead."""
+        if player_name is None:
+            return {name: self.get_net_worth(name) for name in self._active_players}
+        property_value = sum(self._gameboard[index].get_purchase_price() for index in self._holdings[player_name])
+        return self._active_players[player_name].get_balance() + property_value
+
+    def get_tallies(self):
+        """Returns a dictionary of every player's counters for this game, as tuples of the spaces they bought, the
+        rent they paid, the rent they received and how many times they went bankrupt"""
+        return {name: tuple(tally) for name, tally in self._tallies.items()}
+
     def check_created(self):
         return len(self._gameboard) > 0
 
+    def save_state(self):
+        """Returns everything a turn can change: balances, locations, owners, tallies, turns, the interaction phase, the
+        turn state and the position of the dice. restore_state() puts the game back the way it was."""
+        players = tuple((player.get_balance(), player.get_location()) for player in self._active_players.values())
+        owners = tuple(space.get_owner() for space in self._gameboard)
+        tallies = tuple(tuple(tally) for tally in self._tallies.values())
+        return (players, owners, tallies, self._turns, self._interaction_phase, self._turn_state, self._started,
+                self._dice.get_state())
+
+    def restore_state(self, state):
+        """Takes in a state returned by save_state(), from a game with the same players and board"""
+        players, owners, tallies, self._turns, self._interaction_phase, self._turn_state, self._started, \
+            dice_state = state
+        for name, tally in zip(self._tallies, tallies):
+            self._tallies[name] = list(tally)
+        for player, (balance, location) in zip(self._active_players.values(), players):
+            player.set_balance(balance)
+            player.set_location(location)
+            if balance > 0:
+                self._solvent_players.add(player.get_name())
+            else:
+                self._solvent_players.discard(player.get_name())
+        for holdings in self._holdings.values():
+            holdings.clear()
+        for index, (space, owner) in enumerate(zip(self._gameboard, owners)):
+            space.change_owner(owner)
+            if owner is not None:
+                self._holdings[owner].add(index)
+        self._dice.set_state(dice_state)
+
+    def get_go_bonus(self):
+        """Returns the amount of money players receive when landing on or passing GO"""
+        return self._go_bonus
+
+    def get_board_size(self):
+        """Returns how many spaces are on the gameboard, GO included"""
+        return len(self._gameboard)
+
     def check_started(self):
         """Checks if the game has been started (i.e., gameboard initialized, at least 2 players)"""
         return self._started
@@ -188,21 +310,55 @@ class RealEstateGame:
         """Returns the player whose turn it is"""
         return self._turn_list[self._turns % len(self._turn_list)]
 
+    def end_turn(self):
+        """Passes the turn to the next player that still has money, and returns their name. Players that ran out of
+        money are skipped, unless the game is over."""
+        self._turns += 1
+        self._turn_state = "roll"
+        if self.check_game_over() == "":
+            while self._active_players[self.get_active_player()].get_balance() <= 0:
+                self._turns += 1
+        return self.get_active_player()
+
+    def get_player_names(self):
+        """Returns the names of the players, in the order they joined"""
+        return list(self._active_players)
+
+    def get_interaction_phase(self):
+        """Returns the interaction phase of the game: "setup", or a tuple of a player and what they may do next"""
+        return self._interaction_phase
+
     def set_interaction_phase(self, player, phase):
         """Updates the interaction phase of the game"""
         self._interaction_phase = player, phase
 
+    def get_turn_state(self):
+        """Returns what the active player may do in their turn: "roll" if they have not moved yet, "again" if they
+        rolled a pair and may roll again, or "pass" if they must end their turn"""
+        return self._turn_state
+
+    def set_bot(self, player_name, strategy):
+        """Takes in player_name and strategy: the name of a strategy (see strategy.STRATEGIES). From now on the
+        player's turns are played by a bot with that strategy."""
+        self._bots[player_name] = strategy
+
+    def get_bot(self, player_name):
+        """Returns the name of the strategy of the bot playing for player_name, or None if a person plays"""
+        return self._bots.get(player_name)
+
 
 class Player:
     """A class that represents a Player in the RealEstateGame. The game will create players. Players will be able to
     interact with the Space (tiles on the board) objects by residing on them, and by purchasing and owning them."""
 
-    def __init__(self, name, balance):
+    def __init__(self, name, balance, dice=None):
         """Constructs a player for the game. Names the player and gives the player a starting balance with arguments.
-        Location is an integer that points to the Space on the gameboard. It starts at 0, or the GO space."""
+        Location is an integer that points to the Space on the gameboard. It starts at 0, or the GO space. Takes in
+        dice: the game's source of dice rolls. Defaults to a DiceStream of the player's own."""
         self._name = name
         self._balance = balance
         self._location = 0
+        self._dice = DiceStream() if dice is None else dice
 
     def get_name(self):
         """return the Player name"""
@@ -217,19 +373,21 @@ class Player:
         self._balance = new_balance
 
     def get_location(self):
-        """return the location (an integer between 0 and 24)"""
+        """return the location (an index into the gameboard, 0 being GO)"""
         return self._location
 
     def set_location(self, new_location):
-        """change the location property to be an integer between 0 and 24"""
+        """change the location property to be an index into the gameboard"""
         # set the Player's location
         self._location = new_location
 
     def roll_dice(self) -> (int, int):
         """rolls 2 six-sided dice, returning the results in a tuple"""
-        die1 = random.randint(1, 6)
-        die2 = random.randint(1, 6)
-        return die1, die2
+        return self._dice.roll()
+
+    def set_dice(self, dice):
+        """change the source of the Player's dice rolls"""
+        self._dice = dice
 
     def __str__(self):
         return f"Hi! I'm {self._name}. I'm on space {self._location}. I have ${self._balance}."
@@ -240,12 +398,13 @@ class Space:
     a unique name, a rent amount, and a purchase price (which is 5 x rent amount). These are the properties that will
     be set with arguments. A Space will also track which Player owns it, and which Players reside on it (a list)."""
 
-    def __init__(self, name, rent=0):
+    def __init__(self, name, rent=0, purchase_price=None):
         """Constructs a Space for the gameboard. A Space is initialized with a given name and rent. It also has an owner
-        property. Rent parameter defaults to 0 so that GO space is created just by sending the name 'GO'."""
+        property. Rent parameter defaults to 0 so that GO space is created just by sending the name 'GO'. The
+        purchase_price defaults to 5 x rent."""
         self._name = name
         self._rent = rent
-        self._purchase_price = rent * 5
+        self._purchase_price = rent * 5 if purchase_price is None else purchase_price
         self._owner = None
 
     def get_name(self):
@@ -262,7 +421,7 @@ class Space:
 
     def get_owner(self):
         """returns Space's owner (Player)"""
-        return self.owner
+        return self._owner
 
     def change_owner(self, purchaser):
         """replaces the owner with the given purchaser (player name)"""
@@ -288,7 +447,7 @@ players are added to the active_players list.
 3. Determining how to implement player piece movement
     Player piece movement will be tied to the Player object's location. Players can be moved with Player.move(). It will
 in turn be called by RealEstateGame.move_player(). Move_player() takes in which player to move and how far. The distance
-to move will be added to the Player.location, an integer between 0 and 24, circling back to 0 at the top of the range.
+to move will be added to the Player.location, an index into the gameboard, circling back to 0 at the end of the board.
 This location number can be used to index the gameboard list, and will retrieve the corresponding Space that the Player
 is located on.
 
@@ -308,11 +467,12 @@ rent amount will be added to that player's balance.
 
 5. Determining how to pass GO and receive the pay amount
     Passing GO will only occur during player movement, move_player(). When adding the distance to the Player's 
-location, if the location plus the distance is greater than 24, then they will receive the go_bonus. Player.balance
-will be adjusted with Player.set_balance(). 
+location, if the location plus the distance reaches the size of the board, then they will receive the go_bonus (once
+for every lap, on boards smaller than a roll). Player.balance will be adjusted with Player.set_balance(). 
 
 6. Determining when the game has ended
     Because paying rent is the only way to lose the game, and paying rent only occurs on movement, our check_game_over()
-function should only need to be called in move_player(). It will scan through the active_players dictionary. If only 
-1 Player has a positive account balance, the game will end. 
+function should only need to be called in move_player(). move_player() keeps a set of the Players that still have
+money (solvent_players), so check_game_over() only looks at its size. If only 1 Player has a positive account balance,
+the game will end. 
 """
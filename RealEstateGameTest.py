@@ -7,10 +7,15 @@ import unittest
 import random
 from RealEstateGame import RealEstateGame, Player, Space
 
+RENTS = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350, 350,
+         350]
+
 
 class UnitTest(unittest.TestCase):
     """Contains unit tests for RealEstateGame.py"""
 
+    game_class = RealEstateGame
+
     def just_messin(self):
         game = RealEstateGame()
 
@@ -24,12 +29,12 @@ class UnitTest(unittest.TestCase):
         turn = 1
         while True:
             stop_loop = False
-            for player in game.active_players.values():
+            for player in game._active_players.values():
                 game.move_player(player.get_name(), random.randint(1, 6))
                 buy = random.choice([True, False])
                 print(player)
                 if buy:
-                    location = game.gameboard[player.get_location()]
+                    location = game._gameboard[player.get_location()]
                     print(f"And I'm buying {location.get_name()}")
                     was_bought = game.buy_space(player.get_name())
                     print(f"{location.get_name()} was bought: {was_bought}")
@@ -43,8 +48,1400 @@ class UnitTest(unittest.TestCase):
         print(f"The winner is {game.check_game_over()}")
         print("game over")
 
-    def move_player_six_spaces_etc(self):
+    def test_move_player_six_spaces_etc(self):
+        game = self.game_class()
+        game.create_spaces(50, RENTS)
+        game.create_player("Player 1", 1000)
+        game.create_player("Player 2", 1000)
+
+        game.move_player("Player 1", 6)
+        self.assertEqual(game.get_player_current_position("Player 1"), 6)
+        self.assertTrue(game.buy_space("Player 1"))
+        self.assertEqual(game.get_player_account_balance("Player 1"), 625)
+
+        # Player 2 pays rent on space 6, then passes GO
+        game.move_player("Player 2", 6)
+        self.assertEqual(game.get_player_account_balance("Player 2"), 925)
+        self.assertEqual(game.get_player_account_balance("Player 1"), 700)
+        for _ in range(3):
+            game.move_player("Player 2", 6)
+        game.move_player("Player 2", 2)
+        self.assertEqual(game.get_player_current_position("Player 2"), 1)
+        self.assertEqual(game.get_player_account_balance("Player 2"), 975)
+
+    def test_bankrupt_player_releases_spaces(self):
+        game = self.game_class()
+        game.create_spaces(50, RENTS)
+        game.create_player("Player 1", 1000)
+        game.create_player("Player 2", 300)
+
+        game.move_player("Player 2", 1)
+        self.assertTrue(game.buy_space("Player 2"))
+        game.move_player("Player 1", 3)
+        self.assertTrue(game.buy_space("Player 1"))
+        game.move_player("Player 2", 2)
+        self.assertFalse(game.buy_space("Player 2"))
+        self.assertEqual(game.get_player_account_balance("Player 2"), 0)
+        self.assertEqual(game.get_player_account_balance("Player 1"), 800)
+        self.assertIsNone(game.get_space(1).get_owner())
+        self.assertEqual(game.get_space(3).get_owner(), "Player 1")
+        self.assertEqual(game.check_game_over(), "Player 1")
+        self.assertEqual(game.get_holdings(), {"Player 1": [3], "Player 2": []})
+
+    def test_holdings_and_net_worth(self):
+        game = self.game_class()
+        game.create_spaces(50, RENTS)
+        game.create_player("Player 1", 1000)
+        game.create_player("Player 2", 1000)
+        game.create_player("Player 3", 0)
+        self.assertEqual(game.check_game_over(), "")
+
+        game.move_player("Player 1", 1)
+        game.buy_space("Player 1")
+        game.move_player("Player 1", 3)
+        game.buy_space("Player 1")
+        self.assertEqual(game.get_holdings("Player 1"), [1, 4])
+        self.assertEqual(game.get_net_worth("Player 1"), 1000)
+        self.assertEqual(game.get_net_worth(), {"Player 1": 1000, "Player 2": 1000, "Player 3": 0})
+        self.assertEqual(game.get_player_names(), ["Player 1", "Player 2", "Player 3"])
+
+
+class CompactGameTest(UnitTest):
+    """Runs the rule tests against CompactGame"""
+
+    def setUp(self):
+        from compact_game import CompactGame
+        self.game_class = CompactGame
+
+    def test_matches_object_games(self):
+        rng = random.Random(3)
+        for _ in range(20):
+            games = [RealEstateGame(), self.game_class()]
+            for game in games:
+                game.create_spaces(50, RENTS)
+                for number in range(3):
+                    game.create_player(f"Player {number}", 1000)
+            turn = 0
+            while games[0].check_game_over() == "" and turn < 2000:
+                name = f"Player {turn % 3}"
+                distance, buy = rng.randint(2, 12), rng.random() < 0.5
+                for game in games:
+                    game.move_player(name, distance)
+                    if buy:
+                        game.buy_space(name)
+                self.assertEqual(games[0].get_net_worth(), games[1].get_net_worth())
+                self.assertEqual(games[0].get_holdings(), games[1].get_holdings())
+                turn += 1
+            self.assertEqual(games[0].check_game_over(), games[1].check_game_over())
+
+    def test_boards_are_shared_within_a_bounded_cache(self):
+        from compact_game import _board_for
+        games = [self.game_class() for _ in range(2)]
+        for game in games:
+            game.create_spaces(50, RENTS)
+        self.assertIs(games[0].get_board(), games[1].get_board())
+        for go_bonus in range(100):
+            self.game_class().create_spaces(go_bonus, RENTS)
+        self.assertLessEqual(_board_for.cache_info().currsize, 64)
+
+    def test_uses_less_memory(self):
+        from compact_game import CompactGame, bytes_per_game
+        self.assertLess(bytes_per_game(CompactGame, 200) * 4, bytes_per_game(RealEstateGame, 200))
+
+
+class BoardTest(unittest.TestCase):
+    """Contains tests for board.py"""
+
+    def test_load_specs(self):
+        import json
+        import os
+        import tempfile
+        from board import load_board
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, "board.json")
+            with open(json_path, "w") as file:
+                json.dump({"go_bonus": 100, "spaces": [{"name": "Jail", "rent": 0, "buyable": False},
+                                                       {"name": "Lisbon", "rent": 40, "price": 150},
+                                                       {"rent": 60}]}, file)
+            csv_path = os.path.join(directory, "board.csv")
+            with open(csv_path, "w") as file:
+                file.write("name,rent,price,buyable\nJail,0,,no\nLisbon,40,150,\n,60,,\n")
+            for path in (json_path, csv_path):
+                board = load_board(path, go_bonus=100 if path == csv_path else None)
+                self.assertEqual(board.names, ("GO", "Jail", "Lisbon", "Space 3"))
+                self.assertEqual(list(board.rents), [0, 0, 40, 60])
+                self.assertEqual(list(board.prices), [0, 0, 150, 300])
+                self.assertEqual(board.buyable, bytes([0, 0, 1, 1]))
+                self.assertEqual(board.go_bonus, 100)
+            with self.assertRaises(ValueError):
+                load_board(csv_path)
+
+    def test_any_board_size_and_distance(self):
+        from board import make_board
+        from compact_game import CompactGame
+        for game_class in (RealEstateGame, CompactGame):
+            with self.subTest(backend=game_class.__name__):
+                game = game_class()
+                game.set_board(make_board(10, [20, 30], buyable=[False, True]))
+                game.create_player("Player 1", 1000)
+                game.create_player("Player 2", 1000)
+                # 3 spaces, so a roll of 11 goes round 3 times and lands on space 2
+                self.assertEqual(game.move_player("Player 1", 11).get_name(), "Canada")
+                self.assertEqual(game.get_player_account_balance("Player 1"), 1030)
+                self.assertTrue(game.buy_space("Player 1"))
+                game.move_player("Player 2", 7)
+                self.assertEqual(game.get_player_current_position("Player 2"), 1)
+                self.assertFalse(game.buy_space("Player 2"))
+                game.move_player("Player 2", 1)
+                self.assertEqual(game.get_player_account_balance("Player 2"), 1020 - 30)
+
+    def test_wraparound_on_large_boards(self):
+        from benchmark import stress
+        from compact_game import CompactGame
+        for game_class in (RealEstateGame, CompactGame):
+            with self.subTest(backend=game_class.__name__):
+                game = game_class()
+                game.create_spaces(200, [10] * 99999)
+                game.create_player("Player 1", 1000)
+                game.create_player("Player 2", 1000)
+                game.move_player("Player 1", 99995)
+                self.assertEqual(game.get_player_current_position("Player 1"), 99995)
+                self.assertEqual(game.get_player_account_balance("Player 1"), 1000)
+                # 12 from 99995 passes GO once and lands on space 7
+                self.assertEqual(game.move_player("Player 1", 12).get_name(), "Peru")
+                self.assertEqual(game.get_player_account_balance("Player 1"), 1200)
+                self.assertTrue(game.buy_space("Player 1"))
+                game.move_player("Player 2", 7)
+                self.assertEqual(game.get_player_account_balance("Player 2"), 990)
+        # the timings themselves are checked by benchmark.py --stress
+        self.assertEqual(set(stress(board_sizes=(25, 1000), moves=200)["CompactGame"]), {25, 1000})
+
+
+class ActionsTest(unittest.TestCase):
+    """Contains tests for actions.py"""
+
+    def make_games(self):
+        from compact_game import CompactGame
+        for game_class in (RealEstateGame, CompactGame):
+            game = game_class(5)
+            game.create_spaces(50, RENTS)
+            game.create_player("Player 1", 1000)
+            game.create_player("Player 2", 100)
+            yield game
+
+    def test_results_describe_the_turn(self):
+        from actions import Buy, BuyResult, Move, MoveResult, Pass, PassResult, apply_actions
+        for game in self.make_games():
+            with self.subTest(backend=type(game).__name__):
+                results = apply_actions(game, [Move("Player 1", (3, 3)), Buy("Player 1"), Pass("Player 1"),
+                                               Move("Player 2", (2, 4)), Pass("Player 2"),
+                                               Move("Player 1", (6, 6)), Move("Player 1", (6, 2)), Pass("Player 1"),
+                                               Move("Player 2", (6, 6)), Move("Player 2", (6, 1)), Pass("Player 2"),
+                                               Move("Player 1", (1, 2)), Pass("Player 1"),
+                                               Move("Player 2", (3, 3))])
+                self.assertEqual(results, [
+                    MoveResult("Player 1", (3, 3), 0, 6, 0, 0, None, False, ""),
+                    BuyResult("Player 1", 6, 375),
+                    PassResult("Player 1", "Player 2"),
+                    MoveResult("Player 2", (2, 4), 0, 6, 0, 75, "Player 1", False, ""),
+                    PassResult("Player 2", "Player 1"),
+                    MoveResult("Player 1", (6, 6), 6, 18, 0, 0, None, False, ""),
+                    MoveResult("Player 1", (6, 2), 18, 1, 50, 0, None, False, ""),
+                    PassResult("Player 1", "Player 2"),
+                    MoveResult("Player 2", (6, 6), 6, 18, 0, 0, None, False, ""),
+                    MoveResult("Player 2", (6, 1), 18, 0, 50, 0, None, False, ""),
+                    PassResult("Player 2", "Player 1"),
+                    MoveResult("Player 1", (1, 2), 1, 4, 0, 0, None, False, ""),
+                    PassResult("Player 1", "Player 2"),
+                    # 75 left is not more than the rent, so Player 2 hands it all over
+                    MoveResult("Player 2", (3, 3), 0, 6, 0, 75, "Player 1", True, "Player 1"),
+                ])
+
+    def test_moves_and_buys_follow_the_turn(self):
+        from actions import Buy, BuyResult, InvalidAction, Move, Pass, apply_actions
+        for game in self.make_games():
+            with self.subTest(backend=type(game).__name__):
+                for batch in ([Move("Player 1", (1, 2)), Move("Player 1", (1, 3))],
+                              [Move("Player 1", (1, 2)), Move("Player 1", (1, 2)), Move("Player 1", (4, 5)),
+                               Buy("Player 1")]):
+                    with self.assertRaises(InvalidAction):
+                        apply_actions(game, batch)
+                # a pair rolls again, and a buy can come in the next batch while the game waits on the decision
+                apply_actions(game, [Move("Player 1", (2, 2)), Move("Player 1", (1, 2))])
+                self.assertEqual(apply_actions(game, [Buy("Player 1")]), [BuyResult("Player 1", 7, 500)])
+                # the turn carries over between batches: no roll after a non-pair, and no pass before rolling
+                with self.assertRaises(InvalidAction):
+                    apply_actions(game, [Move("Player 1", (1, 1))])
+                apply_actions(game, [Pass("Player 1")])
+                with self.assertRaises(InvalidAction):
+                    apply_actions(game, [Pass("Player 2")])
+                apply_actions(game, [Move("Player 2", (1, 1))])
+                game.set_interaction_phase("Player 2", "roll")
+                with self.assertRaises(InvalidAction):
+                    apply_actions(game, [Buy("Player 2")])
+                apply_actions(game, [Move("Player 2", (1, 2)), Pass("Player 2")])
+
+    def test_invalid_batch_changes_nothing(self):
+        from actions import Buy, InvalidAction, Move, Pass, apply_actions
+        for game in self.make_games():
+            with self.subTest(backend=type(game).__name__):
+                apply_actions(game, [Move("Player 1", (3, 3)), Buy("Player 1"), Pass("Player 1")])
+                before = (game.get_net_worth(), game.get_holdings(), game.get_player_current_position("Player 2"),
+                          game.get_active_player())
+                next_roll = game.get_dice().get_state()
+                for batch in ([Move("Player 2"), Pass("Player 2"), Move("Player 2")],
+                              [Move("Player 2"), Buy("Player 2"), Buy("Player 2")],
+                              [Move("Player 2", (7, 1))],
+                              [Move("Player 2", (1, 2)), Move("Player 2", (1, 2))],
+                              [Move("Player 2", (2, 2)), Buy("Player 2"), Move("Player 2", (1, 3)),
+                               Move("Player 2", (4, 5))],
+                              [Buy("Player 2")]):
+                    with self.assertRaises(InvalidAction):
+                        apply_actions(game, batch)
+                    self.assertEqual((game.get_net_worth(), game.get_holdings(),
+                                      game.get_player_current_position("Player 2"), game.get_active_player()),
+                                     before)
+                    self.assertEqual(game.get_dice().get_state()[1:], next_roll[1:])
+
+
+class DiceTest(unittest.TestCase):
+    """Contains tests for dice.py"""
+
+    def test_seeded_streams_repeat(self):
+        from dice import DiceStream
+        rolls = [DiceStream(7, block_size=16).roll() for _ in range(3)]
+        first = DiceStream(7, block_size=16)
+        second = DiceStream(7, block_size=16)
+        self.assertEqual([first.roll() for _ in range(100)], [second.roll() for _ in range(100)])
+        self.assertEqual(len(set(rolls)), 1)
+        self.assertTrue(all(1 <= die <= 6 for roll in (first.roll() for _ in range(100)) for die in roll))
+
+    def test_recorded_tape_replays_a_game(self):
+        import os
+        import pickle
+        import tempfile
+        from dice import DiceStream, load_tape, save_tape
+
+        def play(game):
+            game.create_spaces(50, RENTS)
+            for name in ("Player 1", "Player 2"):
+                game.create_player(name, 1000)
+            for turn in range(60):
+                name = f"Player {turn % 2 + 1}"
+                game.move_player(name, sum(game.get_player(name).roll_dice()))
+                game.buy_space(name)
+            return game.get_net_worth()
+
+        game = RealEstateGame()
+        game.set_dice(DiceStream(3, block_size=16, record=True))
+        net_worth = play(game)
+        # a pickled stream carries on where it was
+        dice = pickle.loads(pickle.dumps(game.get_dice()))
+        self.assertEqual(dice.roll(), game.get_dice().roll())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.dice")
+            save_tape(path, game.get_dice().get_tape()[:60])
+            replay = RealEstateGame()
+            replay.set_dice(load_tape(path))
+            self.assertEqual(play(replay), net_worth)
+            with self.assertRaises(ValueError):
+                replay.get_dice().roll()
+
+
+class BatchSimulatorTest(unittest.TestCase):
+    """Checks that BatchSimulator follows the same rules as RealEstateGame"""
+
+    def test_matches_object_games(self):
+        from batch_simulator import BatchSimulator
+        import numpy as np
+
+        num_games, num_players, max_turns = 40, 3, 400
+        rng = np.random.default_rng(7)
+        dice = rng.integers(1, 7, size=(max_turns, num_games, 2))
+        buys = rng.random((max_turns, num_games)) < 0.6
+
+        simulator = BatchSimulator(num_games, num_players, 50, RENTS, 1000)
+        for turn in range(max_turns):
+            simulator.step(dice[turn], buys[turn])
+
+        for index in range(num_games):
+            game = RealEstateGame()
+            game.create_spaces(50, RENTS)
+            names = [f"Player {number}" for number in range(num_players)]
+            for name in names:
+                game.create_player(name, 1000)
+            turns = 0
+            while turns < max_turns and game.check_game_over() == "":
+                name = names[turns % num_players]
+                game.move_player(name, int(dice[turns, index].sum()))
+                if buys[turns, index]:
+                    game.buy_space(name)
+                turns += 1
+
+            balances = [game.get_player_account_balance(name) for name in names]
+            self.assertEqual(list(simulator.get_balances()[index]), balances)
+            self.assertEqual(simulator.get_turn_counts()[index], turns)
+            winner = game.check_game_over()
+            expected_winner = names.index(winner) if winner != "" else -1
+            self.assertEqual(simulator.get_winners()[index], expected_winner)
+
+    def test_run_finishes_games(self):
+        from batch_simulator import BatchSimulator
+
+        simulator = BatchSimulator(500, 4, 50, RENTS, 1000, buy_probability=1.0, seed=1)
+        winners = simulator.run()
+        self.assertFalse(simulator.get_running().any())
+        self.assertTrue(((winners >= 0) & (winners < 4)).all())
+        self.assertTrue((simulator.get_owners()[:, 0] == -1).all())
+
+
+class TournamentTest(unittest.TestCase):
+    """Contains tests for tournament.py"""
+
+    def test_seeded_games_repeat(self):
+        first = RealEstateGame(5)
+        second = RealEstateGame(5)
+        for game in (first, second):
+            game.create_spaces(50, RENTS)
+            game.create_player("Player 1", 1000)
+        rolls = [first.get_player("Player 1").roll_dice() for _ in range(20)]
+        self.assertEqual(rolls, [second.get_player("Player 1").roll_dice() for _ in range(20)])
+
+    def test_pool_results_replay(self):
+        from tournament import make_settings, replay_game, run_tournament
+
+        settings = make_settings(num_players=3, go_bonus=50, initial_balance=1000)
+        results = list(run_tournament(50, base_seed=11, settings=settings, workers=2, chunk_size=4, max_in_flight=2))
+        self.assertEqual(sorted(result.game_index for result in results), list(range(50)))
+        for result in results[::7]:
+            self.assertEqual(replay_game(11, result.game_index, settings), result)
+
+
+
+class TrajectoryTest(unittest.TestCase):
+    """Contains tests for trajectory.py"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_recorded_moves_add_up_to_the_results(self):
+        import numpy as np
+        from tournament import make_settings, play_game, run_tournament
+        from trajectory import TrajectoryReader, TrajectoryRecorder
+
+        settings = make_settings(num_players=3, go_bonus=50, initial_balance=1000)
+        with TrajectoryRecorder(self.directory.name, chunk_rows=500) as recorder:
+            results = [play_game(index, index, settings, recorder) for index in range(6)]
+        reader = TrajectoryReader(self.directory.name)
+        self.assertGreater(len(reader.chunks()), 2)
+        self.assertIsInstance(reader.chunks()[0]["balance_delta"], np.memmap)
+
+        games = reader.column("game")
+        for result in results:
+            rows = games == result.game_index
+            turns = reader.column("turn")[rows]
+            self.assertEqual(turns.tolist(), list(range(1, len(turns) + 1)))
+            for seat in range(3):
+                mine = rows & (reader.column("player") == seat)
+                received = reader.column("rent")[rows & (reader.column("paid_to") == seat)].sum()
+                balance = 1000 + reader.column("balance_delta")[mine].sum() - reader.column("purchase")[mine].sum() \
+                    + received
+                self.assertEqual(balance, result.balances[seat])
+                self.assertEqual(np.count_nonzero(reader.column("purchase")[mine]), result.properties_bought[seat])
+
+        # every move came from the dice, and went as far as they said
+        dice = reader.column("die1").astype(int) + reader.column("die2")
+        self.assertTrue(((dice >= 2) & (dice <= 12)).all())
+        moves = list(reader.scan(game=0, player=1))
+        for before, after in zip(moves, moves[1:]):
+            self.assertEqual((before.location + after.die1 + after.die2) % 25, after.location)
+
+        bankruptcies = list(reader.scan(lambda chunk: chunk["rent"] > 0, game=2))
+        self.assertTrue(all(row.game == 2 and row.rent > 0 and row.paid_to >= 0 for row in bankruptcies))
+
+        # tournaments record from every worker
+        record_dir = self.directory.name + "/tournament"
+        list(run_tournament(10, settings=settings, workers=2, chunk_size=4, record_dir=record_dir))
+        self.assertEqual(sorted(set(TrajectoryReader(record_dir).column("game").tolist())), list(range(10)))
+
+    def test_moves_record_their_dice_and_large_amounts(self):
+        from actions import Move, apply_actions
+        from trajectory import TrajectoryReader, TrajectoryRecorder
+        game = RealEstateGame()
+        game.create_spaces(3_000_000_000, [10, 20])
+        game.create_player("Ann", 5_000_000_000)
+        game.create_player("Bob", 5_000_000_000)
+        with TrajectoryRecorder(self.directory.name) as recorder:
+            game.set_recorder(recorder)
+            # the stream's last roll is not the move's: the dice were given
+            game.get_dice().roll()
+            apply_actions(game, [Move("Ann", (1, 2))])
+        row, = TrajectoryReader(self.directory.name).scan()
+        self.assertEqual((row.die1, row.die2, row.location, row.balance_delta), (1, 2, 0, 3_000_000_000))
+
+    def test_overhead_is_measured(self):
+        from trajectory import benchmark
+        results = benchmark(games=5)
+        # fixed-width rows, plus a small header per chunk
+        self.assertLess(results["bytes_per_row"], 43)
+        self.assertGreater(results["rows"], 0)
+
+
+class GameRegistryTest(unittest.TestCase):
+    """Contains tests for game_registry.py"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+        self.now = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_registry(self, **options):
+        from game_registry import GameRegistry
+        return GameRegistry(self.directory.name, clock=lambda: self.now, **options)
+
+    def test_least_recently_used_game_is_saved_and_reloaded(self):
+        registry = self.make_registry(max_games=2)
+        first = registry.get((1, 1), create=True)
+        first.create_spaces(50, RENTS)
+        first.create_player("Player 1", 1000)
+        first.move_player("Player 1", 4)
+        registry.get((1, 2), create=True)
+        registry.get((1, 3), create=True)
+        self.assertEqual(len(registry), 2)
+        self.assertIn((1, 1), registry)
+
+        reloaded = registry.get((1, 1))
+        self.assertIsNot(reloaded, first)
+        self.assertEqual(reloaded.get_player_current_position("Player 1"), 4)
+        self.assertIsNone(registry.get((2, 1)))
+
+    def test_idle_games_are_evicted(self):
+        registry = self.make_registry(ttl=10)
+        registry.get((1, 1), create=True)
+        self.now = 5
+        registry.get((1, 2), create=True)
+        self.now = 12
+        self.assertEqual(registry.evict(), 1)
+        self.assertEqual(len(registry), 1)
+        registry.remove((1, 1))
+        self.assertNotIn((1, 1), registry)
+
+
+class EventLogTest(unittest.TestCase):
+    """Contains tests for event_log.py"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_journal(self, max_games=1000):
+        import os
+        from event_log import EventLog, GameJournal
+        from game_registry import GameRegistry
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), max_games=max_games)
+        return GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+
+    def play(self, journal, key, moves):
+        rng = random.Random(key[1])
+        journal.create_spaces(key, 50, RENTS)
+        journal.create_player(key, "Player 1", 1000)
+        journal.create_player(key, "Player 2", 1000)
+        journal.set_started(key)
+        for turn in range(moves):
+            name = f"Player {turn % 2 + 1}"
+            journal.move_player(key, name, rng.randint(1, 6), rng.randint(1, 6))
+            journal.buy_space(key, name)
+
+    def test_events_round_trip(self):
+        from event_log import CREATE_SPACES, MOVE, decode_event, encode_event
+        for event in ((3, CREATE_SPACES, (None, 7), (50, RENTS)), (4, MOVE, (1, 2), ("Player 1", 3, 6))):
+            record = encode_event(*event)
+            self.assertEqual(decode_event(record[8:]), (event[0], event[1], event[2], tuple(event[3])))
+
+    def test_boards_of_any_size_are_logged(self):
+        from board import make_board
+        journal = self.make_journal()
+        journal.create_spaces((0, 1), 50, [10] * 70000)
+        board = make_board(75, [20, 30, 40], names=["A", "B", "C"], prices=[15, 25, 35], buyable=[True, False, True])
+        journal.set_board((0, 2), board)
+        journal.get_log().sync()
+
+        recovered = self.make_journal()
+        recovered.recover()
+        self.assertEqual(recovered.get_registry().get((0, 1)).get_board_size(), 70001)
+        self.assertEqual(recovered.get_registry().get((0, 2)).get_board(), board)
+
+    def test_recovers_from_snapshot_and_tail(self):
+        # with 2 games in memory, reading the expected results below saves games that already hold part of the
+        # tail, which recovery has to skip
+        for max_games in (1000, 2):
+            with self.subTest(max_games=max_games):
+                self.directory.cleanup()
+                self.check_recovery(max_games)
+
+    def check_recovery(self, max_games):
+        journal = self.make_journal(max_games)
+        for channel in range(4):
+            self.play(journal, (0, channel), 30)
+        journal.snapshot()
+        self.play(journal, (0, 9), 30)
+        journal.move_player((0, 1), "Player 1", 2, 3)
+        journal.get_log().sync()
+        expected = {channel: journal.get_registry().get((0, channel)).get_net_worth() for channel in (0, 1, 2, 3, 9)}
+
+        # a new process only has what reached the disk
+        recovered = self.make_journal(max_games)
+        applied = recovered.recover()
+        if max_games == 1000:
+            self.assertGreaterEqual(applied, 3 + 2 * 30 + 1)
+        for channel, net_worth in expected.items():
+            self.assertEqual(recovered.get_registry().get((0, channel)).get_net_worth(), net_worth)
+
+    def test_evicted_games_are_never_ahead_of_the_log(self):
+        import os
+        from event_log import EventLog, GameJournal, read_events
+        from game_registry import GameRegistry
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), max_games=1)
+        log = EventLog(os.path.join(self.directory.name, "log"), sync_every=10 ** 6, sync_interval=10 ** 6)
+        journal = GameJournal(registry, log)
+        self.play(journal, (0, 1), 5)
+        version = registry.get_version((0, 1))
+        # loading another game evicts the first, whose version must already be on disk
+        journal.create_spaces((0, 2), 50, RENTS)
+        self.assertEqual(len(registry), 1)
+        self.assertIn(version, [event[0] for event in read_events(os.path.join(self.directory.name, "log"))])
+        log.close()
+
+    def test_action_batches_are_logged_only_when_allowed(self):
+        from actions import Buy, InvalidAction, Move, Pass
+        journal = self.make_journal()
+        key = (0, 1)
+        journal.create_spaces(key, 50, RENTS)
+        journal.create_player(key, "Player 1", 1000)
+        journal.create_player(key, "Player 2", 1000)
+        journal.apply_actions(key, [Move("Player 1"), Buy("Player 1"), Pass("Player 1"), Move("Player 2")])
+        seq = journal.get_log().get_seq()
+        with self.assertRaises(InvalidAction):
+            journal.apply_actions(key, [Pass("Player 2"), Pass("Player 2")])
+        self.assertEqual(journal.get_log().get_seq(), seq)
+        journal.get_log().sync()
+
+        recovered = self.make_journal()
+        recovered.recover()
+        game = recovered.get_registry().get(key)
+        self.assertEqual(game.get_net_worth(), journal.get_registry().get(key).get_net_worth())
+        self.assertEqual(game.get_player_current_position("Player 2"),
+                         journal.get_registry().get(key).get_player_current_position("Player 2"))
+
+    def test_torn_record_is_ignored(self):
+        import glob
+        import os
+        from event_log import read_events
+        journal = self.make_journal()
+        self.play(journal, (0, 1), 5)
+        journal.get_log().close()
+        segment = glob.glob(os.path.join(self.directory.name, "log", "events-*.log"))[0]
+        with open(segment, "ab") as file:
+            file.write(b"\x10\x00\x00\x00garbage")
+        events = list(read_events(os.path.join(self.directory.name, "log")))
+        self.assertEqual(len(events), journal.get_log().get_seq())
+
+    def test_appends_after_a_torn_first_record_are_read(self):
+        import os
+        from event_log import EventLog, read_events
+        directory = os.path.join(self.directory.name, "log")
+        log = EventLog(directory)
+        log.append(3, (0, 1))
+        log.append(3, (0, 1))
+        log.close()
+        # the next segment was being started when the process crashed, halfway through its first record
+        with open(os.path.join(directory, f"events-{3:020d}.log"), "wb") as file:
+            file.write(b"\x10\x00\x00\x00garbage")
+        log = EventLog(directory)
+        log.append(3, (0, 1))
+        log.append(3, (0, 1))
+        log.close()
+        self.assertEqual([event[0] for event in read_events(directory)], [1, 2, 3, 4])
+
+
+class AnalyticsTest(unittest.TestCase):
+    """Contains tests for analytics.py"""
+
+    def test_long_run_figures(self):
+        from analytics import board_analytics
+        from board import make_board
+        analytics = board_analytics(make_board(200, RENTS))
+        self.assertIs(board_analytics(make_board(200, RENTS)), analytics)
+        self.assertAlmostEqual(analytics.rolls_per_turn, 1.2)
+        # every roll moves 7 spaces on average, so GO is passed 7 / 25 times a roll
+        self.assertAlmostEqual(analytics.go_bonus_per_turn, 200 * 1.2 * 7 / 25)
+        for probability in analytics.landing_probabilities:
+            self.assertAlmostEqual(probability, 1 / 25)
+        self.assertAlmostEqual(analytics.get_payback_turns(24, num_opponents=2), 1750 / (2 * 350 * 1.2 / 25))
+        self.assertIsNone(analytics.get_payback_turns(0))
+
+    def test_without_pairs_rolling_again(self):
+        from analytics import board_analytics, landings_from_go
+        from board import make_board
+        analytics = board_analytics(make_board(200, RENTS), pair_rolls_again=False)
+        self.assertAlmostEqual(analytics.rolls_per_turn, 1)
+        first_turn = landings_from_go(25, 1, pair_rolls_again=False)
+        self.assertAlmostEqual(first_turn[7], 6 / 36)
+        self.assertAlmostEqual(first_turn[0], 0)
+
+    def test_board_prices_and_large_boards(self):
+        from analytics import board_analytics, landings_from_go
+        from board import make_board
+        board = make_board(200, RENTS, prices=[100] * 24, buyable=[True] * 23 + [False])
+        analytics = board_analytics(board)
+        self.assertEqual(analytics.purchase_prices[1:], (100,) * 24)
+        self.assertEqual(analytics.rent_per_turn[24], 0)
+        self.assertIsNone(analytics.get_payback_turns(24))
+        self.assertAlmostEqual(analytics.get_payback_turns(23), 100 / (350 * 1.2 / 25))
+
+        size = 100_001
+        analytics = board_analytics(make_board(200, [10] * (size - 1)))
+        self.assertAlmostEqual(analytics.landing_probabilities[size // 2], 1 / size)
+        self.assertAlmostEqual(analytics.go_bonus_per_turn, 200 * 1.2 * 7 / size)
+        # ten turns from GO land on the same spaces of any board too big to go around in them
+        first_turns = landings_from_go(size, 10)
+        self.assertAlmostEqual(sum(first_turns), 12)
+        for space, landings in enumerate(landings_from_go(1000, 10)):
+            self.assertAlmostEqual(first_turns[space], landings)
+        self.assertAlmostEqual(max(first_turns[1000:]), 0)
+
+
+class OutboundQueueTest(unittest.TestCase):
+    """Contains tests for outbound.py"""
+
+    class Channel:
+        def __init__(self, channel_id):
+            self.id = channel_id
+
+    def test_messages_are_coalesced_per_channel(self):
+        import asyncio
+        from outbound import FakeTransport, OutboundQueue
+
+        async def run():
+            transport = FakeTransport()
+            queue = OutboundQueue(transport, window=0.01)
+            for number in range(10):
+                await queue.send(self.Channel(number % 2), f"message {number}")
+            await queue.close()
+            return transport.sent
+
+        sent = asyncio.run(run())
+        self.assertEqual(sorted(sent), [(0, "message 0\nmessage 2\nmessage 4\nmessage 6\nmessage 8"),
+                                        (1, "message 1\nmessage 3\nmessage 5\nmessage 7\nmessage 9")])
+
+    def test_long_messages_are_split_at_line_breaks(self):
+        import asyncio
+        from outbound import MAX_MESSAGE_LENGTH, FakeTransport, OutboundQueue, split_message
+        self.assertEqual(split_message("ab\ncd\nefgh", 5), ["ab\ncd", "efgh"])
+        self.assertEqual(split_message("abcdefg", 3), ["abc", "def", "g"])
+
+        async def run():
+            transport = FakeTransport()
+            queue = OutboundQueue(transport, window=0.01)
+            await queue.send(self.Channel(1), "\n".join(f"{place}. {'x' * 100}" for place in range(1, 26)))
+            await queue.close()
+            return [content for _, content in transport.sent]
+
+        sent = asyncio.run(run())
+        self.assertEqual(len(sent), 2)
+        self.assertTrue(all(len(content) <= MAX_MESSAGE_LENGTH for content in sent))
+        self.assertTrue(sent[1].startswith("20. "))
+
+    def test_rate_limits_and_backpressure(self):
+        import asyncio
+        from outbound import FakeTransport, OutboundQueue
+
+        async def run():
+            # the server allows fewer sends than the queue's bucket thinks, so some sends are turned away
+            transport = FakeTransport(limit=2, per=0.2)
+            queue = OutboundQueue(transport, window=0, max_pending=2, bucket_limit=5, bucket_per=0.2)
+            channel = self.Channel(1)
+            for number in range(6):
+                await queue.send(channel, "x" * 1500 + str(number))
+            await queue.close()
+            return transport
+
+        transport = asyncio.run(run())
+        self.assertEqual([content[-1] for _, content in transport.sent], list("012345"))
+        self.assertGreater(transport.rejected, 0)
+
+    def test_idle_channels_are_stopped(self):
+        import asyncio
+        from outbound import FakeTransport, OutboundQueue
+        now = [0.0]
+
+        async def run():
+            transport = FakeTransport()
+            queue = OutboundQueue(transport, window=0, idle_seconds=10, clock=lambda: now[0])
+            for channel_id in (1, 2):
+                await queue.send(self.Channel(channel_id), "hello")
+            await queue.flush()
+            now[0] = 11
+            await queue.send(self.Channel(3), "hello")
+            self.assertEqual(queue.get_channel_count(), 1)
+            # a stopped channel starts again with its next message
+            await queue.send(self.Channel(1), "again")
+            await queue.close()
+            return transport.sent
+
+        self.assertEqual(sorted(asyncio.run(run())), [(1, "again"), (1, "hello"), (2, "hello"), (3, "hello")])
+
+
+class StrategyTest(unittest.TestCase):
+    """Contains tests for strategy.py"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def position(self, location, balance, theirs=()):
+        from board import make_board
+        from strategy import Position, NO_OWNER, THEIRS
+        owners = tuple(THEIRS if space in theirs else NO_OWNER for space in range(len(RENTS) + 1))
+        return Position(location, balance, owners, make_board(50, RENTS), 1)
+
+    def test_strategies_decide(self):
+        from strategy import make_strategy
+        greedy, threshold, expectimax = (make_strategy(name) for name in ("greedy", "threshold", "expectimax"))
+        # space 1 costs 250
+        self.assertTrue(greedy.decide(self.position(1, 600)))
+        self.assertFalse(threshold.decide(self.position(1, 600)))
+        self.assertTrue(threshold.decide(self.position(1, 1000)))
+        self.assertFalse(greedy.decide(self.position(0, 1000)))
+        self.assertFalse(greedy.decide(self.position(1, 250)))
+        self.assertTrue(expectimax.decide(self.position(1, 5000)))
+        # space 22 costs 1750, and the opponent's expensive spaces ahead could bankrupt a player left with 50
+        self.assertFalse(expectimax.decide(self.position(22, 1800, theirs=range(23, 25))))
+        with self.assertRaises(ValueError):
+            make_strategy("random")
+
+    def test_engine_falls_back_when_out_of_time(self):
+        import asyncio
+        import time
+        from strategy import GreedyStrategy, StrategyEngine
+
+        class SlowStrategy:
+            def decide(self, position):
+                time.sleep(0.2)
+                return False
+
+        async def run():
+            engine = StrategyEngine(time_budget=0.05, fallback=GreedyStrategy())
+            return await engine.decide(SlowStrategy(), self.position(1, 600))
+
+        self.assertTrue(asyncio.run(run()))
+
+    def test_engine_falls_back_while_the_executor_is_full(self):
+        import asyncio
+        import time
+        from strategy import GreedyStrategy, StrategyEngine
+
+        class SlowStrategy:
+            calls = 0
+
+            def decide(self, position):
+                SlowStrategy.calls += 1
+                time.sleep(0.2)
+                return False
+
+        async def run():
+            engine = StrategyEngine(time_budget=0.05, fallback=GreedyStrategy(), max_pending=1)
+            self.assertTrue(await engine.decide(SlowStrategy(), self.position(1, 600)))
+            # the first decision still holds the executor, so this one is not even queued
+            self.assertTrue(await engine.decide(SlowStrategy(), self.position(1, 600)))
+            self.assertEqual((SlowStrategy.calls, engine.get_pending()), (1, 1))
+            await asyncio.sleep(0.3)
+            self.assertEqual(engine.get_pending(), 0)
+            await engine.decide(SlowStrategy(), self.position(1, 600))
+            self.assertEqual(SlowStrategy.calls, 2)
+
+        asyncio.run(run())
+
+    def test_bot_turns_advance_the_game(self):
+        import asyncio
+        import os
+        from dice import DiceStream
+        from event_log import EventLog, GameJournal
+        from game_registry import GameRegistry
+        from strategy import ExpectimaxStrategy, GreedyStrategy, StrategyEngine, play_bot_turn
+
+        registry = GameRegistry(os.path.join(self.directory.name, "games"))
+        journal = GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+        key = (0, 1)
+        journal.create_spaces(key, 50, RENTS)
+        journal.create_player(key, "Greedy", 1000)
+        journal.create_player(key, "Expectimax", 1000)
+        journal.set_started(key)
+        # seeded, as an unlucky game can end in fewer turns than checked for below
+        registry.get(key).set_dice(DiceStream(1))
+        strategies = {"Greedy": GreedyStrategy(), "Expectimax": ExpectimaxStrategy(depth=1)}
+
+        async def run():
+            engine = StrategyEngine()
+            for _ in range(200):
+                game = registry.get(key)
+                if game.check_game_over() != "":
+                    break
+                name = game.get_active_player()
+                await play_bot_turn(journal, key, name, strategies[name], engine)
+                game = registry.get(key)
+                if game.check_game_over() == "":
+                    self.assertNotEqual(game.get_active_player(), name)
+
+        asyncio.run(run())
+        self.assertGreater(registry.get(key).get_turns(), 10)
+
+
+class PolicyTest(unittest.TestCase):
+    """Contains tests for policy.py"""
+
+    def setUp(self):
+        import os
+        import tempfile
+        from board import make_board
+        from policy import build_policy
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "policy.bin")
+        self.board = make_board(200, RENTS)
+        build_policy(self.path, self.board, max_opponents=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_table_answers_from_the_mapping(self):
+        import numpy as np
+        from policy import MINE, NO_OWNER, THEIRS, PolicyTable, solve
+        from board import make_board
+        table = PolicyTable(self.path)
+        self.assertTrue(table.matches(self.board))
+        self.assertFalse(table.matches(make_board(100, RENTS)))
+        # buying needs a reserve, and more of one for the dearer spaces
+        self.assertTrue(table.should_buy(1, 4000, 1))
+        self.assertFalse(table.should_buy(1, 300, 1))
+        self.assertFalse(table.should_buy(24, 1800, 1))
+        self.assertFalse(table.should_buy(1, 4000, 0))
+        self.assertLess(table.get_value(24, 400, THEIRS, 1), table.get_value(24, 400, MINE, 1))
+        self.assertGreaterEqual(table.get_value(5, 2000, NO_OWNER, 1), table.get_value(5, 2000, MINE, 1))
+
+        policy, values = solve(self.board, max_opponents=2)
+        self.assertTrue(np.array_equal(table.policy, policy))
+        locations, balances, opponents = np.array([1, 12, 24, 24]), np.array([4000, 2500, 1800, 9000]), \
+            np.array([1, 2, 1, 5])
+        self.assertEqual(table.should_buy_many(locations, balances, opponents).tolist(),
+                         [table.should_buy(*state) for state in zip(locations, balances, opponents)])
+        table.close()
+
+    def test_bots_and_simulators_use_the_table(self):
+        import pickle
+        from batch_simulator import BatchSimulator
+        from board import make_board
+        from strategy import MINE, NO_OWNER, PolicyStrategy, Position
+        strategy = pickle.loads(pickle.dumps(PolicyStrategy(self.path)))
+        owners = (NO_OWNER,) * 25
+        self.assertTrue(strategy.decide(Position(1, 4000, owners, self.board, 1)))
+        self.assertFalse(strategy.decide(Position(1, 300, owners, self.board, 1)))
+        self.assertFalse(strategy.decide(Position(1, 4000, (NO_OWNER, MINE) + owners[2:], self.board, 1)))
+        # boards the table was not solved for, and missing tables, are left to the fallback
+        self.assertTrue(strategy.decide(Position(1, 4000, owners, make_board(100, RENTS), 1)))
+        self.assertTrue(PolicyStrategy(self.path + ".missing").decide(Position(1, 4000, owners, self.board, 1)))
+
+        from policy import open_policy
+        simulator = BatchSimulator(50, 2, 200, RENTS, 1500, seed=0, policy=open_policy(self.path))
+        simulator.run(max_turns=300)
+        self.assertTrue((simulator.get_owners() >= 0).any())
+        with self.assertRaises(ValueError):
+            BatchSimulator(5, 2, 100, RENTS, 1500, policy=open_policy(self.path))
+
+    def test_rebuilt_tables_are_remapped(self):
+        from board import make_board
+        from policy import build_policy, open_policy
+        old = open_policy(self.path)
+        self.assertIs(open_policy(self.path), old)
+        board = make_board(100, RENTS)
+        build_policy(self.path, board, max_opponents=2)
+        new = open_policy(self.path)
+        self.assertTrue(new.matches(board))
+        # the old mapping still reads the table it was opened on
+        self.assertTrue(old.matches(self.board))
+        self.assertTrue(old.should_buy(1, 4000, 1))
+
+
+class GameActorTest(unittest.TestCase):
+    """Contains tests for game_actor.py"""
+
+    def test_commands_run_in_order_one_at_a_time(self):
+        import asyncio
+        from game_actor import GameActors
+
+        class SlowCommands:
+            def __init__(self):
+                self.running = 0
+                self.calls = []
+
+            async def call(self, command, key, user, *args):
+                self.running += 1
+                assert self.running == 1, "commands of one game overlapped"
+                await asyncio.sleep(0.001)
+                self.calls.append((key, command, user))
+                self.running -= 1
+                if command == "fail":
+                    raise ValueError("bad command")
+                return [f"{command} {user} {len(self.calls)}"]
+
+        commands = SlowCommands()
+
+        async def run():
+            actors = GameActors(commands, mailbox_size=2)
+            key = (0, 1)
+            sends = [actors.call("join", key, "Ann"), actors.call("roll", key, "Ann"), actors.call("join", key, "Ann"),
+                     actors.call("join", key, "Ann"), actors.call("fail", key, "Bob"), actors.call("roll", key, "Bob")]
+            replies = await asyncio.gather(*sends, return_exceptions=True)
+            self.assertEqual(actors.get_actor(key).coalesced, 2)
+            # once the join has run, a copy is a new command
+            replies.append(await actors.call("join", key, "Ann"))
+            await actors.close()
+            return replies
+
+        replies = asyncio.run(run())
+        # the copies sent while the first join was waiting in the mailbox share its reply
+        self.assertEqual(replies[:4], [["join Ann 1"], ["roll Ann 2"], ["join Ann 1"], ["join Ann 1"]])
+        self.assertIsInstance(replies[4], ValueError)
+        self.assertEqual(replies[5:], [["roll Bob 4"], ["join Ann 5"]])
+        self.assertEqual([call[1] for call in commands.calls], ["join", "roll", "fail", "roll", "join"])
+
+    def test_crowded_channels_come_out_whole(self):
+        import asyncio
+        from game_actor import load_test
+        results = asyncio.run(load_test(channels=2, commands_per_channel=200))
+        self.assertEqual(results["commands"], 400)
+        self.assertEqual(results["coalesced"], 2 * (4 * 2 + 1))
+        self.assertGreaterEqual(results["max_ms"], results["p50_ms"])
+
+
+class MetricsTest(unittest.TestCase):
+    """Contains tests for metrics.py"""
+
+    def tearDown(self):
+        import metrics
+        metrics.uninstrument()
+
+    def test_instrumented_calls_are_timed(self):
+        import metrics
+        from compact_game import CompactGame
+        collected = metrics.Metrics()
+        original = RealEstateGame.move_player
+        metrics.instrument(RealEstateGame, CompactGame, metrics=collected)
+        for game_class in (RealEstateGame, CompactGame):
+            game = game_class()
+            game.create_spaces(50, RENTS)
+            game.create_player("Player 1", 1000)
+            game.move_player("Player 1", 3)
+            game.buy_space("Player 1")
+            game.check_game_over()
+        metrics.uninstrument()
+        self.assertIs(RealEstateGame.move_player, original)
+
+        histograms = collected.snapshot()["histograms"]
+        for method in metrics.GAME_METHODS:
+            self.assertEqual(histograms[("game_call_seconds", (("method", method),))]["count"], 2)
+
+    def test_prometheus_endpoint(self):
+        import urllib.request
+        import metrics
+        collected = metrics.Metrics()
+        collected.count("commands", command="roll")
+        collected.observe("command_seconds", 0.002, command="roll")
+        collected.gauge("active_games", lambda: 3)
+        server = metrics.MetricsServer(collected, port=0)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.get_port()}/metrics") as response:
+                text = response.read().decode("utf-8")
+        finally:
+            server.stop()
+        self.assertIn('commands_total{command="roll"} 1', text)
+        self.assertIn('command_seconds_bucket{command="roll",le="0.005"} 1', text)
+        self.assertIn('command_seconds_count{command="roll"} 1', text)
+        self.assertIn("active_games 3", text)
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Contains tests for benchmark.py"""
+
+    def test_suite_and_comparison(self):
+        import copy
+        import benchmark
+        results = benchmark.run_suite(player_counts=(2,), game_counts=(3,), max_turns=50)
+        case = results["cases"][0]
+        self.assertGreater(case["turns"], 0)
+        self.assertGreater(case["peak_memory_bytes"], 0)
+        self.assertEqual(benchmark.compare(results, results), [])
+
+        slower = copy.deepcopy(results)
+        slower["cases"][0]["turns_per_second"] = case["turns_per_second"] / 2
+        slower["cases"][0]["peak_memory_bytes"] = case["peak_memory_bytes"] * 1.1
+        regressions = benchmark.compare(slower, results, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("turns_per_second", regressions[0])
+
+
+
+class PlayerStatsTest(unittest.TestCase):
+    """Contains tests for player_stats.py"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play(self, game_class, seed):
+        game = game_class(seed)
+        game.create_spaces(50, RENTS)
+        for name in ("Ann", "Bob", "Cy"):
+            game.create_player(name, 1000)
+        names = ["Ann", "Bob", "Cy"]
+        turn = 0
+        while game.check_game_over() == "":
+            name = names[turn % 3]
+            turn += 1
+            if game.get_player_account_balance(name) > 0:
+                die1, die2 = game.get_player(name).roll_dice()
+                game.move_player(name, die1 + die2)
+                game.buy_space(name)
+        return game
+
+    def test_tallies_match_between_engines(self):
+        from compact_game import CompactGame
+        game = self.play(RealEstateGame, 3)
+        tallies = game.get_tallies()
+        self.assertEqual(self.play(CompactGame, 3).get_tallies(), tallies)
+        self.assertEqual(sum(tally[1] for tally in tallies.values()), sum(tally[2] for tally in tallies.values()))
+        self.assertEqual(sum(tally[3] for tally in tallies.values()), 2)
+        self.assertEqual(tallies[game.check_game_over()][3], 0)
+
+    def test_careers_add_up_across_batches(self):
+        import os
+        from player_stats import StatsStore
+        path = os.path.join(self.directory.name, "stats.db")
+        store = StatsStore(path, batch_games=3)
+        games = [self.play(RealEstateGame, seed) for seed in range(7)]
+        for game in games:
+            store.record_game(game)
+        # the last game is still waiting for its batch
+        self.assertEqual(sum(stats.games for stats in store.top(3)), 18)
+        store.close()
+
+        store = StatsStore(path)
+        ann = store.get("Ann")
+        self.assertEqual(ann.games, 7)
+        self.assertEqual(ann.wins, sum(game.check_game_over() == "Ann" for game in games))
+        self.assertEqual(ann.rent_paid, sum(game.get_tallies()["Ann"][1] for game in games))
+        self.assertIsNone(store.get("Dee"))
+        leaders = store.top(3)
+        self.assertEqual(sum(stats.wins for stats in leaders), 7)
+        self.assertEqual([stats.wins for stats in leaders], sorted((stats.wins for stats in leaders), reverse=True))
+        store.close()
+
+    def test_commands_record_finished_games(self):
+        import asyncio
+        import os
+        from event_log import EventLog, GameJournal
+        from game_commands import GameCommands
+        from game_registry import GameRegistry
+        from player_stats import StatsStore
+
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), game_factory=lambda: RealEstateGame(4))
+        journal = GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+        store = StatsStore(os.path.join(self.directory.name, "stats.db"))
+        # without a GO bonus everyone runs out of money sooner or later
+        commands = GameCommands(journal, go_bonus=0, initial_balance=300, stats=store, max_bot_turns=20)
+        key = (0, 1)
+
+        async def run():
+            self.assertIn("not finished a game", (await commands.call("stats", key, "Ann"))[0])
+            await commands.call("join", key, "Ann")
+            await commands.call("add_bot", key, "Ann", "Greedy", "greedy")
+            await commands.call("add_bot", key, "Ann", "Threshold", "threshold")
+            await commands.call("begin", key, "Ann")
+            while registry.get(key).check_game_over() == "":
+                if "Type !buy" in (await commands.call("roll", key, "Ann"))[-1]:
+                    await commands.call("pass", key, "Ann")
+            return (await commands.call("stats", key, "Ann", "Greedy"), await commands.call("leaderboard", key, "Ann"),
+                    await commands.call("leaderboard", key, "Ann", -1),
+                    await commands.call("leaderboard", key, "Ann", "ten"))
+
+        stats, leaders, first, wrong = asyncio.run(run())
+        self.assertEqual(wrong, ["ten is not a number of players."])
+        self.assertIn("Greedy: ", stats[0])
+        self.assertIn("1 games", stats[0])
+        self.assertTrue(leaders[0].startswith("1. "))
+        self.assertEqual(leaders[0].count("\n"), 2)
+        # a count below 1 still shows the leader, rather than every player
+        self.assertEqual(first, [leaders[0].split("\n")[0]])
+        journal.get_log().close()
+        store.close()
+
+
+class GameServerTest(unittest.TestCase):
+    """Contains tests for game_commands.py and game_server.py"""
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_commands_play_a_game(self):
+        import asyncio
+        import os
+        from event_log import EventLog, GameJournal
+        from game_commands import GameCommands
+        from game_registry import GameRegistry
+
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), game_factory=lambda: RealEstateGame(1))
+        journal = GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+        commands = GameCommands(journal)
+        key = (0, 1)
+
+        async def run():
+            self.assertIn("Type !create", (await commands.call("roll", key, "Ann"))[0])
+            await commands.call("create", key, "Ann")
+            await commands.call("join", key, "Ann")
+            await commands.call("add_bot", key, "Ann", "Bot", "greedy")
+            self.assertIn("It is Ann's turn", (await commands.call("begin", key, "Ann"))[-1])
+            self.assertEqual(await commands.call("buy", key, "Ann"), ["There is nothing to buy right now."])
+            for _ in range(10):
+                messages = await commands.call("roll", key, "Ann")
+                if any("Type !buy" in message for message in messages):
+                    await commands.call("buy", key, "Ann")
+
+        asyncio.run(run())
+        game = registry.get(key)
+        self.assertEqual(game.get_bot("Bot"), "greedy")
+        self.assertGreater(game.get_turns(), 10)
+
+        # the bots and the buy phase are in the log, so a restart carries on where the game was
+        journal.get_log().close()
+        recovered = GameJournal(GameRegistry(os.path.join(self.directory.name, "games")),
+                                EventLog(os.path.join(self.directory.name, "log")))
+        recovered.recover()
+        again = recovered.get_registry().get(key)
+        self.assertEqual(again.get_bot("Bot"), "greedy")
+        self.assertEqual(again.get_interaction_phase(), game.get_interaction_phase())
+        self.assertEqual(again.get_player_account_balance("Ann"), game.get_player_account_balance("Ann"))
+        recovered.get_log().close()
+
+    def test_finished_games_answer_turn_commands(self):
+        import asyncio
+        import os
+        from event_log import EventLog, GameJournal
+        from game_commands import GameCommands
+        from game_registry import GameRegistry
+
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), game_factory=lambda: RealEstateGame(8))
+        journal = GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+        commands = GameCommands(journal)
+        key = (0, 1)
+
+        async def run():
+            await commands.call("join", key, "Ann")
+            await commands.call("add_bot", key, "Ann", "Bot", "greedy")
+            await commands.call("begin", key, "Ann")
+            while registry.get(key).check_game_over() == "":
+                if any("Type !buy" in message for message in await commands.call("roll", key, "Ann")):
+                    await commands.call("buy", key, "Ann")
+            # with this seed the game ends on a move that leaves Ann on a space nobody owns, which used to leave her
+            # in the buy phase
+            for command in ("roll", "buy", "pass"):
+                self.assertEqual(await commands.call(command, key, "Ann"),
+                                 ["The game is over, Ann won. Type !create to play again."])
+            self.assertEqual(registry.get(key).get_interaction_phase(), ("Ann", "over"))
+
+        asyncio.run(run())
+        journal.get_log().close()
+
+    def test_create_starts_over_once_a_game_ends(self):
+        import asyncio
+        import os
+        from event_log import EventLog, GameJournal
+        from game_commands import GameCommands
+        from game_registry import GameRegistry
+
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), game_factory=lambda: RealEstateGame(8))
+        journal = GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+        commands = GameCommands(journal)
+        key = (0, 1)
+
+        async def run():
+            await commands.call("create", key, "Ann")
+            self.assertIn("already been created", (await commands.call("create", key, "Ann"))[0])
+            await commands.call("join", key, "Ann")
+            await commands.call("add_bot", key, "Ann", "Bot", "greedy")
+            await commands.call("begin", key, "Ann")
+            if any("Type !buy" in message for message in await commands.call("roll", key, "Ann")):
+                await commands.call("buy", key, "Ann")
+            owned = registry.get(key).get_holdings()
+            self.assertIn("already being played", (await commands.call("create", key, "Ann"))[0])
+            self.assertEqual(registry.get(key).get_holdings(), owned)
+
+            # nobody takes a seat once the game has begun, which would change whose turn it is
+            active = registry.get(key).get_active_player()
+            self.assertIn("already begun", (await commands.call("join", key, "Bea"))[0])
+            self.assertIn("already begun", (await commands.call("add_bot", key, "Ann", "Bot 2"))[0])
+            self.assertEqual((registry.get(key).get_active_player(), len(registry.get(key).get_holdings())),
+                             (active, 2))
+
+            while registry.get(key).check_game_over() == "":
+                if any("Type !buy" in message for message in await commands.call("roll", key, "Ann")):
+                    await commands.call("buy", key, "Ann")
+            # or after it is over, which would start it again
+            self.assertIn("The game is over", (await commands.call("join", key, "Bea"))[0])
+            self.assertNotEqual(registry.get(key).check_game_over(), "")
+            self.assertIn("has created a game", (await commands.call("create", key, "Ann"))[0])
+            self.assertEqual(await commands.call("join", key, "Ann"), ["Ann has joined the game"])
+            await commands.call("add_bot", key, "Ann", "Bot", "greedy")
+            self.assertIn("The game has begun", (await commands.call("begin", key, "Ann"))[0])
+
+        asyncio.run(run())
+        game = registry.get(key)
+        self.assertEqual(game.get_turns(), 0)
+
+        # the new game replaces the old one on recovery as well
+        journal.get_log().close()
+        recovered = GameJournal(GameRegistry(os.path.join(self.directory.name, "recovered")),
+                                EventLog(os.path.join(self.directory.name, "log")))
+        recovered.recover()
+        again = recovered.get_registry().get(key)
+        self.assertEqual(again.get_holdings(), game.get_holdings())
+        self.assertEqual(again.get_net_worth(), game.get_net_worth())
+        self.assertEqual(again.check_game_over(), "")
+        recovered.get_log().close()
+
+    def test_bot_turns_are_capped(self):
+        import asyncio
+        import os
+        from event_log import EventLog, GameJournal
+        from game_commands import GameCommands
+        from game_registry import GameRegistry
+
+        registry = GameRegistry(os.path.join(self.directory.name, "games"), game_factory=lambda: RealEstateGame(3))
+        journal = GameJournal(registry, EventLog(os.path.join(self.directory.name, "log")))
+        commands = GameCommands(journal, max_bot_turns=5)
+        key = (0, 1)
+
+        async def run():
+            await commands.call("add_bot", key, "Ann", "A", "threshold")
+            await commands.call("add_bot", key, "Ann", "B", "threshold")
+            self.assertIn("at least 1 person", (await commands.call("begin", key, "Ann"))[0])
+            for number in range(4):
+                await commands.call("add_bot", key, "Ann", f"Bot {number}", "greedy")
+            await commands.call("join", key, "Ann")
+            # 6 bots are seated before Ann, so the bots stop after their 5th turn in a row
+            self.assertIn("Type !roll to let them carry on", (await commands.call("begin", key, "Ann"))[-1])
+            self.assertEqual(registry.get(key).get_active_player(), "Bot 3")
+            self.assertIn("It is Ann's turn", (await commands.call("roll", key, "Ann"))[-1])
+
+            # once nobody but bots has money, they play max_bot_turns more turns and the richest wins
+            journal.concede(key, "Ann")
+            journal.end_turn(key)
+            game = registry.get(key)
+            messages = await commands.call("roll", key, "Ann")
+            self.assertIn("Only bots are left", messages[-1])
+            winner = game.check_game_over()
+            self.assertNotEqual(winner, "")
+            self.assertEqual(sum(balance > 0 for balance in (game.get_player_account_balance(name)
+                                                                for name in game.get_holdings())), 1)
+
+        asyncio.run(run())
+        # the concessions are in the log
+        journal.get_log().close()
+        recovered = GameJournal(GameRegistry(os.path.join(self.directory.name, "recovered")),
+                                EventLog(os.path.join(self.directory.name, "log")))
+        recovered.recover()
+        self.assertEqual(recovered.get_registry().get(key).check_game_over(), registry.get(key).check_game_over())
+        recovered.get_log().close()
+
+    def test_games_survive_worker_restarts(self):
+        import asyncio
+        import os
+        from game_server import FakeDiscordClient, GameServer, WorkerError, shard_for
+
+        games_dir = os.path.join(self.directory.name, "games")
+        log_dir = os.path.join(self.directory.name, "log")
+
+        async def run():
+            server = GameServer(2, games_dir, log_dir)
+            await server.start()
+            try:
+                client = FakeDiscordClient(server, channels=6, rolls=3)
+                self.assertGreater(await client.run(), 6 * 4)
+                with self.assertRaises(WorkerError):
+                    await server.call("shout", (1, 0), "Person 0")
+
+                key = (1, 0)
+                shard = shard_for(key, 2)
+                # a killed worker is started again and recovers the game from its log
+                server._workers[shard].process.kill()
+                await asyncio.sleep(0.5)
+                after = await server.call("roll", key, "Person 0")
+                self.assertNotIn("Type !create", "".join(after))
+                # a command sent while its worker restarts waits for the new worker
+                other = next(channel for channel in range(6) if shard_for((1, channel), 2) != shard)
+                _, joined = await asyncio.gather(server.restart_worker(1 - shard),
+                                                 server.call("join", (1, other), "Latecomer"))
+                self.assertEqual(len(joined), 1)
+                self.assertNotIn("Type !create", "".join(await server.call("roll", (1, other), f"Person {other}")))
+            finally:
+                await server.close()
+
+        asyncio.run(run())
+        with self.assertRaises(ValueError):
+            asyncio.run(GameServer(3, games_dir, log_dir).start())
+
+    def test_workers_snapshot_while_serving(self):
+        import asyncio
+        import os
+        from event_log import read_checkpoint
+        from game_server import GameServer, shard_for
+
+        log_dir = os.path.join(self.directory.name, "log")
+        key = (1, 0)
+
+        async def run():
+            server = GameServer(1, os.path.join(self.directory.name, "games"), log_dir, snapshot_seconds=0.2)
+            await server.start()
+            try:
+                await server.call("create", key, "Ann")
+                await server.call("join", key, "Ann")
+                await asyncio.sleep(0.5)
+                # the checkpoint is taken while the worker keeps running
+                return read_checkpoint(os.path.join(log_dir, f"shard-{shard_for(key, 1)}"))
+            finally:
+                await server.close()
+
+        self.assertGreaterEqual(asyncio.run(run()), 2)
 
 
-test = UnitTest()
-test.just_messin()
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+from collections import namedtuple
+
+# the actions of a turn. Move rolls the player's dice, unless dice gives the roll as (die1, die2), and moves the
+# player. Buy buys the space the player is on. Pass ends the player's turn, leaving whatever they could still do
+Move = namedtuple("Move", ["player", "dice"], defaults=[None])
+Buy = namedtuple("Buy", ["player"])
+Pass = namedtuple("Pass", ["player"])
+
+# what each action did. go_bonus is the bonus collected (0 if GO was not reached, several bonuses on boards smaller
+# than the roll), rent is what was actually paid to paid_to (None if no rent was due), and winner is the winner's
+# name or an empty string
+MoveResult = namedtuple("MoveResult", ["player", "dice", "start", "location", "go_bonus", "rent", "paid_to",
+                                       "bankrupt", "winner"])
+BuyResult = namedtuple("BuyResult", ["player", "location", "price"])
+PassResult = namedtuple("PassResult", ["player", "next_player"])
+
+# the interaction phases of a player who may buy the space they landed on, before passing the turn or rolling again
+BUY_PHASES = ("buy", "buy_and_roll")
+
+
+class InvalidAction(ValueError):
+    """Raised by apply_actions() when an action breaks the rules. index is the position of the action in the batch,
+    and reason says what was wrong."""
+
+    def __init__(self, index, action, reason):
+        super().__init__(f"action {index} {action} is not allowed: {reason}")
+        self.index = index
+        self.action = action
+        self.reason = reason
+
+
+def apply_actions(game, actions):
+    """Takes in game: a RealEstateGame or CompactGame, and actions: a list of Move, Buy and Pass. Applies the actions
+    in order and returns a list with the MoveResult, BuyResult or PassResult of each. Every action must be taken by
+    the player whose turn it is. A player moves again only after rolling a pair and passes only after moving, which
+    the game tracks across batches (see get_turn_state()), and buys only right after a move, or at the start of a
+    batch while the game has them in a buy phase. If any action is not allowed, an
+    InvalidAction is raised and the game is put back the way it was before the batch, dice included."""
+    state = game.save_state()
+    results = []
+    try:
+        for index, action in enumerate(actions):
+            if isinstance(action, Buy) and not _may_buy(game, action.player, results[-1] if results else None):
+                raise InvalidAction(index, action, f"{action.player} has not just landed on a space")
+            results.append(_apply(game, index, action))
+    except BaseException:
+        game.restore_state(state)
+        raise
+    return results
+
+
+def _may_buy(game, name, previous):
+    """Returns whether the player may try to buy: right after their move in the batch, or at the start of a batch
+    when the game is waiting for them to decide"""
+    if previous is not None:
+        return isinstance(previous, MoveResult)
+    phase = game.get_interaction_phase()
+    return phase in ((name, buy_phase) for buy_phase in BUY_PHASES)
+
+
+def _apply(game, index, action):
+    """Validates and applies one action, returning its result"""
+    name = action.player
+    if not game.check_created():
+        raise InvalidAction(index, action, "the board has not been created")
+    if game.get_player(name) is None:
+        raise InvalidAction(index, action, f"there is no player named {name}")
+    if game.get_active_player() != name:
+        raise InvalidAction(index, action, f"it is {game.get_active_player()}'s turn")
+
+    if isinstance(action, Pass):
+        if game.get_turn_state() == "roll":
+            raise InvalidAction(index, action, f"{name} has not rolled yet")
+        return PassResult(name, game.end_turn())
+
+    if game.check_game_over() != "":
+        raise InvalidAction(index, action, "the game is over")
+    balance = game.get_player_account_balance(name)
+    if balance <= 0:
+        raise InvalidAction(index, action, f"{name} has no money left")
+
+    if isinstance(action, Buy):
+        location = game.get_player_current_position(name)
+        if not game.buy_space(name):
+            raise InvalidAction(index, action, f"{name} cannot buy space {location}")
+        return BuyResult(name, location, game.get_space(location).get_purchase_price())
+
+    if not isinstance(action, Move):
+        raise InvalidAction(index, action, "unknown action")
+    if game.get_turn_state() == "pass":
+        raise InvalidAction(index, action, f"{name} only rolls again after a pair")
+    dice = game.get_player(name).roll_dice() if action.dice is None else tuple(action.dice)
+    if len(dice) != 2 or not all(die in (1, 2, 3, 4, 5, 6) for die in dice):
+        raise InvalidAction(index, action, "dice must be two numbers from 1 to 6")
+    start = game.get_player_current_position(name)
+    space = game.move_player(name, dice[0] + dice[1], dice)
+    go_bonus = game.get_go_bonus() * ((start + dice[0] + dice[1]) // game.get_board_size())
+    owner = space.get_owner()
+    rent, paid_to = 0, None
+    new_balance = game.get_player_account_balance(name)
+    if owner is not None and owner != name:
+        rent, paid_to = balance + go_bonus - new_balance, owner
+    return MoveResult(name, dice, start, game.get_player_current_position(name), go_bonus, rent, paid_to,
+                      new_balance <= 0, game.check_game_over())
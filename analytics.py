@@ -0,0 +1,118 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from board import make_board
+
+# the chance of each total of two six-sided dice, split into pairs (which roll again) and everything else
+PAIR_TOTALS = {2 * die: 1 / 36 for die in range(1, 7)}
+OTHER_TOTALS = {total: (6 - abs(total - 7) - (total % 2 == 0)) / 36 for total in range(3, 12)}
+
+
+class BoardAnalytics(namedtuple("BoardAnalytics", ["landing_probabilities", "rolls_per_turn", "landings_per_turn",
+                                                   "go_bonus_per_turn", "rent_per_turn", "purchase_prices"])):
+    """The exact long-run figures of one board. landing_probabilities is the chance that a roll ends on each space,
+    landings_per_turn is how many times per turn a player lands on each space, go_bonus_per_turn is the GO bonus a
+    player collects per turn, and rent_per_turn is the rent each space earns per opponent turn once it is owned (0
+    for spaces that cannot be bought). The per-space figures are tuples indexed by space, GO included."""
+
+    def get_payback_turns(self, space, num_opponents=1):
+        """Takes in space and num_opponents. Returns how many rounds it takes for the space's rent to pay back its
+        purchase price when num_opponents players move around the board, or None for spaces without rent."""
+        income = self.rent_per_turn[space] * num_opponents
+        if income == 0:
+            return None
+        return self.purchase_prices[space] / income
+
+    def get_best_spaces(self, count=5):
+        """Returns the count spaces with the shortest payback period, best first"""
+        spaces = [space for space in range(len(self.rent_per_turn)) if self.rent_per_turn[space] > 0]
+        return sorted(spaces, key=self.get_payback_turns)[:count]
+
+
+def roll_spectrum(board_size, totals):
+    """Takes in board_size and totals: a dictionary of dice totals and their chances. A roll moves a player the same
+    way from every space, wrapping around the board like move_player(), so its transition matrix is circulant and
+    is described by its first row. Returns the real FFT of that row: moving a distribution over the spaces by a roll
+    is multiplying its FFT by this."""
+    row = np.zeros(board_size)
+    for total, probability in totals.items():
+        row[total % board_size] += probability
+    return np.fft.rfft(row)
+
+
+@lru_cache(maxsize=64)
+def turn_spectra(board_size, pair_rolls_again=True):
+    """Takes in board_size and pair_rolls_again. Returns the spectra (see roll_spectrum()) of one whole turn: where
+    the turn ends, and how many times each space is landed on. With pair_rolls_again, a pair is followed by another
+    roll, so the turn is the series of pair rolls summed through 1 / (1 - pairs) and ended by a roll that is not a
+    pair. Every step is O(board_size log board_size)."""
+    pairs = roll_spectrum(board_size, PAIR_TOTALS)
+    others = roll_spectrum(board_size, OTHER_TOTALS)
+    if not pair_rolls_again:
+        return pairs + others, pairs + others
+    # pairs never add up to a chance of 1, so the series always converges
+    repeats = 1 / (1 - pairs)
+    return repeats * others, repeats * (pairs + others)
+
+
+@lru_cache(maxsize=256)
+def _analyse(go_bonus, rents, prices, buyable, pair_rolls_again):
+    """The cached computation behind board_analytics(), from the board's tables as bytes"""
+    rents = np.frombuffer(rents, dtype=np.int64)
+    board_size = len(rents)
+    pair_chance = sum(PAIR_TOTALS.values())
+    rolls_per_turn = 1 / (1 - pair_chance) if pair_rolls_again else 1.0
+    # every roll moves a player the same way from every space, so a player is equally likely to start a turn, and
+    # to land, anywhere: the landings of a turn are spread evenly over the board
+    landings_per_turn = np.full(board_size, rolls_per_turn / board_size)
+    # from an even start, a roll of total passes or lands on GO total / board_size times on average, and pairs move
+    # as far as other rolls on average
+    average_total = sum(total * probability for totals in (PAIR_TOTALS, OTHER_TOTALS)
+                        for total, probability in totals.items())
+    owned_rents = np.where(np.frombuffer(buyable, dtype=np.uint8) == 1, rents, 0)
+    return BoardAnalytics(
+        landing_probabilities=tuple(np.full(board_size, 1 / board_size).tolist()),
+        rolls_per_turn=float(rolls_per_turn),
+        landings_per_turn=tuple(landings_per_turn.tolist()),
+        go_bonus_per_turn=float(go_bonus * rolls_per_turn * average_total / board_size),
+        rent_per_turn=tuple((landings_per_turn * owned_rents).tolist()),
+        purchase_prices=tuple(np.frombuffer(prices, dtype=np.int64).tolist()),
+    )
+
+
+def board_analytics(board, pair_rolls_again=True):
+    """Takes in board: a Board, and pair_rolls_again: whether a player who rolls a pair rolls again, as the bot
+    announces. Returns the BoardAnalytics of the board, in time linear in its size. Results are cached per board
+    contents, so asking again is free."""
+    return _analyse(board.go_bonus, np.asarray(board.rents, dtype=np.int64).tobytes(),
+                    np.asarray(board.prices, dtype=np.int64).tobytes(), bytes(board.buyable), pair_rolls_again)
+
+
+@lru_cache(maxsize=256)
+def landings_from_go(board_size, turns, pair_rolls_again=True):
+    """Takes in board_size and turns. Returns how many times a player who starts on GO is expected to land on each
+    space during their first turns turns. Early in a game these differ from the long-run figures, which assume the
+    player could be anywhere on the board. The player's position is kept as a spectrum, so each turn costs
+    O(board_size)."""
+    ends, landings = turn_spectra(board_size, pair_rolls_again)
+    # starting on GO, whose spectrum is all ones
+    position = np.ones(len(ends), dtype=complex)
+    total = np.zeros(len(ends), dtype=complex)
+    for _ in range(turns):
+        total += position
+        position = position * ends
+    return tuple(np.fft.irfft(total * landings, board_size).tolist())
+
+
+if __name__ == "__main__":
+    rents = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350,
+             350, 350]
+    analytics = board_analytics(make_board(200, rents))
+    print(f"{analytics.rolls_per_turn:.2f} rolls and {analytics.go_bonus_per_turn:.2f} GO bonus per turn")
+    first_laps = landings_from_go(len(rents) + 1, 10)
+    for space in range(1, len(rents) + 1):
+        print(f"space {space}: rent per opponent turn {analytics.rent_per_turn[space]:.2f}, pays back in "
+              f"{analytics.get_payback_turns(space):.1f} rounds, {first_laps[space]:.2f} landings in the first 10 "
+              f"turns")
@@ -0,0 +1,170 @@
+import numpy as np
+
+from board import make_board
+
+
+class BatchSimulator:
+    """A class that plays many RealEstateGames at once. Instead of one Player and Space object per game, the balances,
+    locations and space owners of every game are stored in NumPy arrays, and each call to step() plays one turn in
+    every game that is still running. The rules are the same as RealEstateGame.move_player() and
+    RealEstateGame.buy_space(): players collect the go_bonus when they pass or land on GO, pay rent to the owner of
+    the space they land on, and lose all of their properties when they can't cover the rent. Spaces cost 5 x rent,
+    and a player can only buy a space if they have more money than its purchase price."""
+
+    def __init__(self, num_games, num_players, go_bonus, rents, initial_balance, buy_probability=0.5, seed=None,
+                 board=None, policy=None):
+        """Takes in num_games: how many games to play at once. Takes in num_players: how many players sit at every
+        game (at least 2). Takes in go_bonus and rents: the same arguments as RealEstateGame.create_spaces(). Takes in
+        initial_balance: the starting balance of every player. Takes in buy_probability: the chance that a player
+        tries to buy the unowned space they land on. Takes in seed: a seed for the dice and buying decisions. Takes in
+        board: an optional Board to play on, in place of go_bonus and rents. Takes in policy: an optional PolicyTable
+        solved for the board, which then makes the buying decisions in place of buy_probability."""
+        if num_players < 2:
+            raise ValueError("a game needs at least 2 players")
+
+        self._num_games = num_games
+        self._num_players = num_players
+        if board is None:
+            board = make_board(go_bonus, rents)
+        self._go_bonus = board.go_bonus
+        self._buy_probability = buy_probability
+        if policy is not None and not policy.matches(board):
+            raise ValueError("the policy was solved for a different board")
+        self._policy = policy
+        self._rng = np.random.default_rng(seed)
+
+        # the board's tables, GO included as space 0
+        self._rents = np.asarray(board.rents, dtype=np.int64)
+        self._purchase_prices = np.asarray(board.prices, dtype=np.int64)
+        self._buyable = np.frombuffer(board.buyable, dtype=np.uint8).astype(bool)
+        self._board_size = board.get_size()
+
+        # -1 marks a space without an owner, and a game without a winner. Small integer types keep the owner table
+        # in cache, which matters more than anything else once there are many games
+        self._balances = np.full((num_games, num_players), initial_balance, dtype=np.int64)
+        self._locations = np.zeros((num_games, num_players), dtype=np.int32)
+        self._owners = np.full((num_games, self._board_size), -1, dtype=np.int16)
+        self._turns = np.zeros(num_games, dtype=np.int64)
+        self._winners = np.full(num_games, -1, dtype=np.int64)
+        self._running = np.ones(num_games, dtype=bool)
+        # indices of the running games, shrunk as games end so late turns only touch the games still being played
+        self._running_games = np.arange(num_games)
+
+    def get_balances(self):
+        """Returns an array of every player's balance, one row per game"""
+        return self._balances
+
+    def get_locations(self):
+        """Returns an array of every player's location, one row per game"""
+        return self._locations
+
+    def get_owners(self):
+        """Returns an array of the owner of every space, one row per game. Unowned spaces are -1."""
+        return self._owners
+
+    def get_turn_counts(self):
+        """Returns how many turns have been played in each game"""
+        return self._turns
+
+    def get_winners(self):
+        """Returns the index of the winning player of each game, or -1 if the game has no winner yet"""
+        return self._winners
+
+    def get_running(self):
+        """Returns a boolean array marking the games that are not over yet"""
+        return self._running
+
+    def roll_dice(self, count):
+        """Takes in count. Rolls 2 six-sided dice for count players, returning a (count, 2) array"""
+        # one draw out of the 36 outcomes is much cheaper than two draws of 1 to 6
+        first, second = np.divmod(self._rng.integers(0, 36, size=count), 6)
+        return np.stack((first + 1, second + 1), axis=1)
+
+    def step(self, dice=None, buys=None):
+        """Plays one turn in every running game. Takes in dice: an optional (num_games, 2) array of die rolls, and
+        buys: an optional boolean array of the buying decision for each game. Rolls and decisions for games that are
+        already over are ignored. If they are not given, they are drawn from the simulator's random generator, or the
+        decisions come from its policy. Returns how many games are still running."""
+        games = self._running_games
+        if len(games) == 0:
+            return 0
+
+        if dice is None:
+            first, second = np.divmod(self._rng.integers(0, 36, size=len(games)), 6)
+            distances = first + second + 2
+        else:
+            dice = np.asarray(dice)[games]
+            distances = dice[:, 0] + dice[:, 1]
+        if buys is None and self._policy is None:
+            buys = self._rng.random(len(games)) < self._buy_probability
+        elif buys is not None:
+            buys = np.asarray(buys, dtype=bool)[games]
+
+        # flat views of the (game, player) and (game, space) arrays, indexing them is much faster than 2-d indexing
+        balances_flat = self._balances.reshape(-1)
+        locations_flat = self._locations.reshape(-1)
+        owners_flat = self._owners.reshape(-1)
+
+        # the player whose turn it is in each game, players out of money skip their turn like in move_player()
+        players = self._turns[games] % self._num_players
+        self._turns[games] += 1
+        seats = games * self._num_players + players
+        balances = balances_flat[seats]
+        solvent = balances > 0
+        if not solvent.all():
+            games, players, seats, balances = games[solvent], players[solvent], seats[solvent], balances[solvent]
+            distances = distances[solvent]
+            if buys is not None:
+                buys = buys[solvent]
+
+        # move, collecting the go_bonus every time GO is passed or landed on
+        laps, new_locations = np.divmod(locations_flat[seats] + distances, self._board_size)
+        balances += laps * self._go_bonus
+        locations_flat[seats] = new_locations
+
+        # pay rent when the space is owned by someone else
+        owners = owners_flat[games * self._board_size + new_locations]
+        rents = self._rents[new_locations]
+        pays_rent = (owners >= 0) & (owners != players)
+        can_pay = balances > rents
+        bankrupt = pays_rent & ~can_pay
+        paid = np.where(pays_rent, np.where(can_pay, rents, balances), 0)
+        balances -= paid
+        rent_games = games[pays_rent]
+        balances_flat[rent_games * self._num_players + owners[pays_rent]] += paid[pays_rent]
+
+        # buy the space if it is unowned, can be bought (GO cannot) and is strictly affordable
+        prices = self._purchase_prices[new_locations]
+        if buys is None:
+            opponents = (self._balances[games] > 0).sum(axis=1) - 1
+            buys = self._policy.should_buy_many(new_locations, balances, opponents)
+        buying = buys & (owners < 0) & self._buyable[new_locations] & (balances > prices)
+        owners_flat[games[buying] * self._board_size + new_locations[buying]] = players[buying]
+        balances -= np.where(buying, prices, 0)
+        balances_flat[seats] = balances
+
+        if bankrupt.any():
+            # release the properties of players who went bankrupt
+            bankrupt_games = games[bankrupt]
+            board_rows = self._owners[bankrupt_games]
+            board_rows[board_rows == players[bankrupt][:, None]] = -1
+            self._owners[bankrupt_games] = board_rows
+
+            # a game is over once fewer than 2 players have money left, like check_game_over(). Only a bankruptcy
+            # can end a game, so only those games are checked
+            positive = self._balances[bankrupt_games] > 0
+            ended = positive.sum(axis=1) < 2
+            ended_games = bankrupt_games[ended]
+            self._winners[ended_games] = np.where(positive[ended].any(axis=1), positive[ended].argmax(axis=1), -1)
+            self._running[ended_games] = False
+            self._running_games = self._running_games[self._running[self._running_games]]
+
+        return len(self._running_games)
+
+    def run(self, max_turns=10000):
+        """Takes in max_turns: the most turns to play in any game. Plays every game until it is over or reaches
+        max_turns. Returns the array of winners (see get_winners())."""
+        for _ in range(max_turns):
+            if self.step() == 0:
+                break
+        return self._winners
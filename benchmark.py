@@ -0,0 +1,230 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import dice
+from compact_game import CompactGame
+from RealEstateGame import RealEstateGame
+
+RENTS = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350, 350,
+         350]
+
+# for each result, whether a bigger number is better. Only these are compared against a baseline
+METRICS = {
+    "turns_per_second": True,
+    "move_player_mean_us": False,
+    "move_player_p99_us": False,
+    "buy_space_mean_us": False,
+    "buy_space_p99_us": False,
+    "peak_memory_bytes": False,
+    "game_mean_ms": False,
+    "game_p99_ms": False,
+}
+
+
+def make_game(board_size, seed, game_class=RealEstateGame):
+    """Takes in board_size, seed and game_class. Returns a game with that many spaces, GO included, whose rents
+    repeat RENTS."""
+    game = game_class(seed)
+    game.create_spaces(200, [RENTS[index % len(RENTS)] for index in range(board_size - 1)])
+    return game
+
+
+def percentile(values, fraction):
+    """Returns the value below which the given fraction of the sorted values fall"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _play(num_players, board_size, num_games, seed, max_turns, buy_probability, timings=None):
+    """Plays num_games seeded games side by side, one turn of each game at a time, so that they are all in memory
+    together. If timings is given, the time of every move_player() and buy_space() call and the total time of every
+    game are added to its "move", "buy" and "games" lists. Returns (turns played, games unfinished)."""
+    rng = random.Random(seed)
+    names = [f"Player {number + 1}" for number in range(num_players)]
+    games = []
+    for index in range(num_games):
+        game = make_game(board_size, seed * 1000003 + index)
+        for name in names:
+            game.create_player(name, 1500)
+        games.append(game)
+
+    clock = time.perf_counter
+    durations = [0.0] * num_games
+    running = list(range(num_games))
+    turns = 0
+    for turn in range(max_turns):
+        if not running:
+            break
+        name = names[turn % num_players]
+        still_running = []
+        for index in running:
+            game = games[index]
+            game_start = clock()
+            die1, die2 = game.get_player(name).roll_dice()
+            call_start = clock()
+            game.move_player(name, die1 + die2)
+            if timings is not None:
+                timings["move"].append(clock() - call_start)
+            if rng.random() < buy_probability:
+                call_start = clock()
+                game.buy_space(name)
+                if timings is not None:
+                    timings["buy"].append(clock() - call_start)
+            turns += 1
+            if game.check_game_over() == "":
+                still_running.append(index)
+            durations[index] += clock() - game_start
+        running = still_running
+    if timings is not None:
+        timings["games"].extend(durations)
+    return turns, len(running)
+
+
+def run_case(num_players, board_size, num_games, seed=0, max_turns=2000, buy_probability=0.5):
+    """Takes in num_players, board_size and num_games. Plays the games twice: once timing every call, and once
+    under tracemalloc to find the peak memory (tracemalloc slows everything down, so the two are kept apart).
+    Returns a dictionary of the results."""
+    timings = {"move": [], "buy": [], "games": []}
+    start = time.perf_counter()
+    turns, unfinished = _play(num_players, board_size, num_games, seed, max_turns, buy_probability, timings)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    _play(num_players, board_size, num_games, seed, max_turns, buy_probability)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    move_times, buy_times, durations = timings["move"], timings["buy"], timings["games"]
+    return {
+        "num_players": num_players,
+        "board_size": board_size,
+        "num_games": num_games,
+        "turns": turns,
+        "unfinished_games": unfinished,
+        "turns_per_second": turns / elapsed,
+        "move_player_mean_us": statistics.fmean(move_times) * 1e6,
+        "move_player_p99_us": percentile(move_times, 0.99) * 1e6,
+        "buy_space_mean_us": statistics.fmean(buy_times) * 1e6 if buy_times else 0.0,
+        "buy_space_p99_us": percentile(buy_times, 0.99) * 1e6 if buy_times else 0.0,
+        "peak_memory_bytes": peak_memory,
+        "game_mean_ms": statistics.fmean(durations) * 1e3,
+        "game_p99_ms": percentile(durations, 0.99) * 1e3,
+    }
+
+
+def run_suite(player_counts=(2, 4, 8), board_sizes=(25,), game_counts=(10, 100), seed=0, max_turns=2000):
+    """Runs run_case() for every combination of player count, board size and game count. Returns a dictionary with
+    the environment and a list of cases."""
+    cases = [run_case(players, board_size, games, seed, max_turns)
+             for players, board_size, games in itertools.product(player_counts, board_sizes, game_counts)]
+    return {"python": sys.version.split()[0], "machine": platform.machine(), "seed": seed, "max_turns": max_turns,
+            "cases": cases}
+
+
+def stress(board_sizes=(25, 1000, 100000), moves=100000, seed=0, game_classes=(RealEstateGame, CompactGame)):
+    """Takes in board_sizes, moves, seed and game_classes. For every game class and board size, plays moves turns of
+    4 players (starting a new game whenever one ends) and times every move_player() call. Returns a dictionary of
+    class name to a dictionary of board size to the mean nanoseconds per move, which should not grow with the board.
+    """
+    clock = time.perf_counter
+    names = [f"Player {number + 1}" for number in range(4)]
+    results = {}
+    for game_class in game_classes:
+        results[game_class.__name__] = {}
+        for board_size in board_sizes:
+            rng = random.Random(seed)
+            game = None
+            elapsed = 0.0
+            for turn in range(moves):
+                if game is None or game.check_game_over() != "":
+                    game = make_game(board_size, seed + turn, game_class)
+                    for name in names:
+                        game.create_player(name, 1500)
+                name = names[turn % len(names)]
+                die1, die2 = game.get_player(name).roll_dice()
+                start = clock()
+                game.move_player(name, die1 + die2)
+                elapsed += clock() - start
+                if rng.random() < 0.5:
+                    game.buy_space(name)
+            results[game_class.__name__][board_size] = elapsed / moves * 1e9
+    return results
+
+
+def _case_key(case):
+    return case["num_players"], case["board_size"], case["num_games"]
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Takes in results and baseline: two outputs of run_suite(), and tolerance: how much worse a metric may get.
+    Returns a list of regression messages, empty if nothing got worse than the tolerance. Cases missing from
+    either side are skipped."""
+    baseline_cases = {_case_key(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = baseline_cases.get(_case_key(case))
+        if old is None:
+            continue
+        for metric, bigger_is_better in METRICS.items():
+            if not old.get(metric):
+                continue
+            change = case[metric] / old[metric] - 1
+            if (bigger_is_better and change < -tolerance) or (not bigger_is_better and change > tolerance):
+                regressions.append(f"players={case['num_players']} board={case['board_size']} "
+                                   f"games={case['num_games']}: {metric} {old[metric]:.4g} -> {case[metric]:.4g} "
+                                   f"({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    """Runs the suite from the command line, writing JSON and optionally comparing against a baseline. Exits with
+    status 1 when a regression is found."""
+    parser = argparse.ArgumentParser(description="Benchmarks the RealEstateGame rules engine")
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--board-sizes", type=int, nargs="+", default=[25])
+    parser.add_argument("--games", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=2000)
+    parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--compare", metavar="BASELINE", help="a results file to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    parser.add_argument("--stress", action="store_true",
+                        help="only time move_player() on boards of every --board-sizes, up to 10^5 spaces, and the "
+                             "dice")
+    args = parser.parse_args(argv)
+
+    if args.stress:
+        board_sizes = args.board_sizes if args.board_sizes != [25] else [25, 1000, 100000]
+        for backend, timings in stress(board_sizes, seed=args.seed).items():
+            print(backend + ": " + ", ".join(f"board {size} {ns:.0f} ns/move" for size, ns in timings.items()))
+        rolls = dice.benchmark()
+        print(f"dice: DiceStream {rolls['stream_ns_per_roll']:.0f} ns/roll, two randint() calls "
+              f"{rolls['randint_ns_per_roll']:.0f} ns/roll")
+        return
+
+    results = run_suite(args.players, args.board_sizes, args.games, args.seed, args.max_turns)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    for case in results["cases"]:
+        print(f"players={case['num_players']} board={case['board_size']} games={case['num_games']}: "
+              f"{case['turns_per_second']:,.0f} turns/s, move_player {case['move_player_mean_us']:.2f} us, "
+              f"buy_space {case['buy_space_mean_us']:.2f} us, peak {case['peak_memory_bytes'] / 1024:.0f} KiB")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
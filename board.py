@@ -0,0 +1,78 @@
+import csv
+import json
+import os
+from array import array
+from collections import namedtuple
+
+# the names given to the first 24 spaces after GO. Spaces after those are named by their index
+SPACE_NAMES = ["United States", "Canada", "Mexico", "Panama", "Haiti", "Jamaica", "Peru", "Republic Dominican", "Cuba",
+               "Caribbean", "Greenland", "El Salvador", "Puerto Rico", "Colombia", "Venezuela", "Honduras", "Guyana",
+               "Guatemala", "Bolivia", "Argentina", "Ecuador", "Chile", "Brazil", "Costa Rica"]
+
+
+class Board(namedtuple("Board", ["go_bonus", "names", "rents", "prices", "buyable"])):
+    """A gameboard as flat tables indexed by space, GO (space 0) included: the names, the rents and purchase prices
+    (arrays of integers) and whether each space can be bought (bytes of 0 or 1). The tables are built once, when the
+    board is made, and are never changed, so games can share them."""
+
+    def get_size(self):
+        """Returns how many spaces are on the board, GO included"""
+        return len(self.rents)
+
+
+def make_board(go_bonus, rents, names=None, prices=None, buyable=None):
+    """Takes in go_bonus and rents: the rents of the spaces after GO, as many as the board has. Takes in names,
+    prices and buyable: optional lists of the same length. Prices default to 5 times the rent, and every space
+    after GO can be bought by default. Returns the Board, with GO added in front."""
+    count = len(rents)
+    if count == 0:
+        raise ValueError("a board needs at least one space after GO")
+    if names is None:
+        names = SPACE_NAMES[:count] + [f"Space {index}" for index in range(len(SPACE_NAMES) + 1, count + 1)]
+    if prices is None:
+        prices = [rent * 5 for rent in rents]
+    if buyable is None:
+        buyable = [True] * count
+    if not len(names) == len(prices) == len(buyable) == count:
+        raise ValueError("names, prices and buyable must have one entry for every space after GO")
+    return Board(go_bonus, ("GO",) + tuple(names), array("q", [0]) + array("q", rents),
+                 array("q", [0]) + array("q", prices), bytes([0]) + bytes(1 if flag else 0 for flag in buyable))
+
+
+def _flag(value):
+    """Reads a buyable flag from a board spec: a bool, a number, or a string such as yes, no, true or false"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def load_board(path, go_bonus=None):
+    """Takes in path: a board spec in JSON or CSV, and go_bonus. Returns the Board it describes.
+
+    A JSON spec is an object with an optional "go_bonus" and a "spaces" list. A CSV spec has a header row and one
+    row per space. Either way the spaces are the ones after GO, in order, each with a "rent" and optionally a "name",
+    a "price" and a "buyable" flag. A go_bonus passed in overrides the spec's, and CSV specs need one passed in.
+    Raises a ValueError if the spec is incomplete."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="") as file:
+        if extension == ".json":
+            spec = json.load(file)
+            spaces = spec["spaces"]
+            if go_bonus is None:
+                go_bonus = spec.get("go_bonus")
+        elif extension == ".csv":
+            spaces = list(csv.DictReader(file))
+        else:
+            raise ValueError(f"board specs must be .json or .csv files, not {path}")
+    if go_bonus is None:
+        raise ValueError(f"{path} does not give a go_bonus")
+
+    try:
+        rents = [int(space["rent"]) for space in spaces]
+    except KeyError:
+        raise ValueError(f"every space in {path} needs a rent")
+    names = [space.get("name") or f"Space {index + 1}" for index, space in enumerate(spaces)]
+    prices = [int(space["price"]) if space.get("price") not in (None, "") else rent * 5
+              for space, rent in zip(spaces, rents)]
+    buyable = [True if space.get("buyable") in (None, "") else _flag(space["buyable"]) for space in spaces]
+    return make_board(int(go_bonus), rents, names, prices, buyable)
@@ -0,0 +1,410 @@
+import random
+import tracemalloc
+from array import array
+from functools import lru_cache
+
+from board import make_board
+from dice import DiceStream
+
+# boards are read-only once built, so every game with the same GO bonus and rents shares one copy. Only the most
+# recently used ones are kept, as a process can see any number of different boards
+@lru_cache(maxsize=64)
+def _board_for(go_bonus, rents):
+    return make_board(go_bonus, rents)
+
+
+def _shared_board(go_bonus, rents):
+    """Takes in go_bonus and rents: the arguments of create_spaces(). Returns the shared Board."""
+    return _board_for(go_bonus, tuple(rents))
+
+
+class CompactGame:
+    """A RealEstateGame that stores its state in typed arrays instead of Player and Space objects. Balances and
+    locations are arrays indexed by player, owners is an array indexed by space (-1 for no owner), the spaces each
+    player owns are kept in an array per player, and the players that still have money in a bitmask. get_player()
+    and get_space() return thin views with the same get_*/set_* accessors as Player and Space. The rules are the
+    same as RealEstateGame."""
+
+    __slots__ = ("_seed", "_random", "_dice", "_board", "_go_bonus", "_rents", "_purchase_prices", "_owners",
+                 "_names", "_balances", "_locations", "_holdings", "_solvent", "_turns", "_interaction_phase",
+                 "_turn_state", "_started", "_bots", "_tallies")
+
+    def __init__(self, seed=None):
+        """Constructs a game. Takes in seed: an optional seed for the game's dice. The random generator and the
+        DiceStream are only created the first time they are needed, as they are bigger than the rest of the game."""
+        self._seed = seed
+        self._random = None
+        self._dice = None
+        self._board = None
+        self._go_bonus = 0
+        self._rents = None
+        self._purchase_prices = None
+        self._owners = array("b")
+        self._names = []
+        self._balances = array("q")
+        self._locations = array("i")
+        self._holdings = []
+        self._solvent = 0
+        self._turns = 0
+        self._interaction_phase = "setup"
+        # "roll", "again" or "pass", as in RealEstateGame.get_turn_state()
+        self._turn_state = "roll"
+        self._started = False
+        self._bots = None
+        # four counters per player, as in RealEstateGame.get_tallies()
+        self._tallies = array("q")
+
+    def get_turns(self):
+        """Returns how many turns have been played"""
+        return self._turns
+
+    def get_random(self):
+        """Returns the game's random generator (a random.Random)"""
+        if self._random is None:
+            self._random = random.Random(self._seed)
+        return self._random
+
+    def get_dice(self):
+        """Returns the game's source of dice rolls (a DiceStream, unless set_dice() replaced it)"""
+        if self._dice is None:
+            self._dice = DiceStream(self._seed)
+        return self._dice
+
+    def set_dice(self, dice):
+        """Takes in dice: a DiceStream, a DiceTape or anything with the same roll(), get_state() and set_state()
+        methods. Every player rolls with it from now on."""
+        self._dice = dice
+
+    def create_spaces(self, go_bonus, rents):
+        """Takes in go_bonus and rents: the same arguments as RealEstateGame.create_spaces(). Sets up the board,
+        replacing any board that was set up before."""
+        self.set_board(_shared_board(go_bonus, rents))
+
+    def set_board(self, board):
+        """Takes in board: a Board. Sets up the board, replacing any board that was set up before. The board's tables
+        are used as they are, not copied."""
+        self._board = board
+        self._go_bonus = board.go_bonus
+        self._rents = board.rents
+        self._purchase_prices = board.prices
+        self._owners = array("b", [-1]) * len(board.rents)
+        self._holdings = [array("i") for _ in self._names]
+
+    def get_board(self):
+        """Returns the game's Board, or None before the spaces are created"""
+        return self._board
+
+    def get_player(self, name):
+        """Returns a PlayerView of the player with the given name, or None if there is no such player"""
+        if name in self._names:
+            return PlayerView(self, self._names.index(name))
+
+    def get_space(self, index):
+        """Returns a SpaceView of the space at the given index"""
+        return SpaceView(self, index)
+
+    def create_player(self, name, initial_balance):
+        """Takes in name and initial_balance. Adds a player to the GO space, like RealEstateGame.create_player()"""
+        self._names.append(name)
+        self._balances.append(initial_balance)
+        self._locations.append(0)
+        self._holdings.append(array("i"))
+        self._tallies.extend((0, 0, 0, 0))
+        if initial_balance > 0:
+            self._solvent |= 1 << (len(self._names) - 1)
+
+    def get_player_account_balance(self, player_name):
+        """Takes in player_name: the name of the Player whose balance is returned. Returns their balance."""
+        return self._balances[self._names.index(player_name)]
+
+    def get_player_current_position(self, player_name):
+        """Takes in player_name: the name of the Player whose position on the board is returned. Returns their position.
+        """
+        return self._locations[self._names.index(player_name)]
+
+    def buy_space(self, player_name):
+        """Takes in player_name. Buys the space the player is on, following the rules of RealEstateGame.buy_space().
+        Returns True if the space is bought, and False if not."""
+        player = self._names.index(player_name)
+        location = self._locations[player]
+        price = self._purchase_prices[location]
+        if self._owners[location] == -1 and self._balances[player] > price and self._board.buyable[location]:
+            self._owners[location] = player
+            self._holdings[player].append(location)
+            self._balances[player] -= price
+            self._tallies[player * 4] += 1
+            return True
+        return False
+
+    def move_player(self, player_name, distance, dice=None):
+        """Takes in player_name, distance and dice: the two dice it was rolled with, if known. Moves the player,
+        following the rules of RealEstateGame.move_player(). Returns a SpaceView of the new location, or None if the
+        player had no money and did not move."""
+        player = self._names.index(player_name)
+        balance = self._balances[player]
+        if balance <= 0:
+            return
+        self._turn_state = "again" if dice is not None and dice[0] == dice[1] else "pass"
+
+        # move, collecting the go_bonus every time GO is passed or landed on
+        laps, new_location = divmod(self._locations[player] + distance, len(self._rents))
+        if laps:
+            balance += self._go_bonus * laps
+        self._locations[player] = new_location
+
+        owner = self._owners[new_location]
+        if owner != -1 and owner != player:
+            rent = self._rents[new_location]
+            if balance > rent:
+                self._balances[owner] += rent
+                self._balances[player] = balance - rent
+                paid = rent
+            else:
+                # hand over what is left and release every space the player owned
+                self._balances[owner] += balance
+                self._balances[player] = 0
+                self._tallies[player * 4 + 3] += 1
+                self._turn_state = "pass"
+                paid = balance
+                self._release(player)
+                self._solvent &= ~(1 << player)
+            self._tallies[player * 4 + 1] += paid
+            self._tallies[owner * 4 + 2] += paid
+            return SpaceView(self, new_location)
+
+        self._balances[player] = balance
+        if owner == -1:
+            self._interaction_phase = player_name, 'buy'
+        return SpaceView(self, new_location)
+
+    def concede(self, player_name):
+        """Takes in player_name. The player leaves the game, like RealEstateGame.concede()"""
+        player = self._names.index(player_name)
+        self._balances[player] = 0
+        self._release(player)
+        self._solvent &= ~(1 << player)
+
+    def _release(self, player):
+        """Takes the spaces the player owns off them, in time proportional to how many they own"""
+        for location in self._holdings[player]:
+            self._owners[location] = -1
+        self._holdings[player] = array("i")
+
+    def check_game_over(self):
+        """Returns the winner's name if fewer than 2 players have money left, and an empty string otherwise"""
+        solvent = self._solvent
+        # the game goes on while at least 2 bits are set, and has no winner if none are
+        if solvent & (solvent - 1) or solvent == 0:
+            return ""
+        return self._names[solvent.bit_length() - 1]
+
+    def get_holdings(self, player_name=None):
+        """Takes in player_name (optional). Returns a sorted list of the indices of the spaces that player owns. If no
+        player_name is given, returns a dictionary of every player's holdings instead."""
+        if player_name is None:
+            return {name: self.get_holdings(name) for name in self._names}
+        return sorted(self._holdings[self._names.index(player_name)])
+
+    def get_net_worth(self, player_name=None):
+        """Takes in player_name (optional). Returns that player's balance plus the purchase price of every space they
+        own. If no player_name is given, returns a dictionary of every player's net worth instead."""
+        if player_name is None:
+            return {name: self.get_net_worth(name) for name in self._names}
+        property_value = sum(self._purchase_prices[index] for index in self._holdings[self._names.index(player_name)])
+        return self.get_player_account_balance(player_name) + property_value
+
+    def get_tallies(self):
+        """Returns a dictionary of every player's counters for this game, like RealEstateGame.get_tallies()"""
+        return {name: tuple(self._tallies[index * 4:index * 4 + 4]) for index, name in enumerate(self._names)}
+
+    def check_created(self):
+        return len(self._owners) > 0
+
+    def save_state(self):
+        """Returns everything a turn can change: balances, locations, owners, turns, the interaction phase, the turn
+        state and the position of the dice. restore_state() puts the game back the way it was."""
+        return (self._balances.tobytes(), self._locations.tobytes(), self._owners.tobytes(),
+                tuple(holdings.tobytes() for holdings in self._holdings),
+                self._tallies.tobytes(), self._solvent, self._turns, self._interaction_phase, self._turn_state,
+                self._started, None if self._dice is None else self._dice.get_state())
+
+    def restore_state(self, state):
+        """Takes in a state returned by save_state(), from a game with the same players and board"""
+        balances, locations, owners, holdings, tallies, self._solvent, self._turns, self._interaction_phase, \
+            self._turn_state, self._started, dice_state = state
+        self._balances = array("q", balances)
+        self._locations = array("i", locations)
+        self._owners = array("b", owners)
+        self._holdings = [array("i", spaces) for spaces in holdings]
+        self._tallies = array("q", tallies)
+        if dice_state is None:
+            self._dice = None
+        else:
+            self._dice.set_state(dice_state)
+
+    def get_go_bonus(self):
+        """Returns the amount of money players receive when landing on or passing GO"""
+        return self._go_bonus
+
+    def get_board_size(self):
+        """Returns how many spaces are on the gameboard, GO included"""
+        return len(self._owners)
+
+    def check_started(self):
+        """Checks if the game has been started (i.e., gameboard initialized, at least 2 players)"""
+        return self._started
+
+    def set_started(self):
+        """Start the game"""
+        self._started = True
+
+    def get_active_player(self):
+        """Returns the player whose turn it is"""
+        return self._names[self._turns % len(self._names)]
+
+    def end_turn(self):
+        """Passes the turn to the next player that still has money, and returns their name. Players that ran out of
+        money are skipped, unless the game is over."""
+        self._turns += 1
+        self._turn_state = "roll"
+        if self.check_game_over() == "":
+            while not self._solvent >> (self._turns % len(self._names)) & 1:
+                self._turns += 1
+        return self.get_active_player()
+
+    def get_player_names(self):
+        """Returns the names of the players, in the order they joined"""
+        return list(self._names)
+
+    def get_interaction_phase(self):
+        """Returns the interaction phase of the game: "setup", or a tuple of a player and what they may do next"""
+        return self._interaction_phase
+
+    def set_interaction_phase(self, player, phase):
+        """Updates the interaction phase of the game"""
+        self._interaction_phase = player, phase
+
+    def get_turn_state(self):
+        """Returns "roll", "again" or "pass", like RealEstateGame.get_turn_state()"""
+        return self._turn_state
+
+    def set_bot(self, player_name, strategy):
+        """Takes in player_name and strategy: the name of a strategy (see strategy.STRATEGIES). From now on the
+        player's turns are played by a bot with that strategy."""
+        if self._bots is None:
+            self._bots = {}
+        self._bots[player_name] = strategy
+
+    def get_bot(self, player_name):
+        """Returns the name of the strategy of the bot playing for player_name, or None if a person plays"""
+        return None if self._bots is None else self._bots.get(player_name)
+
+
+class PlayerView:
+    """A view of one player of a CompactGame, with the same accessors as Player. It holds no state of its own."""
+
+    __slots__ = ("_game", "_index")
+
+    def __init__(self, game, index):
+        self._game = game
+        self._index = index
+
+    def get_name(self):
+        """return the Player name"""
+        return self._game._names[self._index]
+
+    def get_balance(self):
+        """return the Player's balance"""
+        return self._game._balances[self._index]
+
+    def set_balance(self, new_balance):
+        """change the balance"""
+        self._game._balances[self._index] = new_balance
+
+    def get_location(self):
+        """return the location (an index into the board, 0 being GO)"""
+        return self._game._locations[self._index]
+
+    def set_location(self, new_location):
+        """change the location property to be an index into the board"""
+        self._game._locations[self._index] = new_location
+
+    def roll_dice(self):
+        """rolls 2 six-sided dice with the game's dice, returning the results in a tuple"""
+        return self._game.get_dice().roll()
+
+    def set_dice(self, dice):
+        """change the source of the dice rolls of the whole game, as the players of a CompactGame share them"""
+        self._game.set_dice(dice)
+
+    def __str__(self):
+        return f"Hi! I'm {self.get_name()}. I'm on space {self.get_location()}. I have ${self.get_balance()}."
+
+
+class SpaceView:
+    """A view of one space of a CompactGame, with the same accessors as Space. It holds no state of its own."""
+
+    __slots__ = ("_game", "_index")
+
+    def __init__(self, game, index):
+        self._game = game
+        self._index = index
+
+    def get_name(self):
+        """returns Space's name"""
+        return self._game._board.names[self._index]
+
+    def get_rent(self):
+        """returns Space's rent"""
+        return self._game._rents[self._index]
+
+    def get_purchase_price(self):
+        """returns Space's purchase price"""
+        return self._game._purchase_prices[self._index]
+
+    def get_owner(self):
+        """returns Space's owner (Player name)"""
+        owner = self._game._owners[self._index]
+        return None if owner == -1 else self._game._names[owner]
+
+    def change_owner(self, purchaser):
+        """replaces the owner with the given purchaser (player name), keeping the owner's holdings up to date"""
+        game = self._game
+        owner = game._owners[self._index]
+        if owner != -1:
+            game._holdings[owner].remove(self._index)
+        if purchaser is None:
+            game._owners[self._index] = -1
+        else:
+            purchaser_index = game._names.index(purchaser)
+            game._owners[self._index] = purchaser_index
+            game._holdings[purchaser_index].append(self._index)
+
+
+def bytes_per_game(game_class, count=1000, players=4, rents=None):
+    """Takes in game_class: RealEstateGame or CompactGame. Builds count games with the given number of players on the
+    default board, and returns the average number of bytes each one holds, measured with tracemalloc."""
+    if rents is None:
+        rents = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300,
+                 350, 350, 350]
+    # build the shared board before measuring, it is paid for once per process and not per game
+    _shared_board(200, rents)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = []
+    for _ in range(count):
+        game = game_class()
+        game.create_spaces(200, rents)
+        for number in range(players):
+            game.create_player(f"Player {number + 1}", 1500)
+        games.append(game)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+if __name__ == "__main__":
+    from RealEstateGame import RealEstateGame
+
+    for backend in (RealEstateGame, CompactGame):
+        print(f"{backend.__name__}: {bytes_per_game(backend):.0f} bytes per game")
@@ -0,0 +1,148 @@
+import operator
+import random
+import time
+
+import numpy as np
+
+# every roll of two dice as a code from 0 to 35, (die1 - 1) * 6 + (die2 - 1), and the roll each code stands for
+ROLLS = tuple((first, second) for first in range(1, 7) for second in range(1, 7))
+
+
+def encode_rolls(rolls):
+    """Takes in rolls: (die1, die2) tuples. Returns them as a dice tape, one byte per roll."""
+    return bytes((die1 - 1) * 6 + die2 - 1 for die1, die2 in rolls)
+
+
+def decode_rolls(tape):
+    """Takes in a dice tape. Returns the list of (die1, die2) tuples on it."""
+    return [ROLLS[code] for code in tape]
+
+
+class DiceStream:
+    """A game's own source of dice rolls. Rolls are drawn from a NumPy Generator a block at a time, block_size rolls
+    of one byte each, and handed out one by one without calling the generator again. The same seed always gives the
+    same rolls. With record, every roll handed out is kept, and get_tape() returns them to be replayed by a
+    DiceTape."""
+
+    def __init__(self, seed=None, block_size=1024, record=False):
+        self._generator = np.random.default_rng(seed)
+        self._block_size = block_size
+        self._tape = [] if record else None
+        self._block = b""
+        self._next = iter(self._block).__next__
+
+    def roll(self):
+        """Returns the next roll as a tuple of two dice"""
+        try:
+            return ROLLS[self._next()]
+        except StopIteration:
+            self._fill()
+            return ROLLS[self._next()]
+
+    def _fill(self):
+        if self._tape is not None:
+            self._tape.append(self._block)
+        self._block = self._generator.integers(0, 36, size=self._block_size, dtype=np.uint8).tobytes()
+        self._next = iter(self._block).__next__
+
+    def _taken(self):
+        """Returns how many rolls of the current block have been handed out"""
+        return len(self._block) - operator.length_hint(self._next.__self__)
+
+    def get_tape(self):
+        """Returns every roll handed out so far as a dice tape. Raises a ValueError if the stream is not recording."""
+        if self._tape is None:
+            raise ValueError("the dice stream is not recording")
+        return b"".join(self._tape) + self._block[:self._taken()]
+
+    def get_state(self):
+        """Returns the stream's position, to go back to with set_state()"""
+        return (self._generator.bit_generator.state, self._block, self._taken(),
+                None if self._tape is None else len(self._tape))
+
+    def set_state(self, state):
+        """Takes in a state returned by get_state(). Rolls from there on are the same as they were then."""
+        generator_state, self._block, taken, tape_length = state
+        self._generator.bit_generator.state = generator_state
+        rolls = iter(self._block)
+        rolls.__setstate__(taken)
+        self._next = rolls.__next__
+        if tape_length is not None:
+            del self._tape[tape_length:]
+
+    def __getstate__(self):
+        # the block's iterator cannot be pickled, so the rolls that are left are saved instead
+        state = self.__dict__.copy()
+        del state["_next"]
+        taken = self._taken()
+        if state["_tape"] is not None:
+            state["_tape"] = self._tape + [self._block[:taken]]
+        state["_block"] = self._block[taken:]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._next = iter(self._block).__next__
+
+
+class DiceTape:
+    """Plays back recorded rolls, for regression tests and replays. roll() raises a ValueError once the tape has
+    run out."""
+
+    def __init__(self, tape):
+        """Takes in tape: a dice tape (bytes), or a list of (die1, die2) tuples"""
+        self._tape = tape if isinstance(tape, bytes) else encode_rolls(tape)
+        self._position = 0
+
+    def roll(self):
+        """Returns the next roll on the tape as a tuple of two dice"""
+        if self._position == len(self._tape):
+            raise ValueError(f"the dice tape ran out after {len(self._tape)} rolls")
+        self._position += 1
+        return ROLLS[self._tape[self._position - 1]]
+
+    def get_tape(self):
+        """Returns the rolls played back so far as a dice tape"""
+        return self._tape[:self._position]
+
+    def get_state(self):
+        """Returns the position on the tape, to go back to with set_state()"""
+        return self._position
+
+    def set_state(self, state):
+        """Takes in a state returned by get_state()"""
+        self._position = state
+
+
+def save_tape(path, tape):
+    """Writes a dice tape to the file at path"""
+    with open(path, "wb") as file:
+        file.write(tape)
+
+
+def load_tape(path):
+    """Returns the DiceTape stored in the file at path"""
+    with open(path, "rb") as file:
+        return DiceTape(file.read())
+
+
+def benchmark(rolls=1000000, block_size=1024):
+    """Takes in rolls and block_size. Times rolling that many pairs of dice with two random.randint() calls each, as
+    the engine used to, and with a DiceStream. Returns a dictionary of nanoseconds per roll."""
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(rolls):
+        rng.randint(1, 6), rng.randint(1, 6)
+    randint_seconds = time.perf_counter() - start
+
+    roll = DiceStream(0, block_size).roll
+    start = time.perf_counter()
+    for _ in range(rolls):
+        roll()
+    stream_seconds = time.perf_counter() - start
+    return {"randint_ns_per_roll": randint_seconds / rolls * 1e9, "stream_ns_per_roll": stream_seconds / rolls * 1e9}
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.0f}")
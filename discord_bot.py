@@ -1,47 +1,104 @@
 from RealEstateGame import *
-import discord
+from game_registry import GameRegistry
+from event_log import EventLog, GameJournal
+from outbound import DiscordTransport, OutboundQueue
+from strategy import StrategyEngine, STRATEGIES
+from game_commands import GameCommands
+from game_actor import GameActors
+from game_server import GameServer
+from player_stats import StatsStore
+from concurrent.futures import ProcessPoolExecutor
+import metrics
+import asyncio
+import time
 import os
 import logging
 from discord.ext import commands
 from dotenv import load_dotenv
 
-# load token from environment variables
+# load settings from environment variables. With GAME_WORKERS set, every worker process imports this module again, so
+# nothing below may log in or start anything until main() runs
 load_dotenv()
-token = os.environ['TOKEN']
 
-client = discord.Client()
 bot = commands.bot.Bot(command_prefix="!")
 
-# error logging
-handler = logging.FileHandler(filename='funmonopolybot.log', encoding='utf-8', mode='w')
-
-game = RealEstateGame()
-rents = [
-    50,
-    50,
-    50,
-    75,
-    75,
-    75,
-    100,
-    100,
-    100,
-    150,
-    150,
-    150,
-    200,
-    200,
-    200,
-    250,
-    250,
-    250,
-    300,
-    300,
-    300,
-    350,
-    350,
-    350,
-]
+# with GAME_WORKERS set, the games are split between that many worker processes by channel, and this process only
+# passes commands to them and sends their replies. Otherwise the games are run here
+GAME_WORKERS = int(os.environ.get('GAME_WORKERS', 0))
+SNAPSHOT_SECONDS = float(os.environ.get('GAME_SNAPSHOT_SECONDS', 300))
+# every player's career across finished games
+STATS_PATH = os.environ.get('PLAYER_STATS_DB', 'player_stats.db')
+# instrumentation is off unless METRICS_PORT is set, and then served at http://127.0.0.1:METRICS_PORT/metrics
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+# how often write_journal() measures the games in memory for the game_bytes gauge
+GAME_BYTES_SECONDS = 10
+
+# set up by main()
+outbound = game_commands = games = journal = stats = None
+
+# the average size of the games in memory, as last measured by write_journal(). The gauge reads this instead of
+# measuring, as the metrics thread must not walk games while commands change them on the event loop
+game_bytes = 0
+
+
+def average_game_bytes():
+    """Returns the average size of the games in memory"""
+    loaded = games.loaded_games()
+    return sum(metrics.deep_size(game) for game in loaded) / len(loaded) if loaded else 0
+
+
+async def start_command_timer(ctx):
+    ctx.command_started = time.perf_counter()
+
+
+async def stop_command_timer(ctx):
+    metrics.METRICS.observe('command_seconds', time.perf_counter() - ctx.command_started, command=ctx.command.name)
+
+
+async def write_journal():
+    """Fsyncs the event log every few milliseconds, and snapshots the games every SNAPSHOT_SECONDS. With metrics on,
+    it also measures the games for the game_bytes gauge every GAME_BYTES_SECONDS."""
+    global game_bytes
+    loop = asyncio.get_running_loop()
+    next_snapshot = loop.time() + SNAPSHOT_SECONDS
+    next_measure = loop.time()
+    while True:
+        await asyncio.sleep(0.05)
+        journal.get_log().sync()
+        if loop.time() >= next_snapshot:
+            journal.snapshot()
+            next_snapshot = loop.time() + SNAPSHOT_SECONDS
+        if METRICS_PORT and loop.time() >= next_measure:
+            game_bytes = average_game_bytes()
+            next_measure = loop.time() + GAME_BYTES_SECONDS
+
+
+# discord.py calls on_ready() again after every reconnect, and the workers or the journal task must only start once
+started = False
+
+
+@bot.event
+async def on_ready():
+    global started
+    if started:
+        return
+    started = True
+    if GAME_WORKERS:
+        await game_commands.start()
+    else:
+        bot.loop.create_task(write_journal())
+
+
+def channel_key(ctx):
+    """Returns the registry key of the channel the command came from"""
+    guild_id = ctx.guild.id if ctx.guild else None
+    return guild_id, ctx.channel.id
+
+
+async def run_command(ctx, command, *args):
+    """Runs the command on the game of the channel and sends its messages there"""
+    for message in await game_commands.call(command, channel_key(ctx), str(ctx.author), *args):
+        await outbound.send(ctx.channel, message)
 
 
 @bot.command(help="creates a game of Monopoly",
@@ -50,70 +107,115 @@ rents = [
              )
 async def start_new_game(ctx):
     """Starts a new game"""
-    user = ctx.author
-    game.create_spaces(200, rents)
-    await ctx.channel.send(f"{user} has created a game of Monopoly. Type !join to get in before it begins!")
+    await run_command(ctx, "create")
 
 
 @bot.command(name="join")
 async def join_game(ctx):
     """Adds a player to the game"""
-    user = ctx.author
-    if not game.check_started():
-        game.create_spaces(200, rents)
-    game.create_player(user, 1500)
-    await ctx.channel.send(f"{user} has joined the game")
-
+    await run_command(ctx, "join")
 
-@bot.command()
-async def add_bot(ctx, bot_name):
-    if not game.check_started():
-        game.create_spaces(200, rents)
 
-    game.create_player(bot_name, 1500)
-    await ctx.channel.send(f"{bot_name} has joined the game")
+@bot.command(help="adds a bot player. Strategies: " + ", ".join(STRATEGIES))
+async def add_bot(ctx, bot_name, strategy_name="threshold"):
+    await run_command(ctx, "add_bot", bot_name, strategy_name)
 
 
 @bot.command(name="begin")
 async def begin_game(ctx):
-    game.set_started()
-    player_going_first = game.get_active_player()
-    game.set_interaction_phase(player_going_first, 'roll')
-    await ctx.channel.send(f"The game has begun! It is {player_going_first}'s turn first." + "\n" \
-                           + "Type !roll to play your turn.")
+    await run_command(ctx, "begin")
 
 
 @bot.command()
-async def roll(ctx, bot_player=None):
-    user = ctx.author
-    if bot_player:
-        user = bot_player
-
-    users_turn = game.get_active_player() == user
-    game_started = game.check_started()
-    msg = ""
-    if game_started:
-        if users_turn:
-            player = game.get_player(user)
-            players_old_balance = player.get_balance()
-            dice_roll = player.roll_dice()           # a tuple of two die rolls
-            msg = f"{user} rolled a {dice_roll[0]} and a {dice_roll[1]}.\n"
-            pair = dice_roll[0] == dice_roll[1]
-            if pair:
-                msg += f"That's a pair! {user} will go again.\n"
-            location = game.move_player(user, dice_roll[0] + dice_roll[1])
-            if players_old_balance > player.get_balance:
-                rent = players_old_balance - player.get_balance()
-                msg += f"{user} pays {rent} to {location.get_owner()}."
-
-
-            msg = ""
-        else:
-            msg = "It is " + game.get_active_player() + "'s turn."
-    else:
-        msg = "Game has not begun."
+async def roll(ctx):
+    await run_command(ctx, "roll")
+
+
+@bot.command()
+async def buy(ctx):
+    await run_command(ctx, "buy")
+
 
+@bot.command(name="pass")
+async def pass_space(ctx):
+    await run_command(ctx, "pass")
 
 
+@bot.command(help="shows the career statistics of a player (yours by default)", name="stats")
+async def show_stats(ctx, player_name=None):
+    await run_command(ctx, "stats", *([] if player_name is None else [player_name]))
+
+
+@bot.command(help="shows the players with the most wins")
+async def leaderboard(ctx, count: int = 10):
+    await run_command(ctx, "leaderboard", count)
+
+
+@leaderboard.error
+async def leaderboard_error(ctx, error):
+    # discord.py still logs every other error itself
+    if isinstance(error, commands.BadArgument):
+        await outbound.send(ctx.channel, "The number of players to show must be a number, like !leaderboard 5.")
+
+
+def main():
+    global outbound, game_commands, games, journal, stats
+    token = os.environ['TOKEN']
+
+    # error logging
+    handler = logging.FileHandler(filename='funmonopolybot.log', encoding='utf-8', mode='w')
+
+    # game messages are queued per channel and sent in batches, so a command never waits on Discord
+    outbound = OutboundQueue(DiscordTransport())
+
+    if GAME_WORKERS:
+        game_commands = GameServer(
+            workers=GAME_WORKERS,
+            storage_dir=os.environ.get('GAME_SAVE_DIR', 'saved_games'),
+            log_dir=os.environ.get('GAME_LOG_DIR', 'game_log'),
+            max_games=int(os.environ.get('GAME_CACHE_SIZE', 1000)),
+            stats_path=STATS_PATH,
+            snapshot_seconds=SNAPSHOT_SECONDS,
+        )
+    else:
+        # one game per guild/channel, least recently used games are saved to disk
+        games = GameRegistry(
+            storage_dir=os.environ.get('GAME_SAVE_DIR', 'saved_games'),
+            max_games=int(os.environ.get('GAME_CACHE_SIZE', 1000)),
+            ttl=float(os.environ.get('GAME_IDLE_SECONDS', 3600)),
+        )
+        # every change to a game goes through the journal, so games survive a restart
+        journal = GameJournal(games, EventLog(os.environ.get('GAME_LOG_DIR', 'game_log')))
+        journal.recover()
+        # bots think in worker processes, and fall back to a simple strategy when a decision takes longer than the
+        # budget, or when the workers are already busy with two decisions each
+        bot_workers = int(os.environ.get('BOT_WORKERS', 2))
+        strategy_engine = StrategyEngine(ProcessPoolExecutor(bot_workers),
+                                         time_budget=float(os.environ.get('BOT_TURN_SECONDS', 1.0)),
+                                         max_pending=2 * bot_workers)
+        stats = StatsStore(STATS_PATH)
+        # every game is an actor that runs its commands one at a time, so overlapping commands cannot interleave
+        game_commands = GameActors(GameCommands(journal, strategy_engine, stats=stats))
+
+    # the games are only measured when they run in this process. With GAME_WORKERS set, the metrics only cover the
+    # commands: the game timings and the active_games and game_bytes gauges live in the workers and are not exported
+    if METRICS_PORT:
+        if games is not None:
+            metrics.instrument(RealEstateGame)
+            metrics.METRICS.gauge('active_games', lambda: len(games))
+            metrics.METRICS.gauge('game_bytes', lambda: game_bytes)
+        metrics.MetricsServer(port=METRICS_PORT).start()
+        bot.before_invoke(start_command_timer)
+        bot.after_invoke(stop_command_timer)
+
+    bot.run(token) # , log_handler=handler, log_level=logging.DEBUG
+    if GAME_WORKERS:
+        asyncio.run(game_commands.close())
+    else:
+        journal.snapshot()
+        journal.get_log().close()
+        stats.close()
+
 
-bot.run(token) # , log_handler=handler, log_level=logging.DEBUG
\ No newline at end of file
+if __name__ == "__main__":
+    main()
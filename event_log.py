@@ -0,0 +1,436 @@
+import glob
+import os
+import struct
+import tempfile
+import time
+import zlib
+from array import array
+
+from actions import BuyResult, MoveResult, apply_actions
+from board import Board
+
+# the kinds of events. CREATE_SPACES, SET_BOARD, CREATE_PLAYER, START, MOVE, BUY, END_TURN, SET_BOT, SET_PHASE and
+# CONCEDE change a game and are replayed on recovery, and NEW_GAME replaces the channel's game with a new one.
+# BANKRUPT is only a record of what a MOVE did, and replaying the MOVE brings it about again
+CREATE_SPACES = 1
+CREATE_PLAYER = 2
+START = 3
+MOVE = 4
+BUY = 5
+BANKRUPT = 6
+END_TURN = 7
+SET_BOT = 8
+SET_PHASE = 9
+CONCEDE = 10
+NEW_GAME = 11
+SET_BOARD = 12
+
+# every record is framed as (body length, crc32 of body), and every body starts with (sequence number, event type,
+# guild id, channel id). -1 stands for a missing guild id
+_FRAME = struct.Struct("<II")
+_HEADER = struct.Struct("<QBqq")
+_INT = struct.Struct("<q")
+_SHORT = struct.Struct("<H")
+_COUNT = struct.Struct("<I")
+_DICE = struct.Struct("<BB")
+
+
+def _pack_str(text):
+    data = str(text).encode("utf-8")
+    return _SHORT.pack(len(data)) + data
+
+
+def _unpack_str(body, offset):
+    (length,) = _SHORT.unpack_from(body, offset)
+    offset += _SHORT.size
+    return body[offset:offset + length].decode("utf-8"), offset + length
+
+
+def encode_event(seq, event_type, key, args):
+    """Takes in seq: the event's sequence number, event_type, key: the (guild id, channel id) of the game, and args:
+    the event's arguments (see apply_event()). Returns the framed binary record."""
+    guild_id, channel_id = key
+    body = [_HEADER.pack(seq, event_type, -1 if guild_id is None else guild_id, channel_id)]
+    if event_type == CREATE_SPACES:
+        go_bonus, rents = args
+        body.append(_INT.pack(go_bonus) + _COUNT.pack(len(rents)) + struct.pack(f"<{len(rents)}q", *rents))
+    elif event_type == SET_BOARD:
+        (board,) = args
+        size = board.get_size()
+        body.append(_INT.pack(board.go_bonus) + _COUNT.pack(size) + struct.pack(f"<{size}q", *board.rents) +
+                    struct.pack(f"<{size}q", *board.prices) + bytes(board.buyable))
+        body.extend(_pack_str(name) for name in board.names)
+    elif event_type == CREATE_PLAYER:
+        name, balance = args
+        body.append(_pack_str(name) + _INT.pack(balance))
+    elif event_type == MOVE:
+        name, die1, die2 = args
+        body.append(_pack_str(name) + _DICE.pack(die1, die2))
+    elif event_type in (BUY, BANKRUPT, CONCEDE):
+        body.append(_pack_str(args[0]))
+    elif event_type == SET_BOT or event_type == SET_PHASE:
+        body.append(_pack_str(args[0]) + _pack_str(args[1]))
+    body = b"".join(body)
+    return _FRAME.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_event(body):
+    """Takes in the body of a record. Returns (seq, event_type, key, args), the reverse of encode_event()"""
+    seq, event_type, guild_id, channel_id = _HEADER.unpack_from(body)
+    key = None if guild_id == -1 else guild_id, channel_id
+    offset = _HEADER.size
+    if event_type == CREATE_SPACES:
+        (go_bonus,) = _INT.unpack_from(body, offset)
+        (count,) = _COUNT.unpack_from(body, offset + _INT.size)
+        rents = list(struct.unpack_from(f"<{count}q", body, offset + _INT.size + _COUNT.size))
+        args = go_bonus, rents
+    elif event_type == SET_BOARD:
+        (go_bonus,) = _INT.unpack_from(body, offset)
+        (size,) = _COUNT.unpack_from(body, offset + _INT.size)
+        offset += _INT.size + _COUNT.size
+        rents = array("q", struct.unpack_from(f"<{size}q", body, offset))
+        prices = array("q", struct.unpack_from(f"<{size}q", body, offset + size * 8))
+        buyable = bytes(body[offset + size * 16:offset + size * 17])
+        offset += size * 17
+        names = []
+        for _ in range(size):
+            name, offset = _unpack_str(body, offset)
+            names.append(name)
+        args = (Board(go_bonus, tuple(names), rents, prices, buyable),)
+    elif event_type == CREATE_PLAYER:
+        name, offset = _unpack_str(body, offset)
+        args = name, _INT.unpack_from(body, offset)[0]
+    elif event_type == MOVE:
+        name, offset = _unpack_str(body, offset)
+        args = (name,) + _DICE.unpack_from(body, offset)
+    elif event_type in (BUY, BANKRUPT, CONCEDE):
+        args = (_unpack_str(body, offset)[0],)
+    elif event_type == SET_BOT or event_type == SET_PHASE:
+        first, offset = _unpack_str(body, offset)
+        args = first, _unpack_str(body, offset)[0]
+    else:
+        args = ()
+    return seq, event_type, key, args
+
+
+def apply_event(game, event_type, args):
+    """Takes in game, event_type and args. Applies the event to the game, and returns what the game method returned.
+    The live path (GameJournal) and recovery both go through here, so a replayed event does exactly what the
+    original did."""
+    if event_type == CREATE_SPACES:
+        return game.create_spaces(*args)
+    if event_type == SET_BOARD:
+        return game.set_board(*args)
+    if event_type == CREATE_PLAYER:
+        return game.create_player(*args)
+    if event_type == START:
+        return game.set_started()
+    if event_type == MOVE:
+        name, die1, die2 = args
+        return game.move_player(name, die1 + die2, (die1, die2))
+    if event_type == BUY:
+        return game.buy_space(*args)
+    if event_type == END_TURN:
+        return game.end_turn()
+    if event_type == SET_BOT:
+        return game.set_bot(*args)
+    if event_type == SET_PHASE:
+        return game.set_interaction_phase(*args)
+    if event_type == CONCEDE:
+        return game.concede(*args)
+
+
+def _segments(directory):
+    """Returns the log segments in the directory, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, "events-*.log")))
+
+
+def _records(data):
+    """Yields (end offset, body) for every record of a segment's data, up to its first incomplete or corrupt record,
+    which is where the process stopped if it crashed while writing it"""
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, offset)
+        body = data[offset + _FRAME.size:offset + _FRAME.size + length]
+        if len(body) < length or zlib.crc32(body) != checksum:
+            return
+        offset += _FRAME.size + length
+        yield offset, body
+
+
+def read_events(directory, after_seq=0):
+    """Takes in directory: the log directory, and after_seq. Yields (seq, event_type, key, args) for every event with
+    a sequence number above after_seq, oldest first. A segment is read up to its first incomplete or corrupt
+    record."""
+    for path in _segments(directory):
+        with open(path, "rb") as file:
+            data = file.read()
+        for _, body in _records(data):
+            event = decode_event(body)
+            if event[0] > after_seq:
+                yield event
+
+
+def read_checkpoint(directory):
+    """Returns the sequence number of the last checkpoint, or 0 if there is none"""
+    try:
+        with open(os.path.join(directory, "checkpoint"), "rb") as file:
+            return _INT.unpack(file.read())[0]
+    except FileNotFoundError:
+        return 0
+
+
+class EventLog:
+    """A class that appends binary event records to a log directory. The log is split into segments, and every time
+    the log is opened or checkpointed a new segment is started. Records are written straight away but only fsynced
+    in batches, once sync_every records are waiting or sync_interval seconds have passed, so a command only pays
+    for a buffered write."""
+
+    def __init__(self, directory, sync_every=256, sync_interval=0.05, clock=time.monotonic):
+        """Takes in directory, and the fsync batching limits sync_every and sync_interval. Carries on from the last
+        sequence number in the log."""
+        self._directory = directory
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._clock = clock
+        os.makedirs(directory, exist_ok=True)
+
+        self._seq = read_checkpoint(directory)
+        for event in read_events(directory, self._seq):
+            self._seq = event[0]
+        self._file = None
+        self._open_segment()
+
+    def get_directory(self):
+        """Returns the log directory"""
+        return self._directory
+
+    def get_seq(self):
+        """Returns the sequence number of the last event appended"""
+        return self._seq
+
+    def append(self, event_type, key, args=()):
+        """Takes in event_type, key and args. Appends the event and returns its sequence number."""
+        self._seq += 1
+        self._file.write(encode_event(self._seq, event_type, key, args))
+        self._pending += 1
+        if self._pending >= self._sync_every or self._clock() - self._last_sync >= self._sync_interval:
+            self.sync()
+        return self._seq
+
+    def sync(self):
+        """Writes out and fsyncs every record appended so far"""
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = self._clock()
+
+    def checkpoint(self):
+        """Records that every event so far is part of a snapshot, starts a new segment and deletes the old ones.
+        The caller must have saved the snapshot before calling this."""
+        self.sync()
+        self._file.close()
+        old_segments = _segments(self._directory)
+        descriptor, temporary = tempfile.mkstemp(dir=self._directory)
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(_INT.pack(self._seq))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, os.path.join(self._directory, "checkpoint"))
+        for path in old_segments:
+            os.remove(path)
+        self._open_segment()
+
+    def close(self):
+        """Syncs and closes the log"""
+        self.sync()
+        self._file.close()
+
+    def _open_segment(self):
+        path = os.path.join(self._directory, f"events-{self._seq + 1:020d}.log")
+        if os.path.exists(path):
+            # the segment was started before a crash and holds no complete record past self._seq. Whatever torn
+            # record it ends with is cut off, or read_events() would stop there and miss everything appended after
+            with open(path, "r+b") as file:
+                file.truncate(max((end for end, _ in _records(file.read())), default=0))
+        self._file = open(path, "ab")
+        self._pending = 0
+        self._last_sync = self._clock()
+
+
+class GameJournal:
+    """A class that changes games in a GameRegistry and records every change in an EventLog. The registry's saved
+    games are the snapshots: snapshot() saves every game in memory and checkpoints the log, and recover() replays
+    the events after the last checkpoint. Each game's registry version is the sequence number of the last event
+    applied to it, so an event that a saved game already contains is never applied twice."""
+
+    def __init__(self, registry, log):
+        """Takes in registry: a GameRegistry, and log: an EventLog"""
+        self._registry = registry
+        self._log = log
+        # a game saved with a version the log lost in a crash would skip the events that reuse its sequence numbers
+        registry.set_before_save(log.sync)
+
+    def get_registry(self):
+        """Returns the journal's GameRegistry"""
+        return self._registry
+
+    def get_log(self):
+        """Returns the journal's EventLog"""
+        return self._log
+
+    def record(self, key, event_type, args=()):
+        """Takes in key, event_type and args. Applies the event to the channel's game (creating the game if
+        needed), logs it, and returns what the game method returned."""
+        game = self._registry.get(key, create=True)
+        result = apply_event(game, event_type, args)
+        self._registry.set_version(key, self._log.append(event_type, key, args))
+        return result
+
+    def create_spaces(self, key, go_bonus, rents):
+        return self.record(key, CREATE_SPACES, (go_bonus, list(rents)))
+
+    def set_board(self, key, board):
+        return self.record(key, SET_BOARD, (board,))
+
+    def create_player(self, key, name, initial_balance):
+        return self.record(key, CREATE_PLAYER, (name, initial_balance))
+
+    def set_started(self, key):
+        return self.record(key, START)
+
+    def buy_space(self, key, name):
+        return self.record(key, BUY, (name,))
+
+    def end_turn(self, key):
+        return self.record(key, END_TURN)
+
+    def set_bot(self, key, name, strategy):
+        return self.record(key, SET_BOT, (name, strategy))
+
+    def set_interaction_phase(self, key, player, phase):
+        return self.record(key, SET_PHASE, (player, phase))
+
+    def concede(self, key, name):
+        return self.record(key, CONCEDE, (name,))
+
+    def new_game(self, key):
+        """Replaces the channel's game with a new one. The event is synced before the old game's save is deleted, so
+        a crash in between replays it instead of replaying the old game's events onto nothing."""
+        seq = self._log.append(NEW_GAME, key)
+        self._log.sync()
+        self._registry.remove(key)
+        self._registry.get(key, create=True)
+        self._registry.set_version(key, seq)
+
+    def move_player(self, key, name, die1, die2):
+        """Moves the player by the sum of the dice, logging the roll and, if the player ran out of money, a
+        BANKRUPT event. Returns what move_player() returned."""
+        game = self._registry.get(key, create=True)
+        balance_before = game.get_player_account_balance(name)
+        result = self.record(key, MOVE, (name, die1, die2))
+        if balance_before > 0 and game.get_player_account_balance(name) <= 0:
+            self._registry.set_version(key, self._log.append(BANKRUPT, key, (name,)))
+        return result
+
+    def apply_actions(self, key, actions):
+        """Takes in key and actions: a list of Move, Buy and Pass. Applies them with actions.apply_actions() and,
+        only if every action was allowed, logs one event for each (with the dice that were rolled) and a BANKRUPT
+        event for a player that went bankrupt. Returns the list of results. Raises InvalidAction without logging
+        anything if an action was not allowed."""
+        results = apply_actions(self._registry.get(key, create=True), actions)
+        for result in results:
+            if isinstance(result, MoveResult):
+                seq = self._log.append(MOVE, key, (result.player,) + result.dice)
+                if result.bankrupt:
+                    seq = self._log.append(BANKRUPT, key, (result.player,))
+            elif isinstance(result, BuyResult):
+                seq = self._log.append(BUY, key, (result.player,))
+            else:
+                seq = self._log.append(END_TURN, key)
+            self._registry.set_version(key, seq)
+        return results
+
+    def snapshot(self):
+        """Saves every game in memory and checkpoints the log. Games that were evicted were saved when they left
+        memory and have not changed since."""
+        self._log.sync()
+        self._registry.save_all()
+        self._log.checkpoint()
+
+    def recover(self):
+        """Replays every event after the last checkpoint onto the registry's saved games. Returns how many events
+        were applied."""
+        applied = 0
+        directory = self._log.get_directory()
+        for seq, event_type, key, args in read_events(directory, read_checkpoint(directory)):
+            if seq > self._registry.get_version(key):
+                if event_type == NEW_GAME:
+                    self._registry.remove(key)
+                apply_event(self._registry.get(key, create=True), event_type, args)
+                self._registry.set_version(key, seq)
+                applied += 1
+        return applied
+
+
+def benchmark(directory, games=1000, moves_per_game=200):
+    """Takes in directory, games and moves_per_game. Measures append throughput with batched and per-event fsyncs,
+    and how long recovery takes from the log alone and from a snapshot plus a short tail. Returns a dictionary of
+    the results."""
+    import random
+    from game_registry import GameRegistry
+
+    rents = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350,
+             350, 350]
+    rng = random.Random(0)
+    results = {}
+
+    def play(journal, count):
+        for index in range(count):
+            key = (0, rng.randrange(games))
+            journal.move_player(key, f"Player {index % 2}", rng.randint(1, 6), rng.randint(1, 6))
+
+    def make_journal(name, **options):
+        registry = GameRegistry(os.path.join(directory, name, "games"), max_games=games)
+        return GameJournal(registry, EventLog(os.path.join(directory, name, "log"), **options))
+
+    journal = make_journal("batched")
+    for channel in range(games):
+        journal.create_spaces((0, channel), 200, rents)
+        journal.create_player((0, channel), "Player 0", 1500)
+        journal.create_player((0, channel), "Player 1", 1500)
+    start = time.perf_counter()
+    play(journal, games * moves_per_game)
+    journal.get_log().sync()
+    results["batched_events_per_second"] = games * moves_per_game / (time.perf_counter() - start)
+    journal.get_log().close()
+
+    unbatched = make_journal("unbatched", sync_every=1)
+    unbatched.create_spaces((0, 0), 200, rents)
+    unbatched.create_player((0, 0), "Player 0", 1500)
+    unbatched.create_player((0, 0), "Player 1", 1500)
+    start = time.perf_counter()
+    for _ in range(500):
+        unbatched.move_player((0, 0), "Player 0", 1, 2)
+    results["fsync_per_event_events_per_second"] = 500 / (time.perf_counter() - start)
+    unbatched.get_log().close()
+
+    start = time.perf_counter()
+    recovered = make_journal("batched")
+    results["full_replay_events"] = recovered.recover()
+    results["full_replay_seconds"] = time.perf_counter() - start
+
+    recovered.snapshot()
+    play(recovered, games * moves_per_game // 100)
+    recovered.get_log().close()
+    start = time.perf_counter()
+    results["tail_replay_events"] = make_journal("batched").recover()
+    results["snapshot_recovery_seconds"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        for name, value in benchmark(directory).items():
+            print(f"{name}: {value:.4g}" if isinstance(value, float) else f"{name}: {value}")
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import tempfile
+import time
+
+# commands that set a game up and do the same thing however many times they are sent in a row. A copy sent while
+# another is still waiting in the mailbox is not run again, and gets the waiting one's reply
+COALESCED = frozenset(("create", "join", "add_bot", "begin", "stats", "leaderboard"))
+
+
+class GameActor:
+    """A class that runs the commands of one game, one at a time, in the order they arrive. Commands wait in a
+    bounded mailbox, and senders wait for room when it is full, the same way OutboundQueue slows down whoever sends
+    faster than Discord takes messages. Every command is answered through a future, so a command that awaits (a bot
+    thinking, say) never lets another command of the same game run halfway through it."""
+
+    def __init__(self, commands, key, mailbox_size=256):
+        """Takes in commands: a GameCommands (or anything with the same call()), key: the game's channel key, and
+        mailbox_size: how many commands may wait at once"""
+        self._commands = commands
+        self._key = key
+        self._mailbox = asyncio.Queue(mailbox_size)
+        # the futures of the coalesced commands waiting in the mailbox, by (command, user, args)
+        self._waiting = {}
+        self._busy = False
+        self.processed = 0
+        self.coalesced = 0
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def call(self, command, user, *args):
+        """Takes in command, user and the command's arguments. Queues the command and returns the messages it
+        produced, or raises what it raised."""
+        message = command, user, args
+        future = self._waiting.get(message) if command in COALESCED else None
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            if command in COALESCED:
+                self._waiting[message] = future
+            await self._mailbox.put((message, future))
+        # a sender that gives up does not cancel the command, which others may be waiting on too
+        return await asyncio.shield(future)
+
+    def is_idle(self):
+        """Returns whether the actor has nothing to do"""
+        return not self._busy and self._mailbox.empty()
+
+    async def _run(self):
+        while True:
+            message, future = await self._mailbox.get()
+            if self._waiting.get(message) is future:
+                del self._waiting[message]
+            command, user, args = message
+            self._busy = True
+            try:
+                result = await self._commands.call(command, self._key, user, *args)
+            except Exception as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+            finally:
+                self._busy = False
+                self.processed += 1
+                self._mailbox.task_done()
+
+    def cancel(self):
+        """Stops the actor straight away, dropping whatever is in its mailbox"""
+        self._task.cancel()
+
+    async def stop(self):
+        """Waits for the mailbox to empty, then stops the actor"""
+        await self._mailbox.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class GameActors:
+    """A class with the same call() as GameCommands that hands every command to its game's GameActor, started the
+    first time the game's channel sends one. Actors that have been idle for idle_seconds are stopped the next time a
+    command comes in."""
+
+    def __init__(self, commands, mailbox_size=256, idle_seconds=600, clock=time.monotonic):
+        self._commands = commands
+        self._mailbox_size = mailbox_size
+        self._idle_seconds = idle_seconds
+        self._clock = clock
+        self._actors = {}
+        self._last_used = {}
+        self._next_sweep = clock() + idle_seconds
+
+    def get_actor(self, key):
+        """Returns the GameActor of the channel, or None if it has none running"""
+        return self._actors.get(key)
+
+    async def call(self, command, key, user, *args):
+        """Takes in command, key, user and the command's arguments, as GameCommands.call()"""
+        now = self._clock()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        actor = self._actors.get(key)
+        if actor is None:
+            actor = self._actors[key] = GameActor(self._commands, key, self._mailbox_size)
+        self._last_used[key] = now
+        return await actor.call(command, user, *args)
+
+    def _sweep(self, now):
+        """Stops the actors that have had nothing to do for idle_seconds. An idle actor is waiting on an empty
+        mailbox, so cancelling it loses nothing."""
+        for key, actor in list(self._actors.items()):
+            if actor.is_idle() and now - self._last_used[key] >= self._idle_seconds:
+                actor.cancel()
+                del self._actors[key], self._last_used[key]
+        self._next_sweep = now + self._idle_seconds
+
+    async def close(self):
+        """Runs every waiting command, then stops the actors"""
+        await asyncio.gather(*(actor.stop() for actor in self._actors.values()))
+        self._actors.clear()
+        self._last_used.clear()
+
+
+async def load_test(channels=4, commands_per_channel=400, players=4):
+    """Takes in channels, commands_per_channel and players: the people in each channel. Sends every channel's
+    commands at once, the way a crowd spamming the bot would: each person joins several times, bots are added twice,
+    the game is begun by everyone, and the rest are rolls, buys and passes. Checks that every game came out whole
+    and returns a dictionary of the command count, how many were coalesced, the commands per second and the median,
+    99th percentile and worst latency in milliseconds."""
+    from event_log import EventLog, GameJournal
+    from game_commands import GameCommands
+    from game_registry import GameRegistry
+
+    with tempfile.TemporaryDirectory() as directory:
+        registry = GameRegistry(os.path.join(directory, "games"))
+        journal = GameJournal(registry, EventLog(os.path.join(directory, "log")))
+        actors = GameActors(GameCommands(journal, initial_balance=3000))
+        latencies = []
+
+        async def send(command, key, user, *args):
+            start = time.perf_counter()
+            try:
+                return await actors.call(command, key, user, *args)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        def channel_commands(channel_id):
+            key = (1, channel_id)
+            people = [f"Person {number}" for number in range(players)]
+            setup = [("create", key, people[0])]
+            setup += [("join", key, person) for person in people for _ in range(3)]
+            setup += [("add_bot", key, people[0], "Bot", "greedy")] * 2 + [("begin", key, person) for person in people]
+            play = [(("roll", "buy", "pass")[number % 3], key, people[number % players])
+                    for number in range(commands_per_channel - len(setup))]
+            return setup + play
+
+        sends = [send(*command) for channel_id in range(channels) for command in channel_commands(channel_id)]
+        start = time.perf_counter()
+        # every command is sent before any is answered
+        await asyncio.gather(*sends)
+        seconds = time.perf_counter() - start
+        counts = [(actor.processed, actor.coalesced) for actor in actors._actors.values()]
+        coalesced = sum(count for _, count in counts)
+        await actors.close()
+        # every command ran once, apart from the copies that were coalesced
+        if sum(processed for processed, _ in counts) + coalesced != len(latencies):
+            raise AssertionError("commands were lost or run twice")
+
+        for channel_id in range(channels):
+            game = registry.get((1, channel_id))
+            if game.get_board_size() != 25 or len(game.get_player_names()) != players + 1 or not game.check_started():
+                raise AssertionError(f"channel {channel_id} came out wrong")
+        journal.get_log().close()
+
+    latencies.sort()
+    return {"commands": len(latencies), "coalesced": coalesced, "commands_per_second": len(latencies) / seconds,
+            "p50_ms": latencies[len(latencies) // 2] * 1000, "p99_ms": latencies[len(latencies) * 99 // 100] * 1000,
+            "max_ms": latencies[-1] * 1000}
+
+
+if __name__ == "__main__":
+    for name, value in asyncio.run(load_test()).items():
+        print(f"{name}: {value:,.1f}" if isinstance(value, float) else f"{name}: {value}")
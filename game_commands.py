@@ -0,0 +1,283 @@
+from actions import BUY_PHASES, Buy, BuyResult, InvalidAction, Move, Pass
+from player_stats import describe_stats
+from strategy import STRATEGIES, StrategyEngine, can_buy, describe_move, make_strategy, play_bot_turn, position_for
+
+RENTS = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350, 350,
+         350]
+
+# the most players !leaderboard lists
+MAX_LEADERS = 25
+
+
+class GameCommands:
+    """A class that runs the bot's game commands against a GameJournal. Every command takes the key of the game's
+    channel and the name of the user who sent it, changes the game through the journal, and returns the messages
+    to send back to the channel. It knows nothing about Discord, so it runs the same in the bot's process and in
+    the worker processes of a GameServer."""
+
+    # the commands call() accepts, and the methods that run them
+    COMMANDS = {
+        "create": "create",
+        "join": "join",
+        "add_bot": "add_bot",
+        "begin": "begin",
+        "roll": "roll",
+        "buy": "buy",
+        "pass": "pass_space",
+        "stats": "stats",
+        "leaderboard": "leaderboard",
+    }
+
+    def __init__(self, journal, engine=None, go_bonus=200, rents=None, initial_balance=1500, stats=None,
+                 max_bot_turns=100):
+        """Takes in journal: a GameJournal, and engine: the StrategyEngine bots think with (a new one by default).
+        Takes in go_bonus, rents and initial_balance: the board and money of new games. Takes in stats: an optional
+        StatsStore that finished games are recorded in. Takes in max_bot_turns: how many bot turns one command may
+        play. Once a game has only bots left with money, that is also how many turns they get before it ends."""
+        self._journal = journal
+        self._engine = StrategyEngine() if engine is None else engine
+        self._go_bonus = go_bonus
+        self._rents = RENTS if rents is None else rents
+        self._initial_balance = initial_balance
+        self._stats = stats
+        self._max_bot_turns = max_bot_turns
+        self._strategies = {}
+
+    def get_journal(self):
+        return self._journal
+
+    async def call(self, command, key, user, *args):
+        """Takes in command: one of COMMANDS, key, user and the command's arguments. Runs the command and returns the
+        list of messages it produced. Raises a ValueError for unknown commands."""
+        if command not in self.COMMANDS:
+            raise ValueError(f"unknown command {command}")
+        return await getattr(self, self.COMMANDS[command])(key, user, *args)
+
+    def _game(self, key):
+        return self._journal.get_registry().get(key)
+
+    async def create(self, key, user):
+        game = self._game(key)
+        if game is not None and game.check_created():
+            if not game.check_started():
+                return ["A game has already been created. Type !join to get in before it begins!"]
+            if game.check_game_over() == "":
+                return ["A game is already being played in this channel."]
+            self._journal.new_game(key)
+        self._journal.create_spaces(key, self._go_bonus, self._rents)
+        return [f"{user} has created a game of Monopoly. Type !join to get in before it begins!"]
+
+    def _seat(self, key, name):
+        """Sets up the board if nobody has yet. Returns why name cannot take a seat in the game, or None if they can.
+        Seats are only taken before the game begins: a player added later would change whose turn it is, and one
+        added after the game is over would start it again."""
+        game = self._journal.get_registry().get(key, create=True)
+        if game.check_started():
+            over = self._over(game)
+            if over is not None:
+                return over
+            return "The game has already begun. Wait for it to end, then type !create to play again."
+        if game.get_player(name) is not None:
+            return f"{name} is already in the game"
+        if not game.check_created():
+            self._journal.create_spaces(key, self._go_bonus, self._rents)
+        return None
+
+    async def join(self, key, user):
+        refusal = self._seat(key, user)
+        if refusal is not None:
+            return [refusal]
+        self._journal.create_player(key, user, self._initial_balance)
+        return [f"{user} has joined the game"]
+
+    async def add_bot(self, key, user, bot_name, strategy_name="threshold"):
+        if strategy_name not in STRATEGIES:
+            return [f"unknown strategy {strategy_name}, pick one of {', '.join(STRATEGIES)}"]
+        refusal = self._seat(key, bot_name)
+        if refusal is not None:
+            return [refusal]
+        self._journal.create_player(key, bot_name, self._initial_balance)
+        self._journal.set_bot(key, bot_name, strategy_name)
+        return [f"{bot_name} has joined the game, playing {strategy_name}"]
+
+    async def begin(self, key, user):
+        game = self._game(key)
+        if game is None:
+            return ["There is no game in this channel. Type !create to make one."]
+        if game.check_started():
+            return ["The game has already begun."]
+        if len(game.get_player_names()) < 2:
+            return ["A game needs at least 2 players. Type !join or !add_bot first."]
+        if not self._people_playing(game):
+            return ["A game needs at least 1 person playing. Type !join first."]
+        self._journal.set_started(key)
+        messages = [f"The game has begun! It is {game.get_active_player()}'s turn first.\nType !roll to play your "
+                    f"turn."]
+        return messages + await self._play_bots(key)
+
+    def _game_over(self, key):
+        """Clears the phase of the player who was last up, and records the finished game in the career
+        statistics"""
+        self._journal.set_interaction_phase(key, self._game(key).check_game_over(), "over")
+        if self._stats is not None:
+            self._stats.record_game(self._game(key))
+
+    @staticmethod
+    def _over(game):
+        """Returns the message to answer turn commands with once the game is over, or None if there is no game or it
+        has not ended"""
+        winner = "" if game is None or not game.check_started() else game.check_game_over()
+        if winner == "":
+            return None
+        return f"The game is over, {winner} won. Type !create to play again."
+
+    def _strategy(self, name):
+        """Returns the strategy of the given name, shared by every bot that plays it"""
+        strategy = self._strategies.get(name)
+        if strategy is None:
+            strategy = self._strategies[name] = make_strategy(name)
+        return strategy
+
+    @staticmethod
+    def _people_playing(game):
+        """Returns whether anyone who is not a bot still has money in the game"""
+        return any(game.get_bot(name) is None and game.get_player_account_balance(name) > 0
+                   for name in game.get_player_names())
+
+    def _end_bot_game(self, key):
+        """Ends a game that only bots have money left in: the bot with the highest net worth wins, and the others
+        concede"""
+        game = self._game(key)
+        worth = {name: game.get_net_worth(name) for name in game.get_player_names()
+                 if game.get_player_account_balance(name) > 0}
+        winner = max(worth, key=worth.get)
+        for name in worth:
+            if name != winner:
+                self._journal.concede(key, name)
+        self._game_over(key)
+        return [f"Only bots are left, so the game ends after {self._max_bot_turns} more turns. {winner} wins with a "
+                f"net worth of {worth[winner]}!"]
+
+    async def _play_bots(self, key):
+        """Plays the turns of bots for as long as it is a bot's turn, then tells the next player to roll. After
+        max_bot_turns turns it stops: a game that people still play in waits for one of them to type !roll, and a game
+        with only bots left ends."""
+        messages = []
+        game = self._game(key)
+        turns = 0
+        while game.check_game_over() == "" and game.get_bot(game.get_active_player()) is not None:
+            if turns == self._max_bot_turns:
+                if not self._people_playing(game):
+                    return messages + self._end_bot_game(key)
+                self._journal.set_interaction_phase(key, game.get_active_player(), "roll")
+                return messages + [f"The bots have played {turns} turns in a row. Type !roll to let them carry on."]
+            turns += 1
+            name = game.get_active_player()
+            lines = await play_bot_turn(self._journal, key, name, self._strategy(game.get_bot(name)), self._engine)
+            messages.append("\n".join(lines))
+            game = self._game(key)
+            if game.check_game_over() != "":
+                self._game_over(key)
+        if game.check_game_over() == "":
+            self._journal.set_interaction_phase(key, game.get_active_player(), "roll")
+            messages.append(f"It is {game.get_active_player()}'s turn. Type !roll to play your turn.")
+        return messages
+
+    async def _finish_turn(self, key, user, pair, actions=()):
+        """Applies the user's last actions and ends their turn, or lets them roll again after a pair, then plays any
+        bots that are up next"""
+        if not pair:
+            actions = list(actions) + [Pass(user)]
+        messages = []
+        try:
+            results = self._journal.apply_actions(key, actions)
+        except InvalidAction as error:
+            return [error.reason]
+        for result in results:
+            if isinstance(result, BuyResult):
+                space = self._game(key).get_space(result.location)
+                messages.append(f"{user} bought {space.get_name()} for {result.price}.")
+        if pair:
+            self._journal.set_interaction_phase(key, user, "roll")
+            return messages + [f"That's a pair! {user}, type !roll to go again."]
+        return messages + await self._play_bots(key)
+
+    async def roll(self, key, user):
+        game = self._game(key)
+        if game is None:
+            return ["There is no game in this channel. Type !create to make one."]
+        if not game.check_started():
+            return ["Game has not begun."]
+        over = self._over(game)
+        if over is not None:
+            return [over]
+        if game.get_bot(game.get_active_player()) is not None and game.get_player(user) is not None:
+            # the bots stopped after max_bot_turns, and carry on when someone in the game asks
+            return await self._play_bots(key)
+        if game.get_interaction_phase() in ((user, phase) for phase in BUY_PHASES):
+            return ["Type !buy or !pass first."]
+        try:
+            move, = self._journal.apply_actions(key, [Move(user)])
+        except InvalidAction as error:
+            return [error.reason]
+
+        game = self._game(key)
+        messages = ["\n".join(describe_move(game, move))]
+        if move.winner != "":
+            self._game_over(key)
+            return messages
+        pair = move.dice[0] == move.dice[1] and not move.bankrupt
+        if move.paid_to is None and can_buy(position_for(game, user)):
+            self._journal.set_interaction_phase(key, user, "buy_and_roll" if pair else "buy")
+            space = game.get_space(move.location)
+            return messages + [f"{space.get_name()} costs {space.get_purchase_price()}. Type !buy to buy it or !pass "
+                               f"to skip it."]
+        return messages + await self._finish_turn(key, user, pair)
+
+    def _buy_phase(self, key, user):
+        """Returns whether the user was rolled onto a space they can buy, and whether they rolled a pair"""
+        game = self._game(key)
+        phase = None if game is None else game.get_interaction_phase()
+        if phase not in ((user, name) for name in BUY_PHASES):
+            return False, False
+        return True, phase == (user, "buy_and_roll")
+
+    async def buy(self, key, user):
+        over = self._over(self._game(key))
+        if over is not None:
+            return [over]
+        buying, pair = self._buy_phase(key, user)
+        if not buying:
+            return ["There is nothing to buy right now."]
+        return await self._finish_turn(key, user, pair, [Buy(user)])
+
+    async def pass_space(self, key, user):
+        over = self._over(self._game(key))
+        if over is not None:
+            return [over]
+        buying, pair = self._buy_phase(key, user)
+        if not buying:
+            return ["There is nothing to buy right now."]
+        return await self._finish_turn(key, user, pair)
+
+    async def stats(self, key, user, name=None):
+        if self._stats is None:
+            return ["Career statistics are not being kept."]
+        stats = self._stats.get(user if name is None else name)
+        if stats is None:
+            return [f"{user if name is None else name} has not finished a game yet."]
+        return [describe_stats(stats)]
+
+    async def leaderboard(self, key, user, count=10):
+        if self._stats is None:
+            return ["Career statistics are not being kept."]
+        try:
+            count = int(count)
+        except ValueError:
+            return [f"{count} is not a number of players."]
+        leaders = self._stats.top(max(1, min(count, MAX_LEADERS)))
+        if not leaders:
+            return ["No games have been finished yet."]
+        # one short line per player, so the longest leaderboard still fits in a Discord message. !stats has the rest
+        return ["\n".join(f"{place}. {stats.name}: {stats.wins} wins in {stats.games} games"
+                          for place, stats in enumerate(leaders, 1))]
@@ -0,0 +1,128 @@
+import os
+import pickle
+import time
+from collections import OrderedDict
+
+from RealEstateGame import RealEstateGame
+
+
+class GameRegistry:
+    """A class that holds one game per Discord channel. Games are created the first time a channel asks for one.
+    Recently used games are kept in memory, and the least recently used ones are saved to disk and dropped once
+    there are more than max_games of them or they have been idle for longer than ttl seconds. A saved game is loaded
+    back the next time its channel asks for it, so callers never see the difference."""
+
+    def __init__(self, storage_dir="saved_games", max_games=1000, ttl=3600, game_factory=RealEstateGame,
+                 clock=time.monotonic):
+        """Takes in storage_dir: the directory evicted games are saved in. Takes in max_games: how many games to keep
+        in memory. Takes in ttl: how many idle seconds a game stays in memory. Takes in game_factory: the function
+        that builds a new game (RealEstateGame or CompactGame). Takes in clock: the function giving the current time."""
+        self._storage_dir = storage_dir
+        self._max_games = max_games
+        self._ttl = ttl
+        self._game_factory = game_factory
+        self._clock = clock
+        # key -> (game, last used), ordered from least to most recently used
+        self._games = OrderedDict()
+        # key -> the version of each game in memory, saved along with the game. The event log stores the sequence
+        # number of the last event applied to the game here
+        self._versions = {}
+        self._before_save = None
+        os.makedirs(storage_dir, exist_ok=True)
+
+    def __len__(self):
+        """Returns how many games are in memory"""
+        return len(self._games)
+
+    def __contains__(self, key):
+        """Returns whether the channel has a game, in memory or on disk"""
+        return key in self._games or os.path.exists(self._path(key))
+
+    def loaded_games(self):
+        """Returns a list of the games in memory"""
+        return [game for game, _ in self._games.values()]
+
+    def get(self, key, create=False):
+        """Takes in key: a (guild id, channel id) pair. Returns the channel's game, loading it from disk if it was
+        evicted. If the channel has no game, a new one is created when create is True, and None is returned
+        otherwise."""
+        now = self._clock()
+        entry = self._games.pop(key, None)
+        if entry is not None:
+            game = entry[0]
+        else:
+            version, game = self._load(key)
+            if game is None:
+                if not create:
+                    return None
+                game = self._game_factory()
+            self._versions[key] = version
+        self._games[key] = game, now
+        self.evict(now)
+        return game
+
+    def evict(self, now=None):
+        """Saves and drops games, least recently used first, until at most max_games are left and none has been
+        idle for longer than ttl. Returns how many games were evicted."""
+        if now is None:
+            now = self._clock()
+        evicted = 0
+        while self._games:
+            key, (game, last_used) = next(iter(self._games.items()))
+            if len(self._games) <= self._max_games and now - last_used <= self._ttl:
+                break
+            self._save(key, game)
+            del self._games[key]
+            del self._versions[key]
+            evicted += 1
+        return evicted
+
+    def remove(self, key):
+        """Deletes the channel's game from memory and from disk"""
+        self._games.pop(key, None)
+        self._versions.pop(key, None)
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def get_version(self, key):
+        """Returns the version of the channel's game, loading the game if needed. A new game has version 0."""
+        self.get(key, create=True)
+        return self._versions[key]
+
+    def set_version(self, key, version):
+        """Sets the version of the channel's game, which must be in memory"""
+        self._versions[key] = version
+
+    def set_before_save(self, callback):
+        """Takes in callback: a function with no arguments called before any game is saved, or None. GameJournal
+        syncs its log there, so a saved version never refers to an event that is not on disk yet."""
+        self._before_save = callback
+
+    def save_all(self):
+        """Saves every game in memory, e.g. before the bot shuts down"""
+        for key, (game, _) in self._games.items():
+            self._save(key, game)
+
+    def _path(self, key):
+        """Returns the file a channel's game is saved in"""
+        return os.path.join(self._storage_dir, "_".join(str(part) for part in key) + ".pickle")
+
+    def _save(self, key, game):
+        """Writes the game to a temporary file and moves it into place, so a crash never leaves half a game"""
+        if self._before_save is not None:
+            self._before_save()
+        path = self._path(key)
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump((self._versions[key], game), file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _load(self, key):
+        """Returns the (version, game) pair the channel's game was saved with, or (0, None) if it has none. The file
+        is kept, and is overwritten the next time the game is evicted."""
+        try:
+            with open(self._path(key), "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return 0, None
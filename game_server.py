@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+import zlib
+
+from event_log import EventLog, GameJournal
+from game_commands import GameCommands
+from game_registry import GameRegistry
+from player_stats import StatsStore
+
+# a request is (request id, command, key, user, args) and a reply is (request id, ok, messages or error). None asks a
+# worker to stop. "ping" is answered by the worker itself, once it has recovered its games
+PING = "ping"
+
+
+class WorkerRestarted(Exception):
+    """Raised for the commands a worker had not answered when it died. Whether they were applied is unknown, so
+    they are not sent again."""
+
+
+class WorkerError(Exception):
+    """Raised when a command failed inside a worker. The message is the worker's error."""
+
+
+def shard_for(key, workers):
+    """Takes in key: the (guild id, channel id) of a game, and workers. Returns the worker that owns the game, from a
+    hash of the channel id that is the same in every process and every run."""
+    return zlib.crc32(str(key[1]).encode()) % workers
+
+
+def _worker_main(connection, shard, storage_dir, log_dir, max_games, stats_path, snapshot_seconds):
+    """The body of a worker process: recovers the shard's games from its snapshots and event log, then serves
+    requests until told to stop, snapshotting every snapshot_seconds. Every worker writes to the same statistics
+    database."""
+    registry = GameRegistry(os.path.join(storage_dir, f"shard-{shard}"), max_games=max_games)
+    journal = GameJournal(registry, EventLog(os.path.join(log_dir, f"shard-{shard}")))
+    journal.recover()
+    stats = None if stats_path is None else StatsStore(stats_path)
+    try:
+        asyncio.run(_serve(connection, GameCommands(journal, stats=stats), snapshot_seconds))
+    finally:
+        journal.snapshot()
+        journal.get_log().close()
+        if stats is not None:
+            stats.close()
+
+
+async def _serve(connection, commands, snapshot_seconds=300):
+    """Answers requests in the order they arrive. Every request waiting in the pipe is run, the event log is synced
+    once for all of them, and only then are the replies sent, so a reply always means the change is on disk. Between
+    requests the games are snapshotted every snapshot_seconds, which keeps the log and recovery short."""
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(connection.fileno(), readable.set)
+    journal = commands.get_journal()
+    log = journal.get_log()
+    next_snapshot = loop.time() + snapshot_seconds
+    while True:
+        try:
+            await asyncio.wait_for(readable.wait(), max(0, next_snapshot - loop.time()))
+        except asyncio.TimeoutError:
+            pass
+        if loop.time() >= next_snapshot:
+            journal.snapshot()
+            next_snapshot = loop.time() + snapshot_seconds
+        if not readable.is_set():
+            continue
+        readable.clear()
+        replies = []
+        stopping = False
+        try:
+            while not stopping and connection.poll():
+                request = connection.recv()
+                if request is None:
+                    stopping = True
+                    break
+                request_id, command, key, user, args = request
+                if command == PING:
+                    replies.append((request_id, True, []))
+                    continue
+                try:
+                    replies.append((request_id, True, await commands.call(command, key, user, *args)))
+                except Exception as error:
+                    replies.append((request_id, False, f"{type(error).__name__}: {error}"))
+        except EOFError:
+            # the router has gone away
+            return
+        log.sync()
+        for reply in replies:
+            connection.send(reply)
+        if stopping:
+            return
+
+
+class _Worker:
+    """The router's side of one worker process"""
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.pending = {}
+        self.stopping = False
+
+
+class GameServer:
+    """A class that runs the games in worker processes and routes commands to them. Every game belongs to one
+    worker, picked by shard_for(), and each worker keeps its own GameRegistry and EventLog under storage_dir and
+    log_dir. Commands and replies travel over a multiprocessing pipe per worker. A worker that dies is started again
+    and recovers its games from disk, and restart_worker() does the same on purpose. The number of workers must stay
+    the same for the same directories, as it decides where every game is kept."""
+
+    def __init__(self, workers=2, storage_dir="saved_games", log_dir="game_log", max_games=1000, max_in_flight=128,
+                 stats_path=None, snapshot_seconds=300):
+        """Takes in workers, storage_dir, log_dir and max_games: the registry size of each worker. Takes in
+        max_in_flight: how many commands each worker may have unanswered, which keeps the pipes from filling up.
+        Takes in stats_path: an optional SQLite database for the players' career statistics, and snapshot_seconds:
+        how often each worker snapshots its games."""
+        self._worker_count = workers
+        self._storage_dir = storage_dir
+        self._log_dir = log_dir
+        self._max_games = max_games
+        self._max_in_flight = max_in_flight
+        self._stats_path = stats_path
+        self._snapshot_seconds = snapshot_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [None] * workers
+        self._slots = None
+        # set while a shard's worker is up and has recovered its games, cleared while restart_worker() replaces it
+        self._ready = None
+        self._request_ids = itertools.count()
+
+    def get_worker_count(self):
+        return self._worker_count
+
+    async def start(self):
+        """Starts every worker and waits until they have recovered their games. Raises a ValueError if the
+        directories were last used with a different number of workers."""
+        os.makedirs(self._log_dir, exist_ok=True)
+        count_path = os.path.join(self._log_dir, "workers")
+        if os.path.exists(count_path):
+            with open(count_path) as file:
+                if int(file.read()) != self._worker_count:
+                    raise ValueError(f"{self._log_dir} was written by a different number of workers")
+        else:
+            with open(count_path, "w") as file:
+                file.write(str(self._worker_count))
+        self._slots = [asyncio.Semaphore(self._max_in_flight) for _ in range(self._worker_count)]
+        self._ready = [asyncio.Event() for _ in range(self._worker_count)]
+        for shard in range(self._worker_count):
+            self._start_worker(shard)
+        await asyncio.gather(*(self._ping(shard) for shard in range(self._worker_count)))
+
+    def _start_worker(self, shard):
+        ours, theirs = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, name=f"game-worker-{shard}", daemon=True,
+                                        args=(theirs, shard, self._storage_dir, self._log_dir, self._max_games,
+                                              self._stats_path, self._snapshot_seconds))
+        process.start()
+        theirs.close()
+        self._workers[shard] = _Worker(process, ours)
+        asyncio.get_running_loop().add_reader(ours.fileno(), self._read, shard)
+
+    def _read(self, shard):
+        """Hands the worker's replies to the commands waiting for them"""
+        worker = self._workers[shard]
+        try:
+            while worker.connection.poll():
+                request_id, ok, result = worker.connection.recv()
+                future = worker.pending.pop(request_id)
+                if not future.done():
+                    future.set_result(result) if ok else future.set_exception(WorkerError(result))
+        except (EOFError, OSError):
+            self._worker_died(shard)
+
+    def _worker_died(self, shard):
+        """Fails the worker's unanswered commands and, unless it was told to stop, starts it again once it has
+        exited. Commands sent meanwhile wait for the new worker."""
+        worker = self._workers[shard]
+        if worker.connection.closed:
+            return
+        asyncio.get_running_loop().remove_reader(worker.connection.fileno())
+        worker.connection.close()
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(WorkerRestarted(f"worker {shard} stopped before answering"))
+        worker.pending.clear()
+        if not worker.stopping:
+            self._ready[shard].clear()
+            asyncio.get_running_loop().create_task(self._replace_worker(shard, worker.process))
+
+    async def _replace_worker(self, shard, process):
+        """Waits off the event loop for the dead worker to exit, so two processes never write to the shard's log at
+        once, then starts a new one"""
+        await asyncio.get_running_loop().run_in_executor(None, process.join)
+        self._start_worker(shard)
+        try:
+            await self._ping(shard)
+        except WorkerRestarted:
+            # the new worker died as well, and _worker_died() is replacing it
+            pass
+
+    async def _ping(self, shard):
+        """Waits until the shard's new worker has recovered its games, then lets commands through to it"""
+        await self._send(shard, PING, None, None, (), wait=False)
+        self._ready[shard].set()
+
+    async def _send(self, shard, command, key, user, args, wait=True):
+        if wait:
+            await self._ready[shard].wait()
+        async with self._slots[shard]:
+            worker = self._workers[shard]
+            if not worker.process.is_alive() and not worker.stopping:
+                self._worker_died(shard)
+                await self._ready[shard].wait()
+                worker = self._workers[shard]
+            request_id = next(self._request_ids)
+            future = worker.pending[request_id] = asyncio.get_running_loop().create_future()
+            worker.connection.send((request_id, command, key, user, args))
+            return await future
+
+    async def call(self, command, key, user, *args):
+        """Takes in command, key, user and the command's arguments, as GameCommands.call(). Sends the command to the
+        worker that owns the game and returns the messages it replies with. Raises WorkerError if the command
+        failed, and WorkerRestarted if the worker died before answering."""
+        return await self._send(shard_for(key, self._worker_count), command, key, user, args)
+
+    async def _stop_worker(self, shard):
+        """Asks the worker to finish what it was sent, save its games and exit, and waits until it has"""
+        worker = self._workers[shard]
+        worker.stopping = True
+        worker.connection.send(None)
+        await asyncio.get_running_loop().run_in_executor(None, worker.process.join)
+        if not worker.connection.closed:
+            self._read(shard)
+            if not worker.connection.closed:
+                self._worker_died(shard)
+
+    async def restart_worker(self, shard):
+        """Stops the worker cleanly and starts it again. Commands sent meanwhile wait for the new worker."""
+        self._ready[shard].clear()
+        await self._stop_worker(shard)
+        self._start_worker(shard)
+        await self._ping(shard)
+
+    async def close(self):
+        """Stops every worker"""
+        await asyncio.gather(*(self._stop_worker(shard) for shard in range(self._worker_count)))
+
+
+class FakeDiscordClient:
+    """Stands in for Discord in the load test: every channel has one person playing against a bot, sending the
+    commands a person would, as fast as the replies come back"""
+
+    def __init__(self, server, channels=32, rolls=20):
+        """Takes in server: a GameServer or GameCommands, channels, and rolls: how many times each person rolls"""
+        self._server = server
+        self._channels = channels
+        self._rolls = rolls
+        self.commands = 0
+
+    async def _command(self, command, key, user, *args):
+        self.commands += 1
+        return await self._server.call(command, key, user, *args)
+
+    async def _play(self, channel_id):
+        key = (1, channel_id)
+        user = f"Person {channel_id}"
+        await self._command("create", key, user)
+        await self._command("join", key, user)
+        await self._command("add_bot", key, user, "Bot", "expectimax")
+        await self._command("begin", key, user)
+        for roll in range(self._rolls):
+            messages = await self._command("roll", key, user)
+            if any("wins the game" in message for message in messages):
+                return
+            if any("Type !buy" in message for message in messages):
+                messages = await self._command("buy" if roll % 2 else "pass", key, user)
+                if any("wins the game" in message for message in messages):
+                    return
+
+    async def run(self):
+        """Plays every channel at once. Returns how many commands were sent."""
+        await asyncio.gather(*(self._play(channel_id) for channel_id in range(self._channels)))
+        return self.commands
+
+
+async def load_test(worker_counts=(1, 2, 4), channels=32, rolls=20):
+    """Takes in worker_counts, channels and rolls. Plays the same FakeDiscordClient load against a GameServer with
+    each number of workers, in fresh directories. Returns a dictionary of worker count to commands per second."""
+    results = {}
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            server = GameServer(workers, os.path.join(directory, "games"), os.path.join(directory, "log"))
+            await server.start()
+            start = time.perf_counter()
+            commands = await FakeDiscordClient(server, channels, rolls).run()
+            results[workers] = commands / (time.perf_counter() - start)
+            await server.close()
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{os.cpu_count()} CPUs")
+    for workers, rate in asyncio.run(load_test()).items():
+        print(f"{workers} workers: {rate:,.0f} commands/s")
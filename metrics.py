@@ -0,0 +1,214 @@
+import bisect
+import functools
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# the engine methods timed by instrument()
+GAME_METHODS = ("move_player", "buy_space", "check_game_over")
+
+
+class Histogram:
+    """A latency histogram with fixed buckets, counting observations the way Prometheus does"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self._sum += value
+
+    def get_count(self):
+        return sum(self._counts)
+
+    def get_sum(self):
+        return self._sum
+
+    def get_cumulative(self):
+        """Returns (upper bound, observations at or below it) for every bucket, ending with +Inf"""
+        total = 0
+        cumulative = []
+        for bound, count in zip(self._buckets + (float("inf"),), self._counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class Metrics:
+    """A class that collects counters, latency histograms and gauges. Every metric is named and can carry labels,
+    passed as keyword arguments. Gauges are functions that are only called when the metrics are read. Readers are
+    snapshot() for tests and in-process use, and render() for the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def count(self, name, amount=1, **labels):
+        key = name, tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name, **labels):
+        """Returns the Histogram of the name and labels, creating it if needed. Hot paths keep the Histogram and
+        call its observe() directly."""
+        key = name, tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+        return histogram
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).observe(seconds)
+
+    def gauge(self, name, function):
+        """Takes in name and function. The gauge reads function() whenever the metrics are read."""
+        with self._lock:
+            self._gauges[name] = function
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def snapshot(self):
+        """Returns a dictionary of every metric. Counters map (name, labels) to their count, histograms map
+        (name, labels) to a dictionary of count, sum and cumulative buckets, and gauges map name to their value."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {"count": histogram.get_count(), "sum": histogram.get_sum(),
+                                "buckets": histogram.get_cumulative()}
+                          for key, histogram in self._histograms.items()}
+            gauges = dict(self._gauges)
+        return {"counters": counters, "histograms": histograms,
+                "gauges": {name: function() for name, function in gauges.items()}}
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name}_total{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(snapshot["histograms"].items()):
+            for bound, count in histogram["buckets"]:
+                bound = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+# the metrics the engine and the bot report to
+METRICS = Metrics()
+
+# the original methods of every class instrument() has wrapped, so uninstrument() can put them back
+_originals = {}
+
+
+def _timed(name, method, metrics):
+    observe = metrics.histogram("game_call_seconds", method=name).observe
+    clock = time.perf_counter
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            observe(clock() - start)
+    return wrapper
+
+
+def instrument(*classes, metrics=METRICS):
+    """Takes in game classes (RealEstateGame, CompactGame). Wraps their move_player(), buy_space() and
+    check_game_over() so every call is timed into metrics. Until this is called the methods are untouched, so
+    turning instrumentation off costs nothing."""
+    for cls in classes:
+        if cls in _originals:
+            continue
+        _originals[cls] = {name: cls.__dict__[name] for name in GAME_METHODS}
+        for name, method in _originals[cls].items():
+            setattr(cls, name, _timed(name, method, metrics))
+
+
+def uninstrument():
+    """Puts back the original methods of every instrumented class"""
+    for cls, methods in _originals.items():
+        for name, method in methods.items():
+            setattr(cls, name, method)
+    _originals.clear()
+
+
+def deep_size(obj, seen=None):
+    """Returns the bytes held by obj and everything it refers to through containers, __dict__ and __slots__,
+    counting shared objects once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, type):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    for slot in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, slot):
+            size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+class MetricsServer:
+    """A class that serves the Prometheus text format of a Metrics object at /metrics, from a stdlib HTTP server
+    running in a background thread"""
+
+    def __init__(self, metrics=METRICS, host="127.0.0.1", port=9100):
+        metrics_to_serve = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_to_serve.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    def get_port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Discord rejects messages longer than this
+MAX_MESSAGE_LENGTH = 2000
+
+
+def split_message(content, limit=MAX_MESSAGE_LENGTH):
+    """Takes in content and limit. Returns a list of pieces of content of at most limit characters each, split at
+    line breaks, and in the middle of a line only when one line is longer than limit."""
+    pieces = []
+    while len(content) > limit:
+        cut = content.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            pieces.append(content[:limit])
+            content = content[limit:]
+        else:
+            pieces.append(content[:cut])
+            content = content[cut + 1:]
+    pieces.append(content)
+    return pieces
+
+
+class RateLimited(Exception):
+    """Raised by a transport when the server turned a send away. retry_after is how many seconds to wait."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited for {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class RateLimitBucket:
+    """A token bucket for one route. It allows limit sends every per seconds, and can be told to hold off for longer
+    when the server says so."""
+
+    def __init__(self, limit=5, per=5.0, clock=time.monotonic):
+        self._limit = limit
+        self._per = per
+        self._clock = clock
+        self._tokens = limit
+        self._updated = clock()
+        self._blocked_until = 0
+
+    def delay(self):
+        """Returns how many seconds to wait before the next send may go out"""
+        now = self._clock()
+        self._tokens = min(self._limit, self._tokens + (now - self._updated) * self._limit / self._per)
+        self._updated = now
+        wait = max(0, self._blocked_until - now)
+        if self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) * self._per / self._limit)
+        return wait
+
+    async def acquire(self):
+        """Waits until a send may go out, and takes a token for it"""
+        wait = self.delay()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.delay()
+        self._tokens -= 1
+
+    def is_full(self):
+        """Returns whether the bucket is back where it started, with every token and nothing holding sends off"""
+        return self.delay() == 0 and self._tokens == self._limit
+
+    def block(self, retry_after):
+        """Holds off every send for retry_after seconds"""
+        self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+
+
+class DiscordTransport:
+    """Sends messages through discord.py channel objects. The route of a send is the channel it goes to."""
+
+    def route(self, channel):
+        return f"POST /channels/{channel.id}/messages"
+
+    async def send(self, channel, content):
+        import discord
+        try:
+            await channel.send(content)
+        except discord.HTTPException as error:
+            if error.status == 429:
+                raise RateLimited(getattr(error, "retry_after", 1.0))
+            raise
+
+
+class FakeTransport:
+    """A transport that sends nowhere, for tests and benchmarks. Every send takes latency seconds, and a route that
+    gets more than limit sends in per seconds is turned away with RateLimited, like Discord does."""
+
+    def __init__(self, latency=0.0, limit=5, per=5.0, clock=time.monotonic):
+        self._latency = latency
+        self._limit = limit
+        self._per = per
+        self._clock = clock
+        self._recent = {}
+        self.sent = []
+        self.rejected = 0
+
+    def route(self, channel):
+        return f"POST /channels/{channel.id}/messages"
+
+    async def send(self, channel, content):
+        now = self._clock()
+        recent = [sent_at for sent_at in self._recent.get(self.route(channel), []) if now - sent_at < self._per]
+        if len(recent) >= self._limit:
+            self.rejected += 1
+            raise RateLimited(self._per - (now - recent[0]))
+        recent.append(now)
+        self._recent[self.route(channel)] = recent
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        self.sent.append((channel.id, content))
+
+
+class OutboundQueue:
+    """A class that sends game messages for every channel without making the caller wait on the network. Each
+    channel gets a bounded queue and a worker task. The worker takes the first waiting message, gathers whatever
+    else arrives within window seconds, joins it into one message (up to MAX_MESSAGE_LENGTH), waits for the route's
+    RateLimitBucket and sends. When a channel's queue is full, send() waits for room, which slows down whoever
+    produces messages faster than Discord takes them. The workers of channels that have sent nothing for
+    idle_seconds are stopped, and started again by their next message."""
+
+    def __init__(self, transport, window=0.05, max_pending=100, bucket_limit=5, bucket_per=5.0, idle_seconds=300,
+                 clock=time.monotonic):
+        """Takes in transport: DiscordTransport, FakeTransport or anything with route() and send(). Takes in window:
+        how long to gather messages before sending. Takes in max_pending: how many messages a channel may queue.
+        Takes in bucket_limit and bucket_per: the rate limit of each route, and idle_seconds and clock."""
+        self._transport = transport
+        self._window = window
+        self._max_pending = max_pending
+        self._bucket_limit = bucket_limit
+        self._bucket_per = bucket_per
+        self._idle_seconds = idle_seconds
+        self._clock = clock
+        self._queues = {}
+        self._workers = {}
+        self._buckets = {}
+        self._last_used = {}
+        # the channels whose worker is waiting on an empty queue with nothing left to send
+        self._idle = set()
+        self._next_sweep = clock() + idle_seconds
+        self._sends = 0
+
+    def get_channel_count(self):
+        """Returns how many channels have a worker running"""
+        return len(self._workers)
+
+    def get_send_count(self):
+        """Returns how many sends the queue has made"""
+        return self._sends
+
+    async def send(self, channel, content):
+        """Takes in channel and content. Queues the message, waiting only if the channel's queue is full. A message
+        longer than MAX_MESSAGE_LENGTH is queued as several, split at line breaks, as Discord would reject it."""
+        now = self._clock()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = asyncio.Queue(self._max_pending)
+            self._workers[channel.id] = asyncio.get_running_loop().create_task(self._work(channel, queue))
+        self._last_used[channel.id] = now
+        for piece in split_message(content):
+            await queue.put(piece)
+
+    def _sweep(self, now):
+        """Stops the workers of the channels that have had nothing to send for idle_seconds, like
+        GameActors._sweep(), and forgets the rate limits that have run out"""
+        for channel_id, worker in list(self._workers.items()):
+            if channel_id in self._idle and now - self._last_used[channel_id] >= self._idle_seconds:
+                worker.cancel()
+                del self._workers[channel_id], self._queues[channel_id], self._last_used[channel_id]
+                self._idle.discard(channel_id)
+        for route, bucket in list(self._buckets.items()):
+            if bucket.is_full():
+                del self._buckets[route]
+        self._next_sweep = now + self._idle_seconds
+
+    async def flush(self):
+        """Waits until every queued message has been sent"""
+        await asyncio.gather(*(queue.join() for queue in self._queues.values()))
+
+    async def close(self):
+        """Sends what is queued, then stops the workers"""
+        await self.flush()
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._queues.clear()
+        self._workers.clear()
+        self._last_used.clear()
+        self._idle.clear()
+
+    def _bucket(self, route):
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            bucket = self._buckets[route] = RateLimitBucket(self._bucket_limit, self._bucket_per)
+        return bucket
+
+    async def _work(self, channel, queue):
+        """Gathers and sends the channel's messages for as long as the queue exists"""
+        carried = None
+        while True:
+            if carried is None:
+                self._idle.add(channel.id)
+                batch = [await queue.get()]
+                self._idle.discard(channel.id)
+            else:
+                batch = [carried]
+            length = len(batch[0])
+            carried = None
+            # let the rest of the turn's messages arrive, then take them, keeping a message for the next batch if it
+            # would not fit
+            await asyncio.sleep(self._window)
+            while not queue.empty():
+                content = queue.get_nowait()
+                if length + 1 + len(content) > MAX_MESSAGE_LENGTH:
+                    carried = content
+                    break
+                batch.append(content)
+                length += 1 + len(content)
+
+            bucket = self._bucket(self._transport.route(channel))
+            while True:
+                await bucket.acquire()
+                try:
+                    await self._transport.send(channel, "\n".join(batch))
+                    self._sends += 1
+                    break
+                except RateLimited as error:
+                    bucket.block(error.retry_after)
+                except Exception:
+                    logger.exception("could not send to channel %s", channel.id)
+                    break
+            for _ in batch:
+                queue.task_done()
+
+
+class _Channel:
+    """Stands in for a discord.py channel in the benchmark"""
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+
+async def benchmark(channels=20, turns=10, messages_per_turn=4, latency=0.02, limit=5, per=1.0):
+    """Takes in how many channels play, how many bot turns each plays back to back, and how many messages a turn
+    produces. Plays them against a FakeTransport, first sending every message straight away (retrying when rate
+    limited), then through an OutboundQueue. Returns a dictionary of the two runs' send counts, rejected sends,
+    total time and worst time a turn spent waiting on its messages."""
+    results = {}
+
+    async def play(send):
+        waits = []
+
+        async def channel_turns(channel):
+            for turn in range(turns):
+                start = time.perf_counter()
+                for number in range(messages_per_turn):
+                    await send(channel, f"turn {turn} message {number}")
+                waits.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(channel_turns(_Channel(channel_id)) for channel_id in range(channels)))
+        return start, waits
+
+    transport = FakeTransport(latency, limit, per)
+
+    async def send_directly(channel, content):
+        while True:
+            try:
+                return await transport.send(channel, content)
+            except RateLimited as error:
+                await asyncio.sleep(error.retry_after)
+
+    start, waits = await play(send_directly)
+    results["direct"] = {"sends": len(transport.sent), "rejected": transport.rejected,
+                         "seconds": time.perf_counter() - start, "worst_turn_wait": max(waits)}
+
+    transport = FakeTransport(latency, limit, per)
+    queue = OutboundQueue(transport, bucket_limit=limit, bucket_per=per)
+    start, waits = await play(queue.send)
+    await queue.close()
+    results["queued"] = {"sends": len(transport.sent), "rejected": transport.rejected,
+                         "seconds": time.perf_counter() - start, "worst_turn_wait": max(waits)}
+    return results
+
+
+if __name__ == "__main__":
+    for name, figures in asyncio.run(benchmark()).items():
+        print(name, ", ".join(f"{key} {value:.3g}" for key, value in figures.items()))
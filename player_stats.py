@@ -0,0 +1,150 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import namedtuple
+
+# a player's career across every recorded game
+PlayerStats = namedtuple("PlayerStats", ["name", "games", "wins", "bought", "rent_paid", "rent_received",
+                                         "bankruptcies"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    bought INTEGER NOT NULL,
+    rent_paid INTEGER NOT NULL,
+    rent_received INTEGER NOT NULL,
+    bankruptcies INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS players_by_wins ON players (wins DESC, games, name);
+"""
+
+# adds a batch's counters to the players' careers, creating the players that are new
+UPSERT = """
+INSERT INTO players VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET
+    games = games + excluded.games,
+    wins = wins + excluded.wins,
+    bought = bought + excluded.bought,
+    rent_paid = rent_paid + excluded.rent_paid,
+    rent_received = rent_received + excluded.rent_received,
+    bankruptcies = bankruptcies + excluded.bankruptcies
+"""
+
+
+class StatsStore:
+    """A class that keeps career statistics in a SQLite database. The games keep their own counters while they are
+    played (see RealEstateGame.get_tallies()), and record_game() adds them to the careers of the game's players once
+    it is over. Games are written batch_games at a time, in one transaction, with the counters of each player summed
+    over the batch first, so the database sees one row per player per batch however many games were played. The
+    leaderboard is read from an index, so top() does not scan the players."""
+
+    def __init__(self, path="player_stats.db", batch_games=1, timeout=30):
+        """Takes in path, batch_games: how many finished games to hold before writing them (1 writes every game as it
+        ends), and timeout: how many seconds to wait for another process writing to the same database."""
+        self._connection = sqlite3.connect(path, timeout=timeout)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._batch_games = batch_games
+        self._pending = {}
+        self._pending_games = 0
+
+    def record_game(self, game):
+        """Takes in game: a RealEstateGame or CompactGame that is over. Adds its counters to every player's career,
+        and a win to the winner's."""
+        winner = game.check_game_over()
+        for name, tally in game.get_tallies().items():
+            career = self._pending.get(name)
+            if career is None:
+                career = self._pending[name] = [0, 0, 0, 0, 0, 0]
+            career[0] += 1
+            career[1] += name == winner
+            for index, count in enumerate(tally, 2):
+                career[index] += count
+        self._pending_games += 1
+        if self._pending_games >= self._batch_games:
+            self.flush()
+
+    def flush(self):
+        """Writes the games recorded so far in one transaction"""
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(UPSERT, ((name,) + tuple(career) for name, career in self._pending.items()))
+        self._pending = {}
+        self._pending_games = 0
+
+    def get(self, name):
+        """Returns the PlayerStats of the named player, or None if they have no recorded games"""
+        row = self._connection.execute("SELECT * FROM players WHERE name = ?", (name,)).fetchone()
+        return None if row is None else PlayerStats(*row)
+
+    def top(self, count=10):
+        """Returns the PlayerStats of the count players with the most wins, ties going to whoever played fewer
+        games"""
+        rows = self._connection.execute("SELECT * FROM players INDEXED BY players_by_wins "
+                                        "ORDER BY wins DESC, games, name LIMIT ?", (count,))
+        return [PlayerStats(*row) for row in rows]
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+
+def describe_stats(stats):
+    """Takes in PlayerStats. Returns a line summing up the player's career."""
+    return (f"{stats.name}: {stats.wins} wins in {stats.games} games, {stats.bought} spaces bought, "
+            f"{stats.rent_paid} rent paid, {stats.rent_received} rent received, {stats.bankruptcies} bankruptcies")
+
+
+class _FinishedGame:
+    """The tallies of a finished game, standing in for a game in benchmark()"""
+
+    def __init__(self, winner, tallies):
+        self._winner = winner
+        self._tallies = tallies
+
+    def check_game_over(self):
+        return self._winner
+
+    def get_tallies(self):
+        return self._tallies
+
+
+def benchmark(games=100000, players=10000, batch_games=1000, seed=0):
+    """Takes in games, players: how many different players the games are shared between, batch_games and seed.
+    Records that many made-up 4-player games into a fresh database, then times the queries the bot makes. Returns a
+    dictionary of games written per second and microseconds per stats lookup and per top-10 leaderboard."""
+    rng = random.Random(seed)
+    names = [f"player{number}" for number in range(players)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = StatsStore(os.path.join(directory, "stats.db"), batch_games)
+        start = time.perf_counter()
+        for _ in range(games):
+            seats = rng.sample(names, 4)
+            store.record_game(_FinishedGame(seats[0], {name: (rng.randrange(8), rng.randrange(2000),
+                                                              rng.randrange(2000), name != seats[0]) for name in seats}))
+        store.flush()
+        write_seconds = time.perf_counter() - start
+
+        lookups = 1000
+        start = time.perf_counter()
+        for number in range(lookups):
+            store.get(names[number % players])
+        lookup_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(lookups):
+            store.top(10)
+        top_seconds = time.perf_counter() - start
+        store.close()
+    return {"games_per_second": games / write_seconds, "lookup_us": lookup_seconds / lookups * 1e6,
+            "top10_us": top_seconds / lookups * 1e6}
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:,.1f}")
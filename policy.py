@@ -0,0 +1,241 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from analytics import PAIR_TOTALS, OTHER_TOTALS, board_analytics
+from board import load_board, make_board
+
+RENTS = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350, 350,
+         350]
+
+# where bots look for the table unless told otherwise
+BUY_POLICY_PATH = os.environ.get("BUY_POLICY", "buy_policy.bin")
+
+# the owner of the space a player has just landed on, the same codes as strategy.Position.owners
+NO_OWNER, MINE, THEIRS = 0, 1, 2
+
+# a table file starts with this header: the magic, the format version, the largest opponent count, the board size,
+# the number of balance buckets, the bucket size, the go_bonus and the digest of the board it was solved for, padded
+# to 64 bytes. The values follow as float32 and then the policy as one byte per state, both laid out as
+# [opponents][location][owner][balance bucket]
+MAGIC = b"BPOL"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIq32s4x")
+
+# the chance of each total of two dice
+DICE = tuple(sorted({**OTHER_TOTALS, **{total: PAIR_TOTALS[total] + OTHER_TOTALS.get(total, 0)
+                                        for total in PAIR_TOTALS}}.items()))
+
+
+def board_digest(board):
+    """Returns a digest of everything on the board that the policy depends on"""
+    digest = hashlib.sha256(struct.pack("<q", board.go_bonus))
+    for table in (board.rents, board.prices):
+        digest.update(np.asarray(table, dtype="<i8").tobytes())
+    digest.update(board.buyable)
+    return digest.digest()
+
+
+def solve(board, max_opponents=3, bucket_size=50, max_balance=5000, horizon=20, bankruptcy_penalty=5000,
+          owned_fraction=0.5, tolerance=0.01, max_iterations=2000):
+    """Runs value iteration over the states of a player on the board. Returns the policy and the values, as arrays
+    of shape (max_opponents + 1, board size, 3, buckets).
+
+    A state is the space the player has just landed on, who owns it, the player's balance in buckets of bucket_size
+    (everything from max_balance up shares the last bucket) and how many opponents still have money. The moves follow
+    move_player(): every dice total is weighed by its chance, GO pays go_bonus for each lap, and a player who cannot
+    pay more than the rent is bankrupt, which costs bankruptcy_penalty. The space landed on is taken to belong to an
+    opponent with the chance owned_fraction while there are opponents, and the player collects the rent of an
+    opponent's share of the board every roll. Buying follows buy_space(), and is worth the rent the space is expected
+    to earn from the opponents over horizon turns, which is also how far ahead the values look (a discount of
+    1 - 1 / horizon per roll). The policy is 1 where buying is worth more than skipping."""
+    size = board.get_size()
+    buckets = max_balance // bucket_size + 1
+    balances = np.arange(buckets, dtype=np.int64) * bucket_size
+    rents = np.asarray(board.rents, dtype=np.int64)[:, None]
+    prices = np.asarray(board.prices, dtype=np.int64)[:, None]
+    buyable = np.frombuffer(board.buyable, dtype=np.uint8).astype(bool)
+    analytics = board_analytics(board)
+    income = np.asarray(analytics.rent_per_turn)
+    discount = 1 - 1 / horizon
+
+    def bucket(balance):
+        return np.minimum(np.maximum(balance, 0) // bucket_size, buckets - 1)
+
+    def arrivals(collected):
+        # where each dice total takes a player from every space, and the bucket they arrive in after the GO bonus
+        moves = []
+        for total, probability in DICE:
+            laps, destinations = np.divmod(np.arange(size) + total, size)
+            moves.append((probability, destinations[:, None],
+                          bucket(balances + laps[:, None] * board.go_bonus + collected)))
+        return moves
+
+    rows = np.arange(size)[:, None]
+    bankrupt = balances <= rents
+    after_rent = bucket(balances - rents)
+    can_buy = buyable[:, None] & (balances > prices)
+    after_buying = np.where(can_buy, bucket(balances - prices), 0)
+
+    shape = (max_opponents + 1, size, 3, buckets)
+    values = np.zeros(shape, dtype=np.float32)
+    policy = np.zeros(shape, dtype=np.uint8)
+    for opponents in range(max_opponents + 1):
+        reward = (income * opponents * horizon)[:, None]
+        theirs = (owned_fraction * buyable if opponents else np.zeros(size))[:, None]
+        # the player is taken to own as much of the board as each opponent, and to collect its rent every roll
+        moves = arrivals(round(owned_fraction * sum(analytics.rent_per_turn) / analytics.rolls_per_turn)
+                         if opponents else 0)
+        # the value of each space and bucket at the start of a roll
+        start = np.zeros((size, buckets))
+        for _ in range(max_iterations):
+            skip = discount * start
+            buy = np.where(can_buy, reward + discount * start[rows, after_buying], -np.inf)
+            free = np.maximum(skip, buy)
+            paying = np.where(bankrupt, -bankruptcy_penalty, discount * start[rows, after_rent])
+            landed = theirs * paying + (1 - theirs) * free
+            new_start = sum(probability * landed[destinations, arrival] for probability, destinations, arrival in moves)
+            change = np.abs(new_start - start).max()
+            start = new_start
+            if change < tolerance:
+                break
+        values[opponents, :, NO_OWNER] = free
+        values[opponents, :, MINE] = skip
+        values[opponents, :, THEIRS] = paying
+        policy[opponents, :, NO_OWNER] = buy > skip
+    return policy, values
+
+
+def write_policy(path, board, policy, values, bucket_size):
+    """Writes a policy and its values, as returned by solve(), to the table file at path. The table is written next
+    to it and then moved into place, so processes that have the old table mapped keep reading the old file."""
+    max_opponents, size, _, buckets = policy.shape
+    with open(path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, max_opponents - 1, size, buckets, bucket_size, board.go_bonus,
+                               board_digest(board)))
+        file.write(np.ascontiguousarray(values, dtype="<f4").tobytes())
+        file.write(np.ascontiguousarray(policy, dtype=np.uint8).tobytes())
+    os.replace(path + ".tmp", path)
+
+
+def build_policy(path, board, bucket_size=50, **options):
+    """Takes in path, board, bucket_size and the other options of solve(). Solves the board and writes the table to
+    path."""
+    policy, values = solve(board, bucket_size=bucket_size, **options)
+    write_policy(path, board, policy, values, bucket_size)
+
+
+class PolicyTable:
+    """A buy-policy table written by build_policy(), memory-mapped read-only. Nothing is read up front, and the
+    operating system shares the file's pages between every process that maps it, so any number of bot workers
+    and simulators cost one copy. Each decision reads one byte at a computed offset."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(file.fileno())
+        self._file_id = stat.st_ino, stat.st_mtime_ns
+        magic, version, self._max_opponents, self._size, self._buckets, self._bucket_size, go_bonus, self._digest = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a buy-policy table")
+        count = (self._max_opponents + 1) * self._size * 3 * self._buckets
+        if len(self._mmap) != HEADER.size + count * 5:
+            self._mmap.close()
+            raise ValueError(f"{path} is truncated")
+        shape = (self._max_opponents + 1, self._size, 3, self._buckets)
+        # views into the mapping, for looking up many states at once
+        self.values = np.frombuffer(self._mmap, dtype="<f4", count=count, offset=HEADER.size).reshape(shape)
+        self.policy = np.frombuffer(self._mmap, dtype=np.uint8, count=count, offset=HEADER.size + count * 4) \
+            .reshape(shape)
+        self._policy_offset = HEADER.size + count * 4
+        self._last_board = None
+
+    def is_file(self, stat):
+        """Takes in stat: an os.stat() result. Returns whether it is the file that was mapped."""
+        return self._file_id == (stat.st_ino, stat.st_mtime_ns)
+
+    def matches(self, board):
+        """Returns whether the table was solved for the board"""
+        if board is self._last_board:
+            return True
+        if board.get_size() != self._size or board_digest(board) != self._digest:
+            return False
+        self._last_board = board
+        return True
+
+    def _index(self, location, balance, owner, opponents):
+        opponents = min(max(opponents, 0), self._max_opponents)
+        bucket = min(max(balance, 0) // self._bucket_size, self._buckets - 1)
+        return ((opponents * self._size + location) * 3 + owner) * self._buckets + bucket
+
+    def should_buy(self, location, balance, opponents):
+        """Takes in location, balance and opponents: how many other players still have money. Returns whether the
+        policy buys the unowned space the player has landed on."""
+        return self._mmap[self._policy_offset + self._index(location, balance, NO_OWNER, opponents)] == 1
+
+    def get_value(self, location, balance, owner, opponents):
+        """Returns the value of having landed on location with balance, when owner (NO_OWNER, MINE or THEIRS) owns
+        it"""
+        return float(self.values.flat[self._index(location, balance, owner, opponents)])
+
+    def should_buy_many(self, locations, balances, opponents):
+        """Takes in arrays of locations, balances and opponents. Returns a boolean array of should_buy() for each."""
+        opponents = np.clip(opponents, 0, self._max_opponents)
+        buckets = np.minimum(np.maximum(balances, 0) // self._bucket_size, self._buckets - 1)
+        return self.policy[opponents, locations, NO_OWNER, buckets].astype(bool)
+
+    def close(self):
+        # the views must go before the mapping can close
+        del self.values, self.policy
+        self._mmap.close()
+
+
+# tables mapped by this process, by path
+_TABLES = {}
+
+
+def open_policy(path=BUY_POLICY_PATH):
+    """Returns the PolicyTable at path, mapping it the first time it is asked for in this process and again whenever
+    the file has been replaced since. A replaced table is not closed, as callers may still hold it; its mapping goes
+    when they let go of it."""
+    stat = os.stat(path)
+    table = _TABLES.get(path)
+    if table is None or not table.is_file(stat):
+        table = _TABLES[path] = PolicyTable(path)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solves the buy policy of a board and writes it as a table")
+    parser.add_argument("output", nargs="?", default=BUY_POLICY_PATH, help="where to write the table")
+    parser.add_argument("--board", help="a board spec in JSON or CSV (the usual 24 spaces if not given)")
+    parser.add_argument("--go-bonus", type=int, default=None, help="the go_bonus (default 200, or the spec's)")
+    parser.add_argument("--rents", type=int, nargs="+", default=RENTS, help="the rents, when no --board is given")
+    parser.add_argument("--max-opponents", type=int, default=3)
+    parser.add_argument("--bucket-size", type=int, default=50)
+    parser.add_argument("--max-balance", type=int, default=5000)
+    parser.add_argument("--horizon", type=int, default=20)
+    parser.add_argument("--bankruptcy-penalty", type=int, default=5000)
+    parser.add_argument("--owned-fraction", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    if args.board:
+        board = load_board(args.board, args.go_bonus)
+    else:
+        board = make_board(200 if args.go_bonus is None else args.go_bonus, args.rents)
+    build_policy(args.output, board, args.bucket_size, max_opponents=args.max_opponents,
+                 max_balance=args.max_balance, horizon=args.horizon, bankruptcy_penalty=args.bankruptcy_penalty,
+                 owned_fraction=args.owned_fraction)
+    table = PolicyTable(args.output)
+    print(f"wrote {args.output}: {table.policy.size} states, {table.policy.mean():.1%} of them buy")
+    table.close()
+
+
+if __name__ == "__main__":
+    main()
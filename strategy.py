@@ -0,0 +1,251 @@
+import asyncio
+from collections import namedtuple
+from functools import lru_cache
+
+from actions import Buy, BuyResult, Move, Pass
+from analytics import PAIR_TOTALS, OTHER_TOTALS, board_analytics
+from policy import BUY_POLICY_PATH, open_policy
+
+# what a strategy sees when it decides whether to buy. owners has one entry per space: 0 for no owner (and GO),
+# 1 for the deciding player, 2 for anyone else. board is the game's Board, opponents counts the other players that
+# still have money
+Position = namedtuple("Position", ["location", "balance", "owners", "board", "opponents"])
+
+NO_OWNER, MINE, THEIRS = 0, 1, 2
+
+# the chance of each total of two dice
+DICE = tuple(sorted({**OTHER_TOTALS, **{total: PAIR_TOTALS[total] + OTHER_TOTALS.get(total, 0)
+                                        for total in PAIR_TOTALS}}.items()))
+
+
+def position_for(game, name):
+    """Takes in game and name. Returns the Position of that player in the game."""
+    holdings = game.get_holdings()
+    owners = [NO_OWNER] * game.get_board_size()
+    for owner, spaces in holdings.items():
+        for space in spaces:
+            owners[space] = MINE if owner == name else THEIRS
+    opponents = sum(1 for owner in holdings if owner != name and game.get_player_account_balance(owner) > 0)
+    return Position(game.get_player_current_position(name), game.get_player_account_balance(name), tuple(owners),
+                    game.get_board(), opponents)
+
+
+def can_buy(position):
+    """Returns whether the player may buy the space they are on, following the rules of buy_space()"""
+    return (position.board.buyable[position.location] and position.owners[position.location] == NO_OWNER
+            and position.balance > position.board.prices[position.location])
+
+
+class GreedyStrategy:
+    """Buys every space it can afford"""
+
+    def decide(self, position):
+        return can_buy(position)
+
+
+class ThresholdStrategy:
+    """Buys a space only if at least reserve is left over afterwards"""
+
+    def __init__(self, reserve=500):
+        self._reserve = reserve
+
+    def decide(self, position):
+        return can_buy(position) and position.balance - position.board.prices[position.location] >= self._reserve
+
+
+# boards are looked up by a small integer in the expectimax cache, so the board's tables are not hashed on every call
+_BOARDS = {}
+_BOARD_KEYS = []
+
+
+def _board_id(position, horizon, bankruptcy_penalty):
+    board = position.board
+    key = (board.go_bonus, board.rents.tobytes(), board.prices.tobytes(), board.buyable, position.opponents, horizon,
+           bankruptcy_penalty)
+    board_id = _BOARDS.get(key)
+    if board_id is None:
+        # the rent a space is expected to earn per turn of the player, from the exact landing chances
+        rent_per_turn = board_analytics(board).rent_per_turn
+        board_id = _BOARDS[key] = len(_BOARD_KEYS)
+        _BOARD_KEYS.append((tuple(board.rents), tuple(board.prices), board.buyable, board.go_bonus, horizon,
+                            bankruptcy_penalty, tuple(rent * position.opponents for rent in rent_per_turn)))
+    return board_id
+
+
+@lru_cache(maxsize=200000)
+def _expectimax(board_id, location, balance, owners, depth):
+    """Returns the expected value of the position after depth more turns of the player. At every turn the dice
+    totals are averaged over, and whenever a space can be bought the better of buying and skipping is taken.
+    Positions are cached, so the many paths that reach the same position are only evaluated once."""
+    rents, prices, buyable, go_bonus, horizon, bankruptcy_penalty, income = _BOARD_KEYS[board_id]
+    owned_income = sum(income[space] for space, owner in enumerate(owners) if owner == MINE)
+    if depth == 0:
+        # the player's net worth, plus the rent their spaces are expected to bring in over the rest of the horizon
+        return balance + sum(prices[space] for space, owner in enumerate(owners) if owner == MINE) + \
+            owned_income * horizon
+
+    board_size = len(rents)
+    expected = 0.0
+    for total, probability in DICE:
+        laps, new_location = divmod(location + total, board_size)
+        new_balance = balance + owned_income + go_bonus * laps
+        owner = owners[new_location]
+        rent = rents[new_location]
+        if owner == THEIRS:
+            if new_balance <= rent:
+                expected += probability * -bankruptcy_penalty
+                continue
+            new_balance -= rent
+        value = _expectimax(board_id, new_location, new_balance, owners, depth - 1)
+        price = prices[new_location]
+        if owner == NO_OWNER and buyable[new_location] and new_balance > price:
+            bought = owners[:new_location] + (MINE,) + owners[new_location + 1:]
+            value = max(value, _expectimax(board_id, new_location, new_balance - price, bought, depth - 1))
+        expected += probability * value
+    return expected
+
+
+class ExpectimaxStrategy:
+    """Looks depth turns ahead over every dice outcome, and buys if the expected value of buying beats skipping.
+    Positions are valued by the player's net worth plus the rent their spaces are expected to earn over horizon
+    turns, and going bankrupt costs bankruptcy_penalty."""
+
+    def __init__(self, depth=2, horizon=20, bankruptcy_penalty=5000):
+        self._depth = depth
+        self._horizon = horizon
+        self._bankruptcy_penalty = bankruptcy_penalty
+
+    def decide(self, position):
+        if not can_buy(position):
+            return False
+        board_id = _board_id(position, self._horizon, self._bankruptcy_penalty)
+        location = position.location
+        price = position.board.prices[location]
+        bought = position.owners[:location] + (MINE,) + position.owners[location + 1:]
+        buy = _expectimax(board_id, location, position.balance - price, bought, self._depth)
+        skip = _expectimax(board_id, location, position.balance, position.owners, self._depth)
+        return buy > skip
+
+
+class PolicyStrategy:
+    """Looks the decision up in a buy-policy table solved ahead of time with policy.py. The table is memory-mapped
+    once per process (and again if it is rebuilt), and only its path is pickled, so the strategy is cheap to send to
+    worker processes. Boards the table was not solved for, or a missing table, are left to the fallback strategy."""
+
+    def __init__(self, path=None, fallback=None):
+        """Takes in path: the table (BUY_POLICY_PATH by default), and fallback (defaults to ThresholdStrategy())"""
+        self._path = BUY_POLICY_PATH if path is None else path
+        self._fallback = ThresholdStrategy() if fallback is None else fallback
+
+    def decide(self, position):
+        if not can_buy(position):
+            return False
+        try:
+            table = open_policy(self._path)
+        except FileNotFoundError:
+            return self._fallback.decide(position)
+        if not table.matches(position.board):
+            return self._fallback.decide(position)
+        return table.should_buy(position.location, position.balance, position.opponents)
+
+
+# the strategies a bot can be given by name
+STRATEGIES = {
+    "greedy": GreedyStrategy,
+    "threshold": ThresholdStrategy,
+    "expectimax": ExpectimaxStrategy,
+    "policy": PolicyStrategy,
+}
+
+
+def make_strategy(name):
+    """Returns a new strategy of the given name (see STRATEGIES). Raises a ValueError for unknown names."""
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown strategy {name}, pick one of {', '.join(STRATEGIES)}")
+    return STRATEGIES[name]()
+
+
+class StrategyEngine:
+    """A class that runs strategy decisions in an executor, so the event loop stays free while they think. A
+    decision that takes longer than time_budget seconds is answered by the fallback strategy, which is cheap enough
+    to run inline. The executor cannot stop a decision that has started, so one that ran out of time keeps its worker
+    until it finishes; while max_pending decisions are queued or running, new ones go straight to the fallback."""
+
+    def __init__(self, executor=None, time_budget=1.0, fallback=None, max_pending=8):
+        """Takes in executor: a concurrent.futures executor (a ProcessPoolExecutor for CPU-heavy strategies), or
+        None for the loop's default. Takes in time_budget, fallback (defaults to ThresholdStrategy()) and
+        max_pending."""
+        self._executor = executor
+        self._time_budget = time_budget
+        self._fallback = ThresholdStrategy() if fallback is None else fallback
+        self._max_pending = max_pending
+        self._pending = 0
+
+    def get_pending(self):
+        """Returns how many decisions are queued or running in the executor"""
+        return self._pending
+
+    def _finished(self, future):
+        self._pending -= 1
+        # a decision that ran out of time is never awaited again, so its error is only retrieved here
+        if not future.cancelled():
+            future.exception()
+
+    async def decide(self, strategy, position):
+        """Returns whether the strategy buys in the position, or what the fallback says if it runs out of time or
+        the executor is full"""
+        if self._pending >= self._max_pending:
+            return self._fallback.decide(position)
+        future = asyncio.get_running_loop().run_in_executor(self._executor, strategy.decide, position)
+        self._pending += 1
+        future.add_done_callback(self._finished)
+        try:
+            # shielded, so the decision is only counted out once the executor is really done with it
+            return await asyncio.wait_for(asyncio.shield(future), self._time_budget)
+        except asyncio.TimeoutError:
+            return self._fallback.decide(position)
+
+
+def describe_move(game, result):
+    """Takes in game and result: a MoveResult. Returns the lines telling the players what the move did."""
+    name = result.player
+    space = game.get_space(result.location)
+    lines = [f"{name} rolled a {result.dice[0]} and a {result.dice[1]}."]
+    if result.go_bonus:
+        lines.append(f"{name} collects {result.go_bonus} for reaching GO.")
+    if result.bankrupt:
+        lines.append(f"{name} could not pay the rent on {space.get_name()} and is out of the game.")
+    elif result.paid_to is not None:
+        lines.append(f"{name} pays {result.rent} to {result.paid_to}.")
+    else:
+        lines.append(f"{name} landed on {space.get_name()}.")
+    if result.winner != "":
+        lines.append(f"{result.winner} wins the game!")
+    return lines
+
+
+async def play_bot_turn(journal, key, name, strategy, engine):
+    """Takes in journal: a GameJournal, key: the channel of the game, name: the bot player, strategy and engine: a
+    StrategyEngine. Plays the bot's whole turn through the journal: it rolls, moves, decides whether to buy, and
+    rolls again after a pair. Ends the turn and returns the lines describing what happened."""
+    registry = journal.get_registry()
+    lines = []
+    while True:
+        move, = journal.apply_actions(key, [Move(name)])
+        game = registry.get(key)
+        lines.extend(describe_move(game, move))
+        if move.winner != "":
+            return lines
+        actions = []
+        if not move.bankrupt and move.paid_to is None and await engine.decide(strategy, position_for(game, name)):
+            actions.append(Buy(name))
+        pair = move.dice[0] == move.dice[1] and not move.bankrupt
+        if not pair:
+            actions.append(Pass(name))
+        # the journal looks the game up again, in case it was evicted while the strategy was thinking
+        for result in journal.apply_actions(key, actions):
+            if isinstance(result, BuyResult):
+                lines.append(f"{name} bought {game.get_space(result.location).get_name()} for {result.price}.")
+        if not pair:
+            return lines
+        lines.append(f"That's a pair! {name} will go again.")
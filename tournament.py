@@ -0,0 +1,145 @@
+import argparse
+import hashlib
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from RealEstateGame import RealEstateGame
+from trajectory import TrajectoryRecorder
+
+RENTS = [50, 50, 50, 75, 75, 75, 100, 100, 100, 150, 150, 150, 200, 200, 200, 250, 250, 250, 300, 300, 300, 350, 350,
+         350]
+
+# the compact record a worker sends back for each game, instead of the whole RealEstateGame object.
+# winner is the index of the winning player (-1 if the game hit max_turns), balances and properties_bought have
+# one entry per player
+GameResult = namedtuple("GameResult", ["game_index", "seed", "winner", "turns", "balances", "properties_bought"])
+
+# the settings shared by every game of a tournament
+TournamentSettings = namedtuple("TournamentSettings", ["num_players", "go_bonus", "rents", "initial_balance",
+                                                       "buy_probability", "max_turns"])
+
+
+def make_settings(num_players=3, go_bonus=200, rents=RENTS, initial_balance=1500, buy_probability=0.5,
+                  max_turns=10000):
+    """Returns TournamentSettings, filling in the same board and balances as discord_bot.py by default"""
+    return TournamentSettings(num_players, go_bonus, tuple(rents), initial_balance, buy_probability, max_turns)
+
+
+def derive_seed(base_seed, game_index):
+    """Takes in base_seed: the seed of the whole tournament, and game_index. Returns the seed of that game. The seed
+    only depends on the two arguments, so any game can be replayed without replaying the games before it."""
+    digest = hashlib.blake2b(f"{base_seed}:{game_index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def play_game(game_index, seed, settings, recorder=None):
+    """Takes in game_index, seed and settings (TournamentSettings). Plays a whole RealEstateGame where every player
+    rolls the dice, moves, and tries to buy the space they land on with probability buy_probability. The dice come
+    from the game's DiceStream and the buying decisions from its random generator. Takes in recorder: an optional
+    TrajectoryRecorder to record every move under game_index. Returns a GameResult."""
+    game = RealEstateGame(seed)
+    if recorder is not None:
+        game.set_recorder(recorder, game_index)
+    game.create_spaces(settings.go_bonus, list(settings.rents))
+    names = [f"Player {number + 1}" for number in range(settings.num_players)]
+    for name in names:
+        game.create_player(name, settings.initial_balance)
+
+    rng = game.get_random()
+    properties_bought = [0] * settings.num_players
+    turns = 0
+    winner = ""
+    while winner == "" and turns < settings.max_turns:
+        seat = turns % settings.num_players
+        player = game.get_player(names[seat])
+        turns += 1
+        # players that are out of money skip their turn
+        if player.get_balance() <= 0:
+            continue
+        die1, die2 = player.roll_dice()
+        game.move_player(names[seat], die1 + die2, (die1, die2))
+        if rng.random() < settings.buy_probability and game.buy_space(names[seat]):
+            properties_bought[seat] += 1
+        winner = game.check_game_over()
+
+    balances = tuple(game.get_player_account_balance(name) for name in names)
+    winner_index = names.index(winner) if winner != "" else -1
+    return GameResult(game_index, seed, winner_index, turns, balances, tuple(properties_bought))
+
+
+def replay_game(base_seed, game_index, settings, recorder=None):
+    """Takes in base_seed, game_index, settings and recorder. Plays the game with that index again, returning the
+    same GameResult that the tournament produced for it."""
+    return play_game(game_index, derive_seed(base_seed, game_index), settings, recorder)
+
+
+def _play_chunk(base_seed, start, stop, settings, record_dir=None):
+    """Plays the games with indices start to stop - 1 in a worker process, returning a list of GameResults. With
+    record_dir, their moves are recorded there under the prefix of the chunk."""
+    if record_dir is None:
+        return [replay_game(base_seed, game_index, settings) for game_index in range(start, stop)]
+    with TrajectoryRecorder(record_dir, prefix=f"games-{start:010d}") as recorder:
+        return [replay_game(base_seed, game_index, settings, recorder) for game_index in range(start, stop)]
+
+
+def run_tournament(num_games, base_seed=0, settings=None, workers=None, chunk_size=256, max_in_flight=None,
+                   record_dir=None):
+    """Takes in num_games and base_seed. Takes in settings: TournamentSettings (defaults to make_settings()). Takes
+    in workers: the number of worker processes (defaults to every CPU core). Games are sent to the workers in
+    chunks of chunk_size games, and at most max_in_flight chunks (defaults to 2 per worker) are queued at once, so
+    memory stays bounded however many games are played. Takes in record_dir: an optional directory to record every
+    move to, for a TrajectoryReader. Yields a GameResult for every game, in the order the
+    chunks finish."""
+    if settings is None:
+        settings = make_settings()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        next_start = 0
+        while next_start < num_games or pending:
+            # top up the queue, then wait for at least one chunk to come back
+            while next_start < num_games and len(pending) < max_in_flight:
+                stop = min(next_start + chunk_size, num_games)
+                pending.add(executor.submit(_play_chunk, base_seed, next_start, stop, settings, record_dir))
+                next_start = stop
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def main():
+    """Runs a tournament from the command line and prints how often each seat won"""
+    parser = argparse.ArgumentParser(description="Plays many RealEstateGames across every CPU core")
+    parser.add_argument("games", type=int, help="how many games to play")
+    parser.add_argument("--seed", type=int, default=0, help="the tournament's base seed")
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--go-bonus", type=int, default=200)
+    parser.add_argument("--balance", type=int, default=1500)
+    parser.add_argument("--buy-probability", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--replay", type=int, default=None, help="replay the game with this index and print it")
+    parser.add_argument("--record", metavar="DIR", default=None, help="record every move to trajectory files in DIR")
+    args = parser.parse_args()
+
+    settings = make_settings(args.players, args.go_bonus, RENTS, args.balance, args.buy_probability)
+    if args.replay is not None:
+        print(replay_game(args.seed, args.replay, settings))
+        return
+
+    wins = Counter()
+    total_turns = 0
+    for result in run_tournament(args.games, args.seed, settings, args.workers, record_dir=args.record):
+        wins[result.winner] += 1
+        total_turns += result.turns
+    for seat in range(args.players):
+        print(f"Player {seat + 1} won {wins[seat]} games")
+    print(f"{wins[-1]} games hit the turn limit, the average game lasted {total_turns / args.games:.1f} turns")
+
+
+if __name__ == "__main__":
+    main()
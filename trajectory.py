@@ -0,0 +1,226 @@
+import glob
+import os
+import struct
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# one row per move: the game, the move's number within the game, the mover's seat, the space they landed on, how
+# much their balance changed (GO bonus less rent), what they paid for the space (0 if they did not buy it), the rent
+# they paid and the seat it went to (-1 if none), and the dice (0 and 0 if the move did not come from the dice).
+# Money is 64-bit like CompactGame's balances, so recording a move never fails after the game has made it. Rows are
+# packed with this struct while they are buffered, and written to disk one column at a time
+RECORD = np.dtype([("game", "<u4"), ("turn", "<u4"), ("location", "<u4"), ("balance_delta", "<i8"),
+                   ("purchase", "<i8"), ("rent", "<i8"), ("player", "<u2"), ("paid_to", "<i2"), ("die1", "u1"),
+                   ("die2", "u1")])
+ROW = struct.Struct("<IIIqqqHhBB")
+ROW_SIZE = ROW.size
+_pack_row = ROW.pack_into
+PURCHASE = struct.Struct("<q")
+PURCHASE_OFFSET = RECORD.fields["purchase"][1]
+
+TurnRecord = namedtuple("TurnRecord", RECORD.names)
+
+# every chunk file starts with the magic, the format version and the number of rows, followed by the columns in
+# RECORD order, each padded to 8 bytes
+MAGIC = b"TRJC"
+VERSION = 2
+HEADER = struct.Struct("<4sH2xQ")
+
+
+def _column_offsets(rows):
+    """Returns the offset of each column in a chunk file of rows rows"""
+    offsets = {}
+    offset = HEADER.size
+    for name in RECORD.names:
+        offsets[name] = offset
+        offset += -(-rows * RECORD[name].itemsize // 8) * 8
+    return offsets
+
+
+class TrajectoryRecorder:
+    """A class that streams the moves of many games to disk. Each move is packed into a fixed-width row of a buffer
+    that is allocated once, and every chunk_rows rows the buffer is written out as a chunk file of columns, so memory
+    stays the same however many games are recorded. Chunks are named prefix-000000.traj and up, and are only given
+    that name once they are complete. Use it with RealEstateGame.set_recorder(), and close() it when done."""
+
+    def __init__(self, directory, chunk_rows=65536, prefix="chunk"):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._chunk_rows = chunk_rows
+        self._prefix = prefix
+        self._buffer = bytearray(chunk_rows * ROW.size)
+        self._rows = 0
+        self._flushed_rows = 0
+        self._chunks = 0
+
+    def get_directory(self):
+        return self._directory
+
+    def for_game(self, game_id):
+        """Returns the GameRecording that a game with the given id records its moves through"""
+        return GameRecording(self, game_id)
+
+    def append(self, game_id, turn, player, location, balance_delta, purchase, rent, paid_to, die1, die2):
+        """Buffers one row, writing out the buffer first if it is full. Returns the row's number."""
+        rows = self._rows
+        if rows == self._chunk_rows:
+            self.flush()
+            rows = 0
+        _pack_row(self._buffer, rows * ROW_SIZE, game_id, turn, location, balance_delta, purchase, rent, player,
+                  paid_to, die1, die2)
+        self._rows = rows + 1
+        return self._flushed_rows + rows
+
+    def set_purchase(self, row, price):
+        """Takes in row: a number returned by append(), and price. Records the purchase on the row and returns True,
+        or returns False if the row has already been written out."""
+        index = row - self._flushed_rows
+        if index < 0:
+            return False
+        PURCHASE.pack_into(self._buffer, index * ROW.size + PURCHASE_OFFSET, price)
+        return True
+
+    def flush(self):
+        """Writes the buffered rows out as a chunk file"""
+        if self._rows == 0:
+            return
+        records = np.frombuffer(self._buffer, dtype=RECORD, count=self._rows)
+        path = os.path.join(self._directory, f"{self._prefix}-{self._chunks:06d}.traj")
+        with open(path + ".tmp", "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self._rows))
+            for name in RECORD.names:
+                column = np.ascontiguousarray(records[name]).tobytes()
+                file.write(column + bytes(-len(column) % 8))
+        os.replace(path + ".tmp", path)
+        self._chunks += 1
+        self._flushed_rows += self._rows
+        self._rows = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameRecording:
+    """The part of a TrajectoryRecorder that one game records through. It numbers the game's moves and knows the seat
+    of every player, in the order they joined."""
+
+    def __init__(self, recorder, game_id):
+        self._recorder = recorder
+        self._append = recorder.append
+        self._game_id = game_id
+        self._turn = 0
+        self._seats = {}
+        self._row = None
+
+    def _seat(self, game, player_name):
+        seat = self._seats.get(player_name)
+        if seat is None:
+            self._seats = {name: seat for seat, name in enumerate(game.get_player_names())}
+            seat = self._seats[player_name]
+        return seat
+
+    def move(self, game, player_name, dice, location, balance_delta, rent, paid_to):
+        """Records a move of the game, called by move_player() with the dice it was given (None if the move did not
+        come from the dice)"""
+        die1, die2 = dice or (0, 0)
+        seat = self._seats.get(player_name)
+        if seat is None:
+            seat = self._seat(game, player_name)
+        self._turn += 1
+        self._row = self._append(self._game_id, self._turn, seat, location, balance_delta, 0, rent,
+                                 -1 if paid_to is None else self._seat(game, paid_to), die1, die2)
+
+    def buy(self, game, player_name, location, price):
+        """Records a purchase on the player's last move, called by buy_space(). A purchase whose move has already been
+        written out, or that follows no move, gets a row of its own."""
+        if self._row is None or not self._recorder.set_purchase(self._row, price):
+            self._recorder.append(self._game_id, self._turn, self._seat(game, player_name), location, -price, price, 0,
+                                  -1, 0, 0)
+
+
+class TrajectoryReader:
+    """A class that reads the chunk files written by TrajectoryRecorders. Every column of every chunk is a
+    memory-mapped NumPy array, so nothing is read until it is used, and scans only touch the columns they filter
+    on until a row matches."""
+
+    def __init__(self, directory):
+        self._chunks = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.traj"))):
+            with open(path, "rb") as file:
+                magic, version, rows = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a trajectory chunk")
+            offsets = _column_offsets(rows)
+            self._chunks.append({name: np.memmap(path, dtype=RECORD[name], mode="r", offset=offsets[name],
+                                                 shape=(rows,))
+                                 for name in RECORD.names})
+
+    def __len__(self):
+        return sum(len(chunk["game"]) for chunk in self._chunks)
+
+    def chunks(self):
+        """Returns a list with a dictionary of column name to memory-mapped array for every chunk"""
+        return self._chunks
+
+    def column(self, name):
+        """Returns the named column of every chunk joined into one array. Unlike the chunks' columns this is a copy
+        in memory."""
+        if not self._chunks:
+            return np.empty(0, dtype=RECORD[name])
+        return np.concatenate([chunk[name] for chunk in self._chunks])
+
+    def scan(self, where=None, **equals):
+        """Takes in where: an optional function given a chunk's columns that returns a boolean array of the rows to
+        keep, and equals: columns and the values they must have (scan(game=3, player=0)). Yields a TurnRecord for
+        every row that matches, in the order they were recorded."""
+        for chunk in self._chunks:
+            mask = None
+            for name, value in equals.items():
+                matches = chunk[name] == value
+                mask = matches if mask is None else mask & matches
+            if where is not None:
+                matches = where(chunk)
+                mask = matches if mask is None else mask & matches
+            indices = range(len(chunk["game"])) if mask is None else np.flatnonzero(mask)
+            if len(indices) == 0:
+                continue
+            columns = [chunk[name] for name in RECORD.names]
+            for index in indices:
+                yield TurnRecord(*(int(column[index]) for column in columns))
+
+
+def benchmark(games=200, seed=0, chunk_rows=65536):
+    """Takes in games, seed and chunk_rows. Plays the same tournament games with and without a TrajectoryRecorder.
+    Returns a dictionary with the nanoseconds per move of each, the recorder's overhead, and the bytes per row."""
+    from tournament import make_settings, play_game
+
+    settings = make_settings()
+    start = time.perf_counter()
+    turns = sum(play_game(index, seed + index, settings).turns for index in range(games))
+    plain = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        with TrajectoryRecorder(directory, chunk_rows) as recorder:
+            start = time.perf_counter()
+            for index in range(games):
+                play_game(index, seed + index, settings, recorder)
+            recorded = time.perf_counter() - start
+        rows = len(TrajectoryReader(directory))
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(directory, "*.traj")))
+    return {"plain_ns_per_move": plain / rows * 1e9, "recorded_ns_per_move": recorded / rows * 1e9,
+            "overhead_ns_per_move": (recorded - plain) / rows * 1e9, "bytes_per_row": size / rows,
+            "turns": turns, "rows": rows}
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.4g}" if isinstance(value, float) else f"{name}: {value}")